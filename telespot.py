@@ -7,7 +7,12 @@ API-based phone number search across Google, Bing, and DuckDuckGo
 with pattern recognition for names, locations, and usernames.
 """
 
-import requests
+# Only the search core is imported here. requests, concurrent.futures,
+# sqlite3 and the cache, store, cassette, queue and service modules are
+# imported by the functions that use them, so 'import telespot' and quick
+# commands stay fast (see telespot_bench.py --startup). The metrics helpers
+# are imported up front because the search path calls them; they do
+# nothing until --metrics-port or --metrics-file is given.
 import time
 import re
 import sys
@@ -15,14 +20,31 @@ import os
 import json
 import random
 import argparse
-import subprocess
-from collections import Counter
+import contextlib
+import functools
+import threading
+from collections import Counter, deque
 from datetime import datetime
 from urllib.parse import quote_plus
 
+from telespot_engines import (
+    ENGINES, deduplicate, detect_captcha, generate_phone_formats, get_api_headers,
+    STREAM_CHUNK_BYTES, get_engine, get_random_headers, QueryPlan, parse_chunks, parse_page, read_prefix,
+    response_text, url_fingerprint,
+)
+from telespot_output import NDJSONWriter, OUTPUT_FORMATS, resolve_output_format
+from telespot_profile import enable_profiler, format_summary, get_profiler, record, timed
+from telespot_metrics import (
+    count_metric, enable_metrics, flush_metrics, metrics_address, record_lookup, set_metric,
+)
+from telespot_quota import QuotaLedger, budget_plans, describe_usage, load_quotas
+
 VERSION = "5.0-beta"
 REPO_URL = "https://github.com/thumpersecure/Telespot"
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telespot_config")
+# Same path as telespot_store.STORE_FILE, spelled out so building the parser
+# does not load telespot_store (and sqlite3) for every command
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telespot_store.db")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # ASCII LOGO
@@ -131,11 +153,27 @@ class Config:
         'dehashed_api_key': '',
         'default_country_code': '+1',
         'delay_seconds': '2',
+        'cache_ttl_google': '168',
+        'cache_ttl_bing': '168',
+        'cache_ttl_duckduckgo': '24',
+        'cache_ttl_dehashed': '720',
+        'quota_google': '100',
+        'quota_bing': '1000',
+        'quota_dehashed': '',
+        'saturation_min_new': '1',
+        'saturation_patience': '2',
     }
 
     def __init__(self):
-        self.settings = dict(self.DEFAULT)
-        self.load()
+        self._settings = None
+
+    @property
+    def settings(self):
+        """Settings, read from CONFIG_FILE the first time they are needed"""
+        if self._settings is None:
+            self._settings = dict(self.DEFAULT)
+            self.load()
+        return self._settings
 
     def load(self):
         if os.path.exists(CONFIG_FILE):
@@ -163,7 +201,23 @@ class Config:
                 f.write(f"dehashed_api_key={self.settings.get('dehashed_api_key', '')}\n\n")
                 f.write("# Settings\n")
                 f.write(f"default_country_code={self.settings.get('default_country_code', '+1')}\n")
-                f.write(f"delay_seconds={self.settings.get('delay_seconds', '2')}\n")
+                f.write(f"delay_seconds={self.settings.get('delay_seconds', '2')}\n\n")
+                f.write("# Pacing per engine/host in seconds (blank = defaults)\n")
+                for suffix, _, _ in HOST_RATE_LIMITS.values():
+                    for key in (f'delay_{suffix}', f'min_delay_{suffix}', f'max_delay_{suffix}'):
+                        f.write(f"{key}={self.settings.get(key, '')}\n")
+                f.write("\n")
+                f.write("# Query cache time-to-live per engine (hours)\n")
+                for engine in ('google', 'bing', 'duckduckgo', 'dehashed'):
+                    key = f'cache_ttl_{engine}'
+                    f.write(f"{key}={self.settings.get(key, self.DEFAULT[key])}\n")
+                f.write("\n# API requests allowed per quota window (Google: day, Bing/Dehashed: month; blank = no limit)\n")
+                for engine in ('google', 'bing', 'dehashed'):
+                    key = f'quota_{engine}'
+                    f.write(f"{key}={self.settings.get(key, self.DEFAULT[key])}\n")
+                f.write("\n# --adaptive: stop an engine after <patience> queries in a row with fewer than <min_new> new URLs\n")
+                for key in ('saturation_min_new', 'saturation_patience'):
+                    f.write(f"{key}={self.settings.get(key, self.DEFAULT[key])}\n")
             os.chmod(CONFIG_FILE, 0o600)
             return True
         except Exception as e:
@@ -188,11 +242,15 @@ class Config:
         print(f"\n{color.header('API Configuration Status:')}")
         print("-" * 40)
         apis = self.get_api_status()
+        ledger = get_quota_ledger()
         for api, loaded in apis.items():
             status = "CONFIGURED" if loaded else "NOT CONFIGURED"
             symbol = "[+]" if loaded else "[-]"
             status_color = color.success(status) if loaded else color.warning(status)
-            print(f"  {symbol} {api}: {status_color}")
+            usage = ""
+            if loaded and ledger is not None and ledger.is_metered(api):
+                usage = f" ({describe_usage(ledger.get_stats()[api])})"
+            print(f"  {symbol} {api}: {status_color}{usage}")
         print("-" * 40)
         configured = sum(1 for v in apis.values() if v)
         print(f"  {configured}/{len(apis)} APIs configured\n")
@@ -201,137 +259,17 @@ class Config:
 config = Config()
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# USER AGENT ROTATION
+# HTTP SESSION
 # ═══════════════════════════════════════════════════════════════════════════════
 
-USER_AGENTS = [
-    # Chrome on Windows (latest versions)
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    # Chrome on Mac
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-    # Chrome on Linux
-    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    # Firefox (latest)
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.3; rv:123.0) Gecko/20100101 Firefox/123.0',
-    'Mozilla/5.0 (X11; Linux x86_64; rv:123.0) Gecko/20100101 Firefox/123.0',
-    # Edge
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0',
-    # Safari
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
-    # Mobile
-    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_3 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
-    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Mobile Safari/537.36',
-]
-
-# Common referer URLs to appear as natural browser traffic
-REFERERS = [
-    'https://www.google.com/',
-    'https://www.bing.com/',
-    'https://duckduckgo.com/',
-    'https://search.yahoo.com/',
-    '',  # Direct navigation (no referer)
-]
-
-# Captcha and block indicators in response content
-CAPTCHA_INDICATORS = [
-    'captcha', 'recaptcha', 'hcaptcha', 'challenge-platform',
-    'are you a robot', 'are you human', 'verify you are human',
-    'unusual traffic', 'automated requests', 'bot detection',
-    'access denied', 'forbidden', 'rate limit exceeded',
-    'please verify', 'security check', 'blocked',
-    'cf-challenge', 'cf-browser-verification',
-]
-
-
-def get_random_headers():
-    """Get request headers with random User-Agent and realistic browser fingerprint"""
-    ua = random.choice(USER_AGENTS)
-    is_firefox = 'Firefox' in ua
-
-    headers = {
-        'User-Agent': ua,
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/json,*/*;q=0.8',
-        'Accept-Language': random.choice([
-            'en-US,en;q=0.9',
-            'en-US,en;q=0.9,es;q=0.8',
-            'en-GB,en;q=0.9,en-US;q=0.8',
-            'en-US,en;q=0.5',
-        ]),
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
-    # Add Sec-Fetch headers (Chrome/Edge only, not Firefox)
-    if not is_firefox:
-        headers.update({
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'sec-ch-ua-platform': random.choice(['"Windows"', '"macOS"', '"Linux"']),
-        })
-
-    # Add referer sometimes (not always - real browsers don't always send one)
-    ref = random.choice(REFERERS)
-    if ref:
-        headers['Referer'] = ref
-
-    return headers
-
-
-def get_api_headers():
-    """Get headers specifically tuned for API requests (JSON-focused)"""
-    headers = get_random_headers()
-    headers['Accept'] = 'application/json, text/html, */*'
-    # Remove browser-navigation headers not appropriate for API calls
-    headers.pop('Upgrade-Insecure-Requests', None)
-    headers.pop('Sec-Fetch-Dest', None)
-    headers.pop('Sec-Fetch-Mode', None)
-    headers.pop('Sec-Fetch-Site', None)
-    headers.pop('Sec-Fetch-User', None)
-    return headers
-
-
-def detect_captcha(response):
-    """Check if a response contains captcha or block indicators.
-
-    Returns True if the response appears to be a captcha/block page
-    rather than legitimate search results.
-    """
-    # Check status codes that indicate blocking
-    if response.status_code in (403, 429, 503):
-        return True
-
-    # Check content type - captcha pages are usually HTML, not JSON
-    content_type = response.headers.get('Content-Type', '')
-    if 'application/json' in content_type:
-        return False  # JSON responses are legitimate API responses
-
-    # Check response body for captcha indicators
-    try:
-        body = response.text.lower()
-        for indicator in CAPTCHA_INDICATORS:
-            if indicator in body:
-                return True
-    except Exception:
-        pass
-
-    return False
-
-
-def create_session():
+def create_session(pool_size=10):
     """Create a requests.Session with connection pooling and retry-friendly settings"""
+    import requests
     session = requests.Session()
     # Connection pooling for better performance and less suspicious traffic patterns
     adapter = requests.adapters.HTTPAdapter(
         pool_connections=10,
-        pool_maxsize=10,
+        pool_maxsize=pool_size,
         max_retries=0,  # We handle retries ourselves
     )
     session.mount('http://', adapter)
@@ -341,52 +279,112 @@ def create_session():
 
 # Global session for connection reuse
 _session = None
+_session_pool_size = 0
 
-def get_session():
-    """Get or create the global requests session"""
-    global _session
-    if _session is None:
-        _session = create_session()
+def get_session(pool_size=10):
+    """Get or create the global requests session.
+
+    The session is recreated with a bigger connection pool if a caller
+    needs more concurrent connections than the current pool allows.
+    """
+    global _session, _session_pool_size
+    if _session is None or pool_size > _session_pool_size:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_size)
+        _session_pool_size = pool_size
     return _session
 
 
 def request_with_retry(method, url, max_retries=3, backoff_base=2.0, debug=False, **kwargs):
     """Make an HTTP request with retry logic and captcha detection.
 
+    With a cassette open (--record/--replay) the final response of every
+    call is recorded, or served from the cassette without touching the
+    network; see send_with_retry() for the retry behaviour.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return send_with_retry(method, url, max_retries, backoff_base, debug, **kwargs)
+
+    params, data = kwargs.get('params'), kwargs.get('data')
+    if cassette.replaying:
+        status, headers, body, was_blocked = cassette.play(method, url, params, data)
+        return cassette_response(url, status, headers, body), was_blocked
+
+    response, was_blocked = send_with_retry(method, url, max_retries, backoff_base, debug, **kwargs)
+    if response is not None:
+        if kwargs.get('stream'):
+            body = b''.join(iter_body(response))
+            response._telespot_chunks = [body]
+        else:
+            body = response.content
+        cassette.record(method, url, params, data, response.status_code, response.headers, body, was_blocked)
+    return response, was_blocked
+
+
+def send_with_retry(method, url, max_retries=3, backoff_base=2.0, debug=False, **kwargs):
+    """Send an HTTP request with retry logic and captcha detection.
+
     Retries on transient failures (429, 503, network errors) with exponential backoff.
-    Detects captcha/block pages and retries with fresh headers.
+    Detects captcha/block pages and retries with fresh headers. Any headers
+    passed in are merged over the rotating fingerprint on every attempt.
+
+    With stream=True only the first chunks of the body are read for block
+    detection; the rest is left to the caller via iter_body(). A response
+    _stop_if(response) is true for (a spent API quota) is returned as blocked
+    straight away instead of being retried. Network time, backoff sleeps and
+    request metrics are attributed to the engine named by _profile_as.
 
     Returns (response, was_blocked) tuple. was_blocked indicates if all retries
     were exhausted due to captcha/rate limiting.
     """
+    import requests
     session = get_session()
     last_exception = None
+    api_mode = kwargs.pop('_api_mode', False)
+    stop_if = kwargs.pop('_stop_if', None)
+    engine_name = kwargs.pop('_profile_as', None)
+    extra_headers = kwargs.pop('headers', None) or {}
 
     for attempt in range(max_retries + 1):
         try:
-            # Use fresh headers on each retry to vary fingerprint
-            if 'headers' not in kwargs or attempt > 0:
-                if kwargs.get('_api_mode'):
-                    kwargs['headers'] = get_api_headers()
-                else:
-                    kwargs['headers'] = get_random_headers()
-            kwargs.pop('_api_mode', None)
+            # Use a fresh fingerprint on each attempt, keeping caller headers (API keys)
+            headers = get_api_headers() if api_mode else get_random_headers()
+            headers.update(extra_headers)
+            kwargs['headers'] = headers
 
             if 'timeout' not in kwargs:
                 kwargs['timeout'] = 15
 
+            started = time.perf_counter()
             response = getattr(session, method)(url, **kwargs)
 
-            # Check for captcha/blocking
-            if detect_captcha(response):
+            count_metric('telespot_requests_total', engine=engine_name, status=response.status_code)
+
+            if stop_if is not None and stop_if(response):
+                record('network', time.perf_counter() - started, engine_name)
+                return response, True
+
+            # Check for captcha/blocking (streamed bodies only have their prefix read)
+            prefix = None
+            if kwargs.get('stream'):
+                prefix, response._telespot_chunks = read_prefix(response.iter_content(STREAM_CHUNK_BYTES))
+            record('network', time.perf_counter() - started, engine_name)
+
+            if detect_captcha(response, prefix):
+                count_metric('telespot_captcha_detections_total', engine=engine_name)
                 if debug:
                     print(f"      [DEBUG] Captcha/block detected (attempt {attempt + 1}/{max_retries + 1}), status={response.status_code}")
 
                 if attempt < max_retries:
+                    response.close()
                     wait = backoff_base * (2 ** attempt) + random.uniform(0.5, 2.0)
                     if debug:
                         print(f"      [DEBUG] Backing off {wait:.1f}s before retry...")
+                    count_metric('telespot_retries_total', engine=engine_name, reason='captcha')
                     time.sleep(wait)
+                    record('backoff', wait, engine_name)
                     continue
                 else:
                     return response, True  # All retries exhausted, was blocked
@@ -405,7 +403,10 @@ def request_with_retry(method, url, max_retries=3, backoff_base=2.0, debug=False
                         wait = backoff_base * (2 ** attempt) + random.uniform(1.0, 3.0)
                     if debug:
                         print(f"      [DEBUG] Rate limited (429), waiting {wait:.1f}s...")
+                    response.close()
+                    count_metric('telespot_retries_total', engine=engine_name, reason='rate_limited')
                     time.sleep(wait)
+                    record('backoff', wait, engine_name)
                     continue
                 return response, True
 
@@ -413,11 +414,14 @@ def request_with_retry(method, url, max_retries=3, backoff_base=2.0, debug=False
 
         except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
             last_exception = e
+            count_metric('telespot_requests_total', engine=engine_name, status='error')
             if debug:
                 print(f"      [DEBUG] Network error (attempt {attempt + 1}/{max_retries + 1}): {e}")
             if attempt < max_retries:
                 wait = backoff_base * (2 ** attempt) + random.uniform(0.5, 1.5)
+                count_metric('telespot_retries_total', engine=engine_name, reason='network')
                 time.sleep(wait)
+                record('backoff', wait, engine_name)
                 continue
             raise
 
@@ -433,6 +437,57 @@ def request_with_retry(method, url, max_retries=3, backoff_base=2.0, debug=False
     return None, True
 
 
+def cassette_response(url, status, headers, body):
+    """Build a requests Response from a cassette entry"""
+    import requests
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response.url = url
+    response._content = body
+    response._content_consumed = True
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+# HTTP cassette for --record/--replay (None when neither is given)
+_cassette = None
+
+
+def configure_cassette(record=None, replay=None):
+    """Open a cassette to record responses to, or to replay them from"""
+    from telespot_cassette import Cassette
+    global _cassette
+    _cassette = None
+    if record:
+        _cassette = Cassette(record, 'record', tool=f'telespot {VERSION}')
+    elif replay:
+        _cassette = Cassette(replay, 'replay')
+    return _cassette
+
+
+def get_cassette():
+    """Get the open cassette, or None if requests go to the network as usual"""
+    return _cassette
+
+
+def close_cassette():
+    """Finish the open cassette and say what it recorded or replayed"""
+    if _cassette is not None:
+        _cassette.close()
+        print(color.info(f"Cassette: {_cassette.describe()}"))
+
+
+def iter_body(response):
+    """Iterate over a response body in chunks.
+
+    Streamed responses from request_with_retry continue where block
+    detection stopped reading; other responses yield their buffered body.
+    """
+    chunks = getattr(response, '_telespot_chunks', None)
+    return chunks if chunks is not None else [response.content]
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # ADAPTIVE RATE LIMITING
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -444,7 +499,12 @@ class AdaptiveRateLimiter:
     or decreases (to a minimum) if requests succeed consistently.
     """
 
-    def __init__(self, base_delay=2.0, min_delay=1.5, max_delay=15.0):
+    def __init__(self, base_delay=2.0, min_delay=1.5, max_delay=15.0, paced=True, name=None,
+                 host=None, slots=None):
+        self.name = name
+        self.host = host
+        # slots(key, delay) reserves slots shared with other processes (telespot worker)
+        self.slots = slots
         self.base_delay = base_delay
         self.min_delay = min_delay
         self.max_delay = max_delay
@@ -452,6 +512,15 @@ class AdaptiveRateLimiter:
         self.consecutive_successes = 0
         self.consecutive_blocks = 0
         self.total_blocks = 0
+        # Unpaced limiters (replaying a cassette) never delay a request
+        self.paced = paced
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self._report_delay()
+
+    def _report_delay(self):
+        set_metric('telespot_rate_limiter_delay_seconds', self.current_delay,
+                   engine=self.name, host=self.host)
 
     def record_success(self):
         """Record a successful request"""
@@ -460,6 +529,7 @@ class AdaptiveRateLimiter:
         # Gradually reduce delay after sustained success
         if self.consecutive_successes >= 3:
             self.current_delay = max(self.min_delay, self.current_delay * 0.85)
+            self._report_delay()
 
     def record_block(self):
         """Record a blocked/rate-limited request"""
@@ -468,14 +538,46 @@ class AdaptiveRateLimiter:
         self.total_blocks += 1
         # Increase delay on blocks
         self.current_delay = min(self.max_delay, self.current_delay * 1.8)
+        count_metric('telespot_rate_limiter_blocks_total', engine=self.name, host=self.host)
+        self._report_delay()
+
+    def next_delay(self):
+        """Get the next adaptive delay with jitter, without sleeping"""
+        if not self.paced:
+            return 0.0
+        jitter = random.uniform(-0.5, 1.5)
+        return max(self.min_delay, self.current_delay + jitter)
 
     def wait(self):
         """Sleep for the adaptive delay with jitter"""
-        jitter = random.uniform(-0.5, 1.5)
-        delay = max(self.min_delay, self.current_delay + jitter)
+        delay = self.next_delay()
         time.sleep(delay)
         return delay
 
+    def pace(self):
+        """Sleep until this limiter's next request slot, returning the time slept"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+            record('pacing', delay, self.name)
+            return delay
+        return 0.0
+
+    def reserve(self):
+        """Reserve the next request slot and return how long to sleep until it.
+
+        Thread-safe: concurrent callers get consecutive slots spaced by the
+        adaptive delay, so one limiter paces one engine across worker threads
+        (and across worker processes when it has shared slots).
+        """
+        with self._lock:
+            if self.slots is not None:
+                return self.slots(f"{self.name}@{self.host}", self.next_delay())
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.next_delay()
+            return slot - now
+
     def get_stats(self):
         """Get rate limiter statistics"""
         return {
@@ -490,6 +592,164 @@ def rate_limit():
     time.sleep(delay)
     return delay
 
+
+# Host each engine talks to first (DuckDuckGo falls back to DDG_HTML_HOST)
+ENGINE_HOSTS = {name: engine.host for name, engine in ENGINES.items()}
+DDG_HTML_HOST = ENGINES['DuckDuckGo'].fallback.host
+
+# Pacing per host: (config key suffix, default min_delay, default max_delay).
+# The base delay defaults to delay_seconds; override any of them in
+# .telespot_config with delay_<suffix>, min_delay_<suffix>, max_delay_<suffix>.
+HOST_RATE_LIMITS = {
+    'www.googleapis.com': ('google', 0.5, 15.0),
+    'api.bing.microsoft.com': ('bing', 0.5, 15.0),
+    'api.duckduckgo.com': ('duckduckgo', 1.5, 15.0),
+    DDG_HTML_HOST: ('duckduckgo_html', 2.0, 30.0),
+    'api.dehashed.com': ('dehashed', 0.5, 10.0),
+}
+
+
+class RateLimiterRegistry:
+    """One AdaptiveRateLimiter per (engine, host).
+
+    Blocks and backoff on one host only slow down that host, so a DuckDuckGo
+    captcha no longer delays the Google or Bing API calls and vice versa.
+    """
+
+    def __init__(self, settings, paced=True, slots=None):
+        self.settings = settings
+        self.paced = paced
+        self.slots = slots
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _setting(self, key, default):
+        try:
+            return float(self.settings.get(key) or default)
+        except ValueError:
+            return float(default)
+
+    def _create(self, engine, host):
+        suffix, min_delay, max_delay = HOST_RATE_LIMITS.get(host, (None, 1.5, 15.0))
+        base_delay = self._setting('delay_seconds', 2.0)
+        if suffix:
+            base_delay = self._setting(f'delay_{suffix}', base_delay)
+            min_delay = self._setting(f'min_delay_{suffix}', min_delay)
+            max_delay = self._setting(f'max_delay_{suffix}', max_delay)
+        return AdaptiveRateLimiter(
+            base_delay=max(base_delay, min_delay),
+            min_delay=min_delay,
+            max_delay=max(max_delay, base_delay),
+            paced=self.paced,
+            name=engine,
+            host=host,
+            slots=self.slots,
+        )
+
+    def get(self, engine, host=None):
+        """Get the limiter for an engine (on its primary host unless given)"""
+        key = (engine, host or ENGINE_HOSTS.get(engine, engine))
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = self._create(*key)
+            return limiter
+
+    def items(self):
+        with self._lock:
+            return list(self._limiters.items())
+
+    def total_blocks(self):
+        return sum(l.total_blocks for _, l in self.items())
+
+    def get_stats(self):
+        """Get per-limiter statistics keyed by 'engine (host)'"""
+        return {f"{engine} ({host})": l.get_stats() for (engine, host), l in self.items()}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUERY CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Global query cache (None when caching is disabled)
+_query_cache = None
+_cache_state = threading.local()
+
+
+def configure_query_cache(no_cache=False, refresh=False):
+    """Open the on-disk query cache for this run (or disable it)"""
+    global _query_cache
+    _query_cache = None
+    if no_cache:
+        return None
+    import sqlite3
+    from telespot_cache import QueryCache, load_ttls
+    try:
+        _query_cache = QueryCache(ttls=load_ttls(config.settings), refresh=refresh)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open query cache: {e}")
+    return _query_cache
+
+
+def get_query_cache():
+    """Get the global query cache, or None if caching is disabled"""
+    return _query_cache
+
+
+# API quota ledger (None until configure_quota_ledger() is called)
+_quota_ledger = None
+
+
+def configure_quota_ledger(shared=False):
+    """Load the persistent API quota ledger with the configured limits.
+
+    shared=True locks the ledger file for every update, for worker processes.
+    """
+    global _quota_ledger
+    _quota_ledger = QuotaLedger(quotas=load_quotas(config.settings), shared=shared)
+    return _quota_ledger
+
+
+def get_quota_ledger():
+    """Get the global quota ledger, or None if quotas are not tracked"""
+    return _quota_ledger
+
+
+# Result pages fetched per query in the current run (--depth)
+_search_depth = 1
+
+
+def last_search_cached():
+    """True if the last search on this thread was served from the cache"""
+    return getattr(_cache_state, 'hit', False)
+
+
+def cached_search(engine):
+    """Decorator that serves search_* calls from the query cache.
+
+    A hit returns immediately without touching request_with_retry or the
+    rate limiter. Empty result lists are not stored, since a blocked request
+    also comes back empty. Searches with a depth keyword are cached per depth.
+    """
+    def decorator(search_fn):
+        @functools.wraps(search_fn)
+        def wrapper(query, *args, **kwargs):
+            cache = get_query_cache()
+            if cache is not None:
+                from telespot_cache import cache_query
+                key = cache_query(query, kwargs.get('depth', 1))
+                results = cache.get(engine, key)
+                if results is not None:
+                    _cache_state.hit = True
+                    return results
+
+            _cache_state.hit = False
+            results = search_fn(query, *args, **kwargs)
+            if cache is not None and results:
+                cache.put(engine, key, results)
+            return results
+        return wrapper
+    return decorator
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # US STATES AND LOCATION DATA
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -524,59 +784,9 @@ DTMF_MAP = {
 }
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# PHONE NUMBER FORMATS (10 total: 4 basic + 4 quoted + 2 special)
+# PHONE NUMBER FORMATS (generate_phone_formats lives in telespot_engines)
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_phone_formats(phone_number, country_code='+1'):
-    """Generate 10 phone number format variations for searching"""
-    digits = re.sub(r'\D', '', phone_number)
-
-    if country_code == '+1':
-        if len(digits) == 11 and digits.startswith('1'):
-            digits = digits[1:]
-        if len(digits) != 10:
-            return []
-        area = digits[0:3]
-        prefix = digits[3:6]
-        line = digits[6:10]
-    else:
-        cc = country_code.lstrip('+')
-        if len(digits) < 7:
-            return []
-        if len(digits) >= 10:
-            area = digits[-10:-7]
-            prefix = digits[-7:-4]
-            line = digits[-4:]
-        else:
-            area = digits[:3] if len(digits) >= 3 else digits
-            prefix = digits[3:6] if len(digits) >= 6 else ''
-            line = digits[6:] if len(digits) > 6 else ''
-
-    # 4 Basic formats
-    basic = [
-        f'{area}-{prefix}-{line}',                    # 215-555-1234
-        f'{area}{prefix}{line}',                      # 2155551234
-        f'({area}) {prefix}-{line}',                  # (215) 555-1234
-        f'+1{area}-{prefix}-{line}',                  # +1215-555-1234
-    ]
-
-    # 4 Quoted formats (exact match)
-    quoted = [
-        f'"{area}-{prefix}-{line}"',                  # "215-555-1234"
-        f'"{area}{prefix}{line}"',                    # "2155551234"
-        f'"({area}) {prefix}-{line}"',                # "(215) 555-1234"
-        f'"+1{area}-{prefix}-{line}"',                # "+1215-555-1234"
-    ]
-
-    # 2 Special formats
-    special = [
-        f'({area}-{prefix}-{line})',                  # (215-555-1234)
-        f'"{area}.{prefix}.{line}"',                  # "215.555.1234" (dot-separated)
-    ]
-
-    return basic + quoted + special
-
-
 def get_dtmf_representation(phone_number):
     """Convert phone number to DTMF representation"""
     digits = re.sub(r'\D', '', phone_number)
@@ -586,339 +796,193 @@ def get_dtmf_representation(phone_number):
 # API SEARCH FUNCTIONS
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def search_google_api(query, api_key, cse_id, num_results=10, verbose=False, debug=False, rate_limiter=None):
-    """Search using Google Custom Search API with retry and captcha detection"""
-    results = []
-
-    if not api_key or not cse_id:
-        if debug:
-            print("    [DEBUG] Google API not configured")
-        return results
-
-    try:
-        url = "https://www.googleapis.com/customsearch/v1"
-
-        # Handle quoted queries - use exactTerms parameter for better results
-        clean_query = query
-        exact_terms = None
-        if query.startswith('"') and query.endswith('"'):
-            clean_query = query[1:-1]
-            exact_terms = clean_query
-
-        params = {
-            'key': api_key,
-            'cx': cse_id,
-            'q': clean_query,
-            'num': min(num_results, 10),
-        }
-
-        if exact_terms:
-            params['exactTerms'] = exact_terms
-
-        response, was_blocked = request_with_retry(
-            'get', url, params=params, _api_mode=True, debug=debug
-        )
-
-        if was_blocked:
-            if rate_limiter:
-                rate_limiter.record_block()
-            print(f"    {color.warning('Google API blocked/rate limited - backing off')}")
-            return results
-
-        if debug:
-            print(f"    [DEBUG] Google API status: {response.status_code}")
-
-        if response.status_code == 200:
-            data = response.json()
-            for item in data.get('items', []):
-                results.append({
-                    'title': item.get('title', ''),
-                    'url': item.get('link', ''),
-                    'snippet': item.get('snippet', ''),
-                    'source': 'Google'
-                })
-                if verbose:
-                    print(f"      Found: {item.get('title', '')[:60]}...")
-            if rate_limiter:
-                rate_limiter.record_success()
-        elif response.status_code == 429:
-            print(f"    {color.warning('Google API quota exceeded')}")
-            if rate_limiter:
-                rate_limiter.record_block()
-        elif debug:
-            print(f"    [DEBUG] Google error: {response.text[:100]}")
-
-    except Exception as e:
-        if debug:
-            print(f"    [DEBUG] Google exception: {e}")
-
-    return results
-
+def send_engine_request(engine, request, num_results=10, verbose=False, debug=False,
+                        rate_limiter=None, paged=False):
+    """Send one EngineRequest and parse the response.
 
-def search_bing_api(query, api_key, num_results=10, verbose=False, debug=False, rate_limiter=None):
-    """Search using Bing Search API (Azure Cognitive Services) with retry and captcha detection"""
+    Handles quota, retries, block detection and rate limiter feedback.
+    With paged=True streamed pages are read to the end so the cursor for
+    the next page is found. Returns (results, cursor).
+    """
     results = []
+    cursor = None
 
-    if not api_key:
+    ledger = get_quota_ledger()
+    if ledger is not None and not ledger.consume(engine.name):
         if debug:
-            print("    [DEBUG] Bing API not configured")
-        return results
+            print(f"    [DEBUG] {engine.name} quota used up, request skipped")
+        return results, cursor
 
     try:
-        url = "https://api.bing.microsoft.com/v7.0/search"
-        headers = get_api_headers()
-        headers['Ocp-Apim-Subscription-Key'] = api_key
-        params = {
-            'q': query,
-            'count': num_results,
-            'mkt': 'en-US',
-        }
-
+        retries = {} if request.max_retries is None else {'max_retries': request.max_retries}
         response, was_blocked = request_with_retry(
-            'get', url, headers=headers, params=params, debug=debug
+            request.method, request.url, debug=debug, _api_mode=request.api_mode,
+            stream=request.stream, _stop_if=engine.quota_exhausted, _profile_as=engine.name,
+            **retries, **request.kwargs()
         )
 
-        if was_blocked:
+        if was_blocked and response is not None and engine.quota_exhausted(response):
+            if ledger is not None:
+                ledger.exhaust(engine.name)
+            print(f"    {color.warning(f'{engine.name} API quota used up - remaining queries use other engines')}")
+        elif was_blocked:
             if rate_limiter:
                 rate_limiter.record_block()
-            print(f"    {color.warning('Bing API blocked/rate limited - backing off')}")
-            return results
-
-        if debug:
-            print(f"    [DEBUG] Bing API status: {response.status_code}")
-
-        if response.status_code == 200:
-            data = response.json()
-            for item in data.get('webPages', {}).get('value', []):
-                results.append({
-                    'title': item.get('name', ''),
-                    'url': item.get('url', ''),
-                    'snippet': item.get('snippet', ''),
-                    'source': 'Bing'
-                })
+            if engine.warn_on_block:
+                print(f"    {color.warning(f'{engine.name} API blocked/rate limited - backing off')}")
+            elif debug:
+                print(f"    [DEBUG] {engine.name} ({engine.host}) blocked")
+        else:
+            if debug:
+                print(f"    [DEBUG] {engine.name} ({engine.host}) status: {response.status_code}")
+
+            if response.status_code == 200:
+                with timed('parse', engine.name):
+                    if request.stream and paged:
+                        results, cursor = parse_page(engine, iter_body(response), response.encoding)
+                    elif request.stream:
+                        # Stop reading as soon as the parser has enough results
+                        results = parse_chunks(engine, iter_body(response), num_results, response.encoding)
+                    else:
+                        results = engine.parse(response, num_results)
+                count_metric('telespot_results_total', len(results), engine=engine.name)
                 if verbose:
-                    print(f"      Found: {item.get('name', '')[:60]}...")
-            if rate_limiter:
-                rate_limiter.record_success()
-        elif response.status_code == 401:
-            print(f"    {color.warning('Bing API key invalid')}")
-        elif response.status_code == 429:
-            print(f"    {color.warning('Bing API quota exceeded')}")
-            if rate_limiter:
-                rate_limiter.record_block()
-        elif debug:
-            print(f"    [DEBUG] Bing error: {response.text[:100]}")
+                    for r in results:
+                        print(f"      Found: {r.title[:60]}...")
+                if rate_limiter:
+                    rate_limiter.record_success()
+            elif response.status_code in engine.status_messages:
+                print(f"    {color.warning(engine.status_messages[response.status_code])}")
+                if rate_limiter and response.status_code in engine.block_statuses:
+                    rate_limiter.record_block()
+            elif debug:
+                print(f"    [DEBUG] {engine.name} error: {response_text(response)[:100]}")
+
+        if request.stream:
+            # Drops the connection if the parser stopped early, so the rest
+            # of the page is never downloaded
+            response.close()
 
     except Exception as e:
         if debug:
-            print(f"    [DEBUG] Bing exception: {e}")
+            print(f"    [DEBUG] {engine.name} ({engine.host}) exception: {e}")
 
-    return results
+    return results, cursor
 
 
-def search_duckduckgo_api(query, num_results=10, verbose=False, debug=False, rate_limiter=None):
-    """Search using DuckDuckGo Instant Answer API with HTML fallback.
+def fetch_more_pages(engine, query, settings, first_page, cursor, depth, num_results=10,
+                     verbose=False, debug=False, rate_limiter=None):
+    """Fetch result pages 2..depth of a query and return their new results.
 
-    The Instant Answer API only returns knowledge-graph style results,
-    which are often empty for phone numbers. When the API returns no results,
-    falls back to scraping the DuckDuckGo HTML lite search page for
-    actual web results.
+    Stops at the first page that brings no URL not already seen. Engines
+    whose pages only need a page number get them fetched concurrently in
+    waves of engine.page_wave (each request still paced by rate_limiter),
+    so no further wave is sent once a page comes back empty; the others
+    follow the cursor of the page before.
     """
-    results = []
-
-    # --- Phase 1: Try the Instant Answer API first ---
-    try:
-        url = "https://api.duckduckgo.com/"
-        params = {
-            'q': query,
-            'format': 'json',
-            'no_html': 1,
-            'skip_disambig': 1,
-        }
-
-        response, was_blocked = request_with_retry(
-            'get', url, params=params, _api_mode=True, debug=debug
-        )
-
-        if was_blocked:
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo API blocked, trying HTML fallback...")
-        elif response and response.status_code == 200:
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo API status: {response.status_code}")
-
-            data = response.json()
-
-            # Abstract
-            if data.get('Abstract'):
-                results.append({
-                    'title': data.get('Heading', 'DuckDuckGo Result'),
-                    'url': data.get('AbstractURL', ''),
-                    'snippet': data.get('Abstract', ''),
-                    'source': 'DuckDuckGo'
-                })
-                if verbose:
-                    print(f"      Found: {data.get('Heading', '')[:60]}...")
-
-            # Related topics
-            for topic in data.get('RelatedTopics', [])[:num_results]:
-                if isinstance(topic, dict) and topic.get('Text'):
-                    results.append({
-                        'title': topic.get('Text', '')[:80],
-                        'url': topic.get('FirstURL', ''),
-                        'snippet': topic.get('Text', ''),
-                        'source': 'DuckDuckGo'
-                    })
-                    if verbose:
-                        print(f"      Found: {topic.get('Text', '')[:60]}...")
-
-            # Results
-            for item in data.get('Results', [])[:num_results]:
-                results.append({
-                    'title': item.get('Text', ''),
-                    'url': item.get('FirstURL', ''),
-                    'snippet': item.get('Text', ''),
-                    'source': 'DuckDuckGo'
-                })
-
-    except Exception as e:
+    seen_urls = set()
+    deduplicate(first_page, seen_urls)
+    pages = range(1, min(depth, engine.max_pages))
+    more = []
+
+    def fetch(page, page_cursor=None):
+        request = engine.page_request(query, settings, page, num_results, page_cursor)
+        if request is None:
+            return [], None
+        if rate_limiter:
+            rate_limiter.pace()
+        return send_engine_request(engine, request, num_results, verbose, debug, rate_limiter, paged=True)
+
+    def keep(page, results):
+        new = deduplicate(results, seen_urls)
         if debug:
-            print(f"    [DEBUG] DuckDuckGo API exception: {e}")
-
-    # --- Phase 2: HTML fallback when API returns few/no results ---
-    if len(results) < 3:
-        html_results = _search_duckduckgo_html(query, num_results, verbose, debug, rate_limiter)
-        results.extend(html_results)
-
-    if rate_limiter and results:
-        rate_limiter.record_success()
+            print(f"    [DEBUG] {engine.name} page {page + 1}: {len(results)} results, {len(new)} new")
+        more.extend(new)
+        return bool(new)
+
+    if engine.concurrent_pages:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=engine.page_wave) as pool:
+            for start in range(0, len(pages), engine.page_wave):
+                wave = pages[start:start + engine.page_wave]
+                found = list(pool.map(fetch, wave))
+                if not all(keep(page, results) for page, (results, _) in zip(wave, found)):
+                    break
+    else:
+        for page in pages:
+            results, cursor = fetch(page, cursor)
+            if not keep(page, results):
+                break
 
-    return results
+    return more
 
 
-def _search_duckduckgo_html(query, num_results=10, verbose=False, debug=False, rate_limiter=None):
-    """Scrape DuckDuckGo HTML lite search for actual web results.
+def run_engine(engine, query, settings, num_results=10, verbose=False, debug=False,
+               rate_limiter=None, fallback_rate_limiter=None, depth=1):
+    """Run one telespot_engines adapter over the shared requests session.
 
-    This is the fallback when the Instant Answer API returns nothing,
-    which is common for phone number queries. The HTML lite version is
-    lightweight and less likely to trigger captchas.
+    With depth > 1 up to depth result pages are fetched (see
+    fetch_more_pages()). If the engine has a fallback and returns too few
+    results, the fallback engine is run too, paced by fallback_rate_limiter
+    when given.
     """
-    results = []
-
-    try:
-        url = "https://html.duckduckgo.com/html/"
-        data = {'q': query, 'b': ''}
-
-        response, was_blocked = request_with_retry(
-            'post', url, data=data, max_retries=2, debug=debug
-        )
-
-        if was_blocked:
-            if rate_limiter:
-                rate_limiter.record_block()
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo HTML search blocked")
-            return results
-
-        if response and response.status_code == 200:
-            body = response.text
-
-            # Parse result links: <a rel="nofollow" class="result__a" href="...">title</a>
-            link_pattern = r'<a[^>]*class="result__a"[^>]*href="([^"]*)"[^>]*>(.*?)</a>'
-            links = re.findall(link_pattern, body, re.DOTALL)
-
-            # Parse snippets: <a class="result__snippet" ...>snippet text</a>
-            snippet_pattern = r'<a[^>]*class="result__snippet"[^>]*>(.*?)</a>'
-            snippets = re.findall(snippet_pattern, body, re.DOTALL)
-
-            for i, (href, title) in enumerate(links[:num_results]):
-                # Clean HTML tags from title and snippet
-                clean_title = re.sub(r'<[^>]+>', '', title).strip()
-                clean_snippet = ''
-                if i < len(snippets):
-                    clean_snippet = re.sub(r'<[^>]+>', '', snippets[i]).strip()
-
-                # DuckDuckGo wraps URLs in a redirect - extract the actual URL
-                actual_url = href
-                if 'uddg=' in href:
-                    url_match = re.search(r'uddg=([^&]+)', href)
-                    if url_match:
-                        from urllib.parse import unquote
-                        actual_url = unquote(url_match.group(1))
-
-                if clean_title and actual_url:
-                    results.append({
-                        'title': clean_title,
-                        'url': actual_url,
-                        'snippet': clean_snippet,
-                        'source': 'DuckDuckGo'
-                    })
-                    if verbose:
-                        print(f"      Found: {clean_title[:60]}...")
-
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo HTML returned {len(results)} results")
-
-    except Exception as e:
+    request = engine.build_request(query, settings, num_results)
+    if request is None:
         if debug:
-            print(f"    [DEBUG] DuckDuckGo HTML exception: {e}")
+            print(f"    [DEBUG] {engine.name} API not configured")
+        return []
+
+    paged = depth > 1 and engine.max_pages > 1
+    results, cursor = send_engine_request(engine, request, num_results, verbose, debug, rate_limiter, paged)
+    if paged and results:
+        results.extend(fetch_more_pages(engine, query, settings, results, cursor, depth,
+                                        num_results, verbose, debug, rate_limiter))
+
+    if engine.fallback and len(results) < engine.min_results:
+        if fallback_rate_limiter:
+            fallback_rate_limiter.pace()
+        results.extend(run_engine(
+            engine.fallback, query, settings, num_results, verbose, debug,
+            fallback_rate_limiter or rate_limiter, depth=depth
+        ))
 
     return results
 
 
-def search_dehashed_api(query, api_key, verbose=False, debug=False, rate_limiter=None):
-    """Search Dehashed breach database (optional) with retry and captcha detection"""
-    results = []
+@cached_search('Google')
+def search_google_api(query, api_key, cse_id, num_results=10, verbose=False, debug=False, rate_limiter=None,
+                      depth=1):
+    """Search using Google Custom Search API with retry and captcha detection"""
+    settings = {'google_api_key': api_key, 'google_cse_id': cse_id}
+    return run_engine(get_engine('Google'), query, settings, num_results, verbose, debug, rate_limiter,
+                      depth=depth)
 
-    if not api_key:
-        if debug:
-            print("    [DEBUG] Dehashed API not configured")
-        return results
 
-    try:
-        url = "https://api.dehashed.com/search"
-        params = {'query': f'phone:"{query}"'}
-        headers = get_api_headers()
-        headers['Accept'] = 'application/json'
-        auth = (api_key.split(':')[0], api_key.split(':')[1]) if ':' in api_key else (api_key, '')
+@cached_search('Bing')
+def search_bing_api(query, api_key, num_results=10, verbose=False, debug=False, rate_limiter=None, depth=1):
+    """Search using Bing Search API (Azure Cognitive Services) with retry and captcha detection"""
+    settings = {'bing_api_key': api_key}
+    return run_engine(get_engine('Bing'), query, settings, num_results, verbose, debug, rate_limiter,
+                      depth=depth)
 
-        response, was_blocked = request_with_retry(
-            'get', url, params=params, headers=headers, auth=auth, debug=debug
-        )
 
-        if was_blocked:
-            if rate_limiter:
-                rate_limiter.record_block()
-            print(f"    {color.warning('Dehashed API blocked/rate limited')}")
-            return results
+@cached_search('DuckDuckGo')
+def search_duckduckgo_api(query, num_results=10, verbose=False, debug=False, rate_limiter=None,
+                          html_rate_limiter=None, depth=1):
+    """Search using DuckDuckGo Instant Answer API with HTML fallback.
 
-        if debug:
-            print(f"    [DEBUG] Dehashed API status: {response.status_code}")
-
-        if response.status_code == 200:
-            data = response.json()
-            for entry in data.get('entries', [])[:10]:
-                name = f"{entry.get('name', '')} {entry.get('username', '')}".strip()
-                results.append({
-                    'title': name or 'Dehashed Entry',
-                    'url': entry.get('database_name', ''),
-                    'snippet': f"Email: {entry.get('email', 'N/A')} | Database: {entry.get('database_name', 'N/A')}",
-                    'source': 'Dehashed'
-                })
-                if verbose:
-                    print(f"      Found: {name[:60]}...")
-            if rate_limiter:
-                rate_limiter.record_success()
-        elif response.status_code == 401:
-            print(f"    {color.warning('Dehashed API key invalid')}")
-        elif debug:
-            print(f"    [DEBUG] Dehashed error: {response.text[:100]}")
+    The HTML lite host is paced by html_rate_limiter when given, so a
+    captcha there does not slow down the API host. depth pages the HTML results.
+    """
+    return run_engine(get_engine('DuckDuckGo'), query, {}, num_results, verbose, debug,
+                      rate_limiter, html_rate_limiter, depth=depth)
 
-    except Exception as e:
-        if debug:
-            print(f"    [DEBUG] Dehashed exception: {e}")
 
-    return results
+@cached_search('Dehashed')
+def search_dehashed_api(query, api_key, verbose=False, debug=False, rate_limiter=None):
+    """Search Dehashed breach database (optional) with retry and captcha detection"""
+    settings = {'dehashed_api_key': api_key}
+    return run_engine(get_engine('Dehashed'), query, settings, 10, verbose, debug, rate_limiter)
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # PATTERN EXTRACTION
@@ -944,28 +1008,41 @@ def extract_names(text):
     return [n for n in names if n not in excluded and len(n.split()) >= 2]
 
 
-def extract_locations(text):
-    """Extract potential locations from text"""
-    locations = []
+_STATE_ABBRS = '|'.join(US_STATES)
+# Longest first so "West Virginia" wins over "Virginia"
+_STATE_NAMES = '|'.join(sorted(US_STATES.values(), key=len, reverse=True))
 
-    # State abbreviations
-    state_pattern = r'\b(' + '|'.join(US_STATES.keys()) + r')\b'
-    locations.extend(re.findall(state_pattern, text))
+# One pass over the text finds ZIP codes, "City, ST" pairs, full state names
+# and bare state abbreviations. Built once at import.
+LOCATION_PATTERN = re.compile(
+    r'\b(?:(?P<zip>\d{5}(?:-\d{4})?)'
+    r'|(?P<city>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),?\s+(?P<city_state>' + _STATE_ABBRS + r')'
+    r'|(?P<state_name>' + _STATE_NAMES + r')'
+    r'|(?P<state>' + _STATE_ABBRS + r'))\b'
+)
+STATE_NAME_PATTERN = re.compile(r'\b(?:' + _STATE_NAMES + r')\b')
 
-    # City, State combinations
-    city_state_pattern = r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),?\s+(' + '|'.join(US_STATES.keys()) + r')\b'
-    for city, state in re.findall(city_state_pattern, text):
-        locations.append(f"{city}, {state}")
 
-    # Full state names
-    for abbr, full_name in US_STATES.items():
-        if full_name in text:
-            locations.append(full_name)
+def extract_locations(text):
+    """Extract potential locations from text.
 
-    # Zip codes
-    locations.extend(re.findall(r'\b\d{5}(?:-\d{4})?\b', text))
+    Returns each distinct state abbreviation, "City, ST" pair, full state
+    name and ZIP code found. A "City, ST" match also yields its state, and
+    any state name inside the city ("Kansas City, MO").
+    """
+    locations = set()
+
+    for match in LOCATION_PATTERN.finditer(text):
+        state = match.group('city_state')
+        if state:
+            city = match.group('city')
+            locations.add(f"{city}, {state}")
+            locations.add(state)
+            locations.update(STATE_NAME_PATTERN.findall(city))
+        else:
+            locations.add(match.group(match.lastgroup))
 
-    return list(set(locations))
+    return list(locations)
 
 
 def extract_usernames(text):
@@ -983,53 +1060,72 @@ def extract_usernames(text):
     return list(set(u for u in usernames if u.lower() not in excluded))
 
 
-def analyze_results(all_results, verbose=False):
-    """Analyze all results for patterns"""
-    all_text = []
-    source_counts = Counter()
-
-    for format_str, results in all_results.items():
-        for result in results:
-            text = f"{result.get('title', '')} {result.get('snippet', '')} {result.get('url', '')}"
-            all_text.append(text)
-            source_counts[result.get('source', 'Unknown')] += 1
-
-    combined_text = ' '.join(all_text)
-
-    names = extract_names(combined_text)
-    name_counter = Counter(names)
+class PatternAnalyzer:
+    """Incremental pattern analysis, fed one result at a time.
 
-    locations = extract_locations(combined_text)
-    location_counter = Counter(locations)
+    Each result is run through the extractors on its own, so every counter
+    holds the number of distinct results that mention an entity. snapshot()
+    can be taken at any point and has the same shape analyze_results()
+    always returned.
+    """
 
-    usernames = extract_usernames(combined_text)
-    username_counter = Counter(usernames)
+    def __init__(self):
+        self.total = 0
+        self.urls = set()               # url_fingerprint()s of normalized URLs
+        self.source_counts = Counter()
+        self.names = Counter()
+        self.locations = Counter()
+        self.usernames = Counter()
+
+    def add(self, result):
+        """Analyze one result"""
+        text = f"{result.title} {result.snippet} {result.url}"
+        self.total += 1
+        if result.key:
+            self.urls.add(url_fingerprint(result.key))
+        self.source_counts[result.source] += 1
+        self.names.update(set(extract_names(text)))
+        self.locations.update(extract_locations(text))
+        self.usernames.update(extract_usernames(text))
+
+    def add_all(self, results):
+        for result in results:
+            self.add(result)
+
+    def snapshot(self):
+        """Get the patterns and confidence score for everything seen so far"""
+        total = self.total
+        name_consistency = len([n for n, c in self.names.items() if c >= 2])
+        location_consistency = len([l for l, c in self.locations.items() if c >= 2])
+
+        if total >= 20 and name_consistency >= 2:
+            confidence = 'HIGH'
+            confidence_pct = min(100, 60 + name_consistency * 10 + location_consistency * 5)
+        elif total >= 10 or name_consistency >= 1:
+            confidence = 'MEDIUM'
+            confidence_pct = min(74, 40 + total + name_consistency * 5)
+        else:
+            confidence = 'LOW'
+            confidence_pct = min(39, total * 3)
 
-    # Calculate confidence score
-    total = len(all_text)
-    name_consistency = len([n for n, c in name_counter.items() if c >= 2])
-    location_consistency = len([l for l, c in location_counter.items() if c >= 2])
+        return {
+            'total_results': total,
+            'unique_urls': len(self.urls),
+            'results_by_source': dict(self.source_counts),
+            'names': self.names.most_common(10),
+            'locations': self.locations.most_common(10),
+            'usernames': self.usernames.most_common(10),
+            'confidence': confidence,
+            'confidence_pct': confidence_pct,
+        }
 
-    if total >= 20 and name_consistency >= 2:
-        confidence = 'HIGH'
-        confidence_pct = min(100, 60 + name_consistency * 10 + location_consistency * 5)
-    elif total >= 10 or name_consistency >= 1:
-        confidence = 'MEDIUM'
-        confidence_pct = min(74, 40 + total + name_consistency * 5)
-    else:
-        confidence = 'LOW'
-        confidence_pct = min(39, total * 3)
 
-    return {
-        'total_results': total,
-        'unique_urls': len(set(r.get('url', '') for results in all_results.values() for r in results)),
-        'results_by_source': dict(source_counts),
-        'names': name_counter.most_common(10),
-        'locations': location_counter.most_common(10),
-        'usernames': username_counter.most_common(10),
-        'confidence': confidence,
-        'confidence_pct': confidence_pct,
-    }
+def analyze_results(all_results, verbose=False):
+    """Analyze all results for patterns"""
+    analyzer = PatternAnalyzer()
+    for results in all_results.values():
+        analyzer.add_all(results)
+    return analyzer.snapshot()
 
 
 def deduplicate_results(all_results):
@@ -1037,28 +1133,14 @@ def deduplicate_results(all_results):
 
     Keeps the first occurrence (with the most complete data) and removes
     later duplicates. This prevents inflated result counts and improves
-    pattern analysis accuracy.
+    pattern analysis accuracy. URLs are compared in canonical form (see
+    normalize_url()), so scheme, www., tracking parameters and fragments
+    do not make a URL unique.
 
     Returns a new dict with the same format-keyed structure but deduplicated.
     """
     seen_urls = set()
-    deduped = {}
-
-    for fmt, results in all_results.items():
-        unique_results = []
-        for result in results:
-            url = result.get('url', '').rstrip('/')
-            # Normalize URL for comparison (strip trailing slash, lowercase)
-            normalized = url.lower().strip()
-            if normalized and normalized not in seen_urls:
-                seen_urls.add(normalized)
-                unique_results.append(result)
-            elif not normalized:
-                # Keep results without URLs (e.g., some DuckDuckGo results)
-                unique_results.append(result)
-        deduped[fmt] = unique_results
-
-    return deduped
+    return {fmt: deduplicate(results, seen_urls) for fmt, results in all_results.items()}
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # OUTPUT FUNCTIONS
@@ -1131,42 +1213,69 @@ def print_results(patterns, phone_number, all_results, verbose=False):
                 print(f"Format: {fmt}")
                 print("-" * 70)
                 for i, r in enumerate(results, 1):
-                    print(f"\n[{i}] {r.get('title', 'N/A')}")
-                    print(f"    URL: {r.get('url', 'N/A')}")
-                    print(f"    Source: {r.get('source', 'N/A')}")
-                    if r.get('snippet'):
-                        print(f"    Description: {r.get('snippet', '')[:200]}...")
+                    print(f"\n[{i}] {r.title}")
+                    print(f"    URL: {r.url}")
+                    print(f"    Source: {r.source}")
+                    if r.snippet:
+                        print(f"    Description: {r.snippet[:200]}...")
                 print()
 
 
-def save_json_results(phone_number, formats, all_results, patterns, filename=None):
-    """Save results to JSON file"""
-    if not filename:
-        clean_phone = re.sub(r'\D', '', phone_number)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"telespot_{clean_phone}_{timestamp}.json"
+def default_output_filename(phone_number, extension):
+    """Get the default output file name for a number, e.g. telespot_2155551234_20240501_120000.json"""
+    clean_phone = re.sub(r'\D', '', phone_number)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"telespot_{clean_phone}_{timestamp}.{extension}"
+
 
+def plain_results(all_results):
+    """Turn fmt -> [Result] into JSON-ready fmt -> [dict]"""
+    return {fmt: [r.to_dict() for r in results] for fmt, results in all_results.items()}
+
+
+def json_results(phone_number, formats, all_results, patterns):
+    """Build the JSON document of a search (what -o file.json and --machine write)"""
     output = {
         'version': VERSION,
         'timestamp': datetime.now().isoformat(),
         'phone_number': phone_number,
         'search_formats': formats,
         'patterns': patterns,
-        'results': {fmt: results for fmt, results in all_results.items()},
+        'results': plain_results(all_results),
     }
+    profiler = get_profiler()
+    if profiler is not None:
+        output['timings'] = profiler.summary()
+    return output
+
+
+def save_json_results(phone_number, formats, all_results, patterns, filename=None):
+    """Save results to JSON file"""
+    if not filename:
+        filename = default_output_filename(phone_number, 'json')
 
     with open(filename, 'w') as f:
-        json.dump(output, f, indent=2)
+        json.dump(json_results(phone_number, formats, all_results, patterns), f, indent=2)
 
     return filename
 
 
+def print_profile():
+    """Print the --profile stage timings, if profiling is on"""
+    profiler = get_profiler()
+    if profiler is None:
+        return
+    print(color.header("STAGE TIMINGS"))
+    print("=" * 70)
+    for line in format_summary(profiler.summary()):
+        print(f"  {line}")
+    print()
+
+
 def save_txt_results(phone_number, formats, all_results, patterns, filename=None):
     """Save results to TXT file"""
     if not filename:
-        clean_phone = re.sub(r'\D', '', phone_number)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"telespot_{clean_phone}_{timestamp}.txt"
+        filename = default_output_filename(phone_number, 'txt')
 
     with open(filename, 'w') as f:
         f.write("=" * 70 + "\n")
@@ -1215,28 +1324,135 @@ def save_txt_results(phone_number, formats, all_results, patterns, filename=None
                 f.write(f"Format: {fmt}\n")
                 f.write("-" * 70 + "\n\n")
                 for i, r in enumerate(results, 1):
-                    f.write(f"[{i}] {r.get('title', 'N/A')}\n")
-                    f.write(f"URL: {r.get('url', 'N/A')}\n")
-                    f.write(f"Source: {r.get('source', 'N/A')}\n")
-                    if r.get('snippet'):
-                        f.write(f"Description: {r.get('snippet', '')}\n")
+                    f.write(f"[{i}] {r.title}\n")
+                    f.write(f"URL: {r.url}\n")
+                    f.write(f"Source: {r.source}\n")
+                    if r.snippet:
+                        f.write(f"Description: {r.snippet}\n")
                     f.write("\n")
 
     return filename
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# INTERACTIVE SETUP
+# RESULT STORE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def interactive_setup():
-    """Interactive API key setup"""
-    print(color.header("\n" + "=" * 60))
-    print(color.header("TELESPOT API CONFIGURATION"))
-    print(color.header("=" * 60))
-    print("\nThis will configure your API keys for searching.")
-    print("Press Enter to skip any API you don't want to configure.\n")
+# SQLite store every run is written into (None unless --store is given)
+_result_store = None
 
-    # Google
+# telespot query flags -> entity kind in the store
+QUERY_ENTITY_KINDS = {'name': 'name', 'username': 'username', 'location': 'location', 'email': 'email'}
+
+
+def configure_result_store(path=None):
+    """Open the result store at path for this run (None disables it)"""
+    global _result_store
+    _result_store = None
+    if not path:
+        return None
+    import sqlite3
+    from telespot_store import ResultStore
+    try:
+        _result_store = ResultStore(path)
+    except sqlite3.Error as e:
+        print(color.warning(f"Could not open result store: {e}"))
+    return _result_store
+
+
+def get_result_store():
+    """Get the global result store, or None if runs are not stored"""
+    return _result_store
+
+
+def store_run(phone_number, formats, all_results, patterns):
+    """Write a finished run into the result store, if one is open"""
+    store = get_result_store()
+    if store is None:
+        return None
+    import sqlite3
+    try:
+        return store.save_run(phone_number, formats, all_results, patterns, VERSION)
+    except sqlite3.Error as e:
+        print(color.warning(f"Could not write to result store: {e}"))
+        return None
+
+
+def run_query(args):
+    """Answer 'which numbers mention this URL/domain/name/username' from the store"""
+    if not os.path.exists(args.store):
+        print(color.error(f"No result store at {args.store} (run searches with --store first)"))
+        return 1
+    from telespot_store import ResultStore
+    store = ResultStore(args.store)
+    try:
+        if args.number:
+            runs = store.runs_for_number(args.number)
+            if args.json:
+                print(json.dumps(runs, indent=2))
+                return 0
+            for run in runs:
+                created = datetime.fromtimestamp(run['created']).strftime('%Y-%m-%d %H:%M')
+                print(f"  run {run['run_id']}  {created}  {run['total_results']} results, "
+                      f"confidence {run['confidence']} ({run['confidence_pct']}%)")
+            if not runs:
+                print(color.warning(f"No stored runs for {args.number}"))
+            return 0
+
+        if args.related:
+            related = store.related_numbers(args.related, limit=args.limit)
+            if args.json:
+                print(json.dumps(related, indent=2))
+                return 0
+            if not related:
+                print(color.warning(f"No stored numbers share entities with {args.related}"))
+                return 0
+            print(color.header(f"{len(related)} number(s) related to {args.related}:"))
+            for match in related:
+                shared = ', '.join(f"{entity['kind']} {entity['value']}" for entity in match['shared'][:5])
+                more = len(match['shared']) - 5
+                if more > 0:
+                    shared += f" (+{more} more)"
+                print(f"  {match['phone_number']:<20} score {match['score']:<7} {shared}")
+            return 0
+
+        if args.url:
+            label, matches = args.url, store.numbers_for_url(args.url)
+        elif args.domain:
+            label, matches = args.domain, store.numbers_for_domain(args.domain)
+        else:
+            flag = next(flag for flag in QUERY_ENTITY_KINDS if getattr(args, flag))
+            label = getattr(args, flag)
+            matches = store.numbers_for_entity(QUERY_ENTITY_KINDS[flag], label)
+    finally:
+        store.close()
+
+    if args.json:
+        print(json.dumps(matches, indent=2))
+        return 0
+
+    if not matches:
+        print(color.warning(f"No stored numbers mention {label}"))
+        return 0
+    print(color.header(f"{len(matches)} number(s) mention {label}:"))
+    for match in matches:
+        last_seen = datetime.fromtimestamp(match['last_seen']).strftime('%Y-%m-%d %H:%M')
+        print(f"  {match['phone_number']:<20} {match['matches']} match(es) in {match['runs']} run(s), "
+              f"last seen {last_seen}")
+    return 0
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INTERACTIVE SETUP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def interactive_setup():
+    """Interactive API key setup"""
+    print(color.header("\n" + "=" * 60))
+    print(color.header("TELESPOT API CONFIGURATION"))
+    print(color.header("=" * 60))
+    print("\nThis will configure your API keys for searching.")
+    print("Press Enter to skip any API you don't want to configure.\n")
+
+    # Google
     print(color.info("Google Custom Search API"))
     print("  Get keys at: https://console.cloud.google.com/")
     print("  1. Enable 'Custom Search API'")
@@ -1305,6 +1521,7 @@ def interactive_setup():
 
 def update_from_repo():
     """Update telespot from the repository"""
+    import subprocess
     print(color.header("\nUpdating telespot from repository..."))
 
     try:
@@ -1334,13 +1551,327 @@ def update_from_repo():
         print(f"Update error: {e}")
         return False
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENGINE DISPATCH
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Display labels for each engine, in dispatch order
+ENGINE_LABELS = {
+    'Google': 'Google API',
+    'Bing': 'Bing API',
+    'DuckDuckGo': 'DuckDuckGo',
+    'Dehashed': 'Dehashed',
+}
+
+def engine_query(engine, fmt, query):
+    """Get the query string an engine is actually sent for a format"""
+    return get_engine(engine).query_for(fmt, query)
+
+
+def get_engine_calls(args, limiters):
+    """Get (engine, search_fn) pairs for every engine usable in this run.
+
+    Each search_fn takes (fmt, query, rate_limiter) and returns a result list,
+    so callers can schedule engines independently of each other. Limiters for
+    secondary hosts (the DuckDuckGo HTML fallback) come from the registry.
+    """
+    google_key = config.get('google_api_key', '')
+    google_cse = config.get('google_cse_id', '')
+    bing_key = config.get('bing_api_key', '')
+    dehashed_key = config.get('dehashed_api_key', '')
+
+    engines = []
+    if google_key and google_cse:
+        engines.append(('Google', lambda fmt, query, limiter: search_google_api(
+            query, google_key, google_cse, 10, args.verbose, args.debug, limiter, depth=args.depth)))
+    if bing_key:
+        engines.append(('Bing', lambda fmt, query, limiter: search_bing_api(
+            query, bing_key, 10, args.verbose, args.debug, limiter, depth=args.depth)))
+    ddg_html_limiter = limiters.get('DuckDuckGo', DDG_HTML_HOST)
+    engines.append(('DuckDuckGo', lambda fmt, query, limiter: search_duckduckgo_api(
+        query, 10, args.verbose, args.debug, limiter, ddg_html_limiter, depth=args.depth)))
+    if dehashed_key and args.dehashed:
+        engines.append(('Dehashed', lambda fmt, query, limiter: search_dehashed_api(
+            engine_query('Dehashed', fmt, query), dehashed_key, args.verbose, args.debug, limiter)))
+    return engines
+
+
+class SaturationTracker:
+    """Stops querying an engine once new formats stop turning up new URLs.
+
+    Every request's results are checked against the URLs (normalized as in
+    deduplication) already found by any engine in the run. An engine is
+    saturated after `patience` requests in a row each bring fewer than
+    min_new new URLs; its remaining uncached queries are skipped.
+    """
+
+    def __init__(self, min_new=1, patience=2):
+        self.min_new = min_new
+        self.patience = patience
+        self.seen_urls = set()          # url_fingerprint()s, as deduplicate() keeps them
+        self.saturated = set()
+        self.low_streak = Counter()
+        self.requests = Counter()
+        self.time_spent = Counter()
+        self.skipped = Counter()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a tracker from the saturation_* config settings"""
+        try:
+            min_new = int(settings.get('saturation_min_new') or 1)
+            patience = int(settings.get('saturation_patience') or 2)
+        except ValueError:
+            min_new, patience = 1, 2
+        return cls(min_new, max(1, patience))
+
+    def is_saturated(self, engine):
+        return engine in self.saturated
+
+    def record(self, engine, results, elapsed=0.0, cached=False):
+        """Record one request's results.
+
+        Returns (new_urls, became_saturated). Cached results still count
+        towards the yield but not towards the per-request cost.
+        """
+        new = 0
+        for r in results:
+            if not r.key:
+                continue
+            fingerprint = url_fingerprint(r.key)
+            if fingerprint not in self.seen_urls:
+                self.seen_urls.add(fingerprint)
+                new += 1
+
+        if not cached:
+            self.requests[engine] += 1
+            self.time_spent[engine] += elapsed
+
+        if new >= self.min_new:
+            self.low_streak[engine] = 0
+            return new, False
+        self.low_streak[engine] += 1
+        if self.low_streak[engine] >= self.patience and engine not in self.saturated:
+            self.saturated.add(engine)
+            return new, True
+        return new, False
+
+    def skip(self, engine):
+        self.skipped[engine] += 1
+
+    def time_saved(self):
+        """Estimate the seconds saved, at each engine's mean cost per request"""
+        return sum(
+            count * self.time_spent[engine] / self.requests[engine]
+            for engine, count in self.skipped.items() if self.requests[engine]
+        )
+
+    def summary(self):
+        """Describe skipped queries, e.g. '5 queries skipped (Google 2, DuckDuckGo 3), ~12.4s saved'"""
+        total = sum(self.skipped.values())
+        per_engine = ', '.join(f"{engine} {count}" for engine, count in self.skipped.items())
+        return f"{total} queries skipped ({per_engine}), ~{self.time_saved():.1f}s saved"
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # MAIN SEARCH FUNCTION
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def run_search(phone_number, args):
-    """Main search orchestration with adaptive rate limiting and captcha resilience"""
-    global color
+def _print_engine_count(results, new=None):
+    """Print an engine's result count, noting results served from the cache"""
+    cached = last_search_cached()
+    new_text = f", {new} new" if new is not None else ''
+    print(f"({len(results)} results{new_text}{', cached' if cached else ''})")
+
+
+def _print_saturated(name, tracker):
+    print(f"  {color.warning(f'{ENGINE_LABELS[name]} saturated (no new URLs in {tracker.patience} queries) - skipping it for remaining formats')}")
+
+
+def _pace_engine(name, fmt, query, limiter):
+    """Wait for an engine's next request slot unless the query is cached.
+
+    Returns the number of seconds slept.
+    """
+    if _is_cached(name, fmt, query):
+        return 0.0
+    return limiter.pace()
+
+
+def _is_cached(name, fmt, query):
+    cache = get_query_cache()
+    if cache is None:
+        return False
+    from telespot_cache import cache_query
+    depth = _search_depth if get_engine(name).page_limit() > 1 else 1
+    return cache.contains(name, cache_query(engine_query(name, fmt, query), depth))
+
+
+def _budget_quota(plans):
+    """Fit the plans' metered requests into the remaining API quota and report it"""
+    ledger = get_quota_ledger()
+    if ledger is None:
+        return
+    stats = ledger.get_stats()
+    pages = {name: min(_search_depth, get_engine(name).max_pages) for name in ENGINES}
+    for engine, (requested, granted) in budget_plans(ledger, plans, _is_cached, pages).items():
+        if not requested:
+            continue
+        line = f"{engine} quota: {requested} requests planned, {describe_usage(stats[engine])}"
+        if granted < requested:
+            print(color.warning(f"{line} - {requested - granted} skipped, "
+                                f"those formats use the other engines"))
+        else:
+            print(color.info(line))
+
+
+def _print_shared_count(results, primary):
+    """Print the result count of a format answered by another format's request"""
+    print(f"({len(results)} results, same search as {primary})")
+
+
+def _search_formats_sequential(queries, engines, limiters, plan, collect, tracker=None):
+    """Search each format on each engine in turn.
+
+    Only the engine about to be called is waited on, so a throttled engine
+    does not hold back the others. Formats the plan collapses onto an earlier
+    one reuse its results, and engines the tracker reports saturated are
+    skipped. collect(fmt, format_results) is called as each format finishes
+    and returns the results to keep for it.
+    """
+    all_results = {}
+    engine_results = {}
+
+    for i, (fmt, query) in enumerate(queries, 1):
+        print(f"{color.header(f'[{i}/{len(queries)}]')} Searching: {fmt}")
+
+        format_results = []
+        waited = 0.0
+
+        for name, search_fn in engines:
+            primary = plan.covered_by(name, fmt)
+            if primary is None or (primary != fmt and (name, primary) not in engine_results):
+                continue
+            if (primary == fmt and tracker is not None and tracker.is_saturated(name)
+                    and not _is_cached(name, fmt, query)):
+                tracker.skip(name)
+                continue
+            print(f"  -> {ENGINE_LABELS[name]}...", end=' ', flush=True)
+            if primary != fmt:
+                results = list(engine_results[(name, primary)])
+                format_results.extend(results)
+                _print_shared_count(results, primary)
+                continue
+            limiter = limiters.get(name)
+            start = time.monotonic()
+            waited += _pace_engine(name, fmt, query, limiter)
+            results = search_fn(fmt, query, limiter)
+            engine_results[(name, fmt)] = results
+            format_results.extend(results)
+            if tracker is None:
+                _print_engine_count(results)
+                continue
+            new, saturated = tracker.record(name, results, time.monotonic() - start, last_search_cached())
+            _print_engine_count(results, new)
+            if saturated:
+                _print_saturated(name, tracker)
+
+        print(f"  {color.success(f'+ {len(format_results)} total for this format')}")
+        all_results[fmt] = collect(fmt, format_results)
+
+        if waited > 0:
+            status = f"waited {waited:.1f}s"
+            blocks = limiters.total_blocks()
+            if blocks > 0:
+                status += f", blocks={blocks}"
+            print(f"  {color.warning(f'Rate limiting: {status}')}")
+        print()
+
+    return all_results
+
+
+def _search_formats_parallel(queries, engines, limiters, jobs, plan, collect, tracker=None):
+    """Search every (format, engine) pair the plan needs on a thread pool.
+
+    Each engine is paced by its own rate limiter, so engines run side by
+    side instead of waiting on each other. Results are printed and passed to
+    collect() format by format in the same order as sequential mode. Once
+    the tracker reports an engine saturated, its calls that have not
+    started yet are cancelled.
+    """
+    get_session(pool_size=jobs)
+    start = time.monotonic()
+
+    def run_call(name, search_fn, fmt, query):
+        call_start = time.monotonic()
+        limiter = limiters.get(name)
+        _pace_engine(name, fmt, query, limiter)
+        results = search_fn(fmt, query, limiter)
+        return results, time.monotonic() - call_start, last_search_cached()
+
+    query_of = dict(queries)
+
+    from concurrent.futures import ThreadPoolExecutor
+    all_results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            (name, fmt): pool.submit(run_call, name, search_fn, fmt, query)
+            for fmt, query in queries
+            for name, search_fn in engines
+            if plan.is_primary(name, fmt)
+        }
+
+        for i, (fmt, _) in enumerate(queries, 1):
+            print(f"{color.header(f'[{i}/{len(queries)}]')} Searching: {fmt}")
+            format_results = []
+            for name, _ in engines:
+                primary = plan.covered_by(name, fmt)
+                if primary is None:
+                    continue
+                future = futures[(name, primary)]
+                if future.cancelled():
+                    if primary == fmt:
+                        tracker.skip(name)
+                    continue
+                try:
+                    results, elapsed, cached = future.result()
+                except Exception as e:
+                    if primary == fmt:
+                        print(color.warning(f"  -> {ENGINE_LABELS[name]} failed: {e}"))
+                    continue
+                if primary != fmt:
+                    results = list(results)
+                    print(f"  -> {ENGINE_LABELS[name]}...", end=' ')
+                    _print_shared_count(results, primary)
+                elif tracker is None:
+                    print(f"  -> {ENGINE_LABELS[name]}... ({len(results)} results)")
+                else:
+                    new, saturated = tracker.record(name, results, elapsed, cached)
+                    print(f"  -> {ENGINE_LABELS[name]}... ({len(results)} results, {new} new)")
+                    if saturated:
+                        _print_saturated(name, tracker)
+                        for (other, other_fmt), pending in futures.items():
+                            if other == name and not _is_cached(name, other_fmt, query_of[other_fmt]):
+                                pending.cancel()
+                format_results.extend(results)
+            print(f"  {color.success(f'+ {len(format_results)} total for this format')}")
+            all_results[fmt] = collect(fmt, format_results)
+            print()
+
+    elapsed = time.monotonic() - start
+    print(color.info(f"Parallel search: {jobs} workers, {elapsed:.1f}s"))
+    return all_results
+
+
+def run_search(phone_number, args, limiters=None, writer=None):
+    """Main search orchestration with adaptive rate limiting and captcha resilience.
+
+    A long-running caller ('telespot serve') passes its own limiters, so
+    pacing carries over between lookups, and a writer receiving the NDJSON
+    records in place of an output file.
+    """
+    global color, _search_depth
+    _search_depth = args.depth
 
     # Set color mode
     if args.no_color:
@@ -1364,28 +1895,18 @@ def run_search(phone_number, args):
     print(f"Using {len(formats)} format variations\n")
 
     # Show API status
-    config.display_api_status()
+    if not args.quiet:
+        config.display_api_status()
 
     # DTMF display
     if args.dtmf:
         dtmf = get_dtmf_representation(phone_number)
         print(f"DTMF: {dtmf}\n")
 
-    # Get API keys
-    google_key = config.get('google_api_key', '')
-    google_cse = config.get('google_cse_id', '')
-    bing_key = config.get('bing_api_key', '')
-    dehashed_key = config.get('dehashed_api_key', '')
-
-    # Initialize adaptive rate limiter
-    limiter = AdaptiveRateLimiter(
-        base_delay=float(config.get('delay_seconds', '2')),
-        min_delay=1.5,
-        max_delay=15.0,
-    )
-
-    all_results = {}
-    total_found = 0
+    if limiters is None:
+        cassette = get_cassette()
+        limiters = RateLimiterRegistry(config.settings, paced=cassette is None or not cassette.replaying)
+    engines = get_engine_calls(args, limiters)
 
     # Keyword addition
     keyword_suffix = f" {args.keyword}" if args.keyword else ""
@@ -1393,63 +1914,58 @@ def run_search(phone_number, args):
     # Site restriction
     site_prefix = f"site:{args.site} " if args.site else ""
 
-    for i, fmt in enumerate(formats, 1):
-        query = f"{site_prefix}{fmt}{keyword_suffix}"
-        print(f"{color.header(f'[{i}/{len(formats)}]')} Searching: {fmt}")
+    queries = [(fmt, f"{site_prefix}{fmt}{keyword_suffix}") for fmt in formats]
 
-        format_results = []
-
-        # Google API
-        if google_key and google_cse:
-            print(f"  -> Google API...", end=' ', flush=True)
-            results = search_google_api(query, google_key, google_cse, 10, args.verbose, args.debug, limiter)
-            format_results.extend(results)
-            print(f"({len(results)} results)")
-            time.sleep(1)
-
-        # Bing API
-        if bing_key:
-            print(f"  -> Bing API...", end=' ', flush=True)
-            results = search_bing_api(query, bing_key, 10, args.verbose, args.debug, limiter)
-            format_results.extend(results)
-            print(f"({len(results)} results)")
-            time.sleep(1)
-
-        # DuckDuckGo (always available, with HTML fallback)
-        print(f"  -> DuckDuckGo...", end=' ', flush=True)
-        results = search_duckduckgo_api(query, 10, args.verbose, args.debug, limiter)
-        format_results.extend(results)
-        print(f"({len(results)} results)")
-
-        # Dehashed (optional)
-        if dehashed_key and args.dehashed:
-            print(f"  -> Dehashed...", end=' ', flush=True)
-            clean_query = re.sub(r'\D', '', fmt)
-            results = search_dehashed_api(clean_query, dehashed_key, args.verbose, args.debug, limiter)
-            format_results.extend(results)
-            print(f"({len(results)} results)")
+    # Formats that are the same search on an engine share one request
+    plan = QueryPlan(queries, [name for name, _ in engines], collapse=not args.all_queries)
+    if plan.request_count() < plan.naive_count():
+        print(color.info(f"Query plan: {plan.request_count()} requests "
+                         f"instead of {plan.naive_count()} (equivalent formats collapsed)\n"))
+    _budget_quota([plan])
 
-        all_results[fmt] = format_results
-        total_found += len(format_results)
+    tracker = SaturationTracker.from_settings(config.settings) if args.adaptive else None
 
-        print(f"  {color.success(f'+ {len(format_results)} total for this format')}")
+    # Results are deduplicated and analyzed as each format finishes, so the
+    # running confidence is visible before the search completes
+    analyzer = PatternAnalyzer()
+    seen_urls = set()
+    raw_total = 0
+
+    # NDJSON output is written as each format finishes instead of at the end
+    output_format = resolve_output_format(args.output, args.output_format)
+    if writer is None and output_format == 'ndjson':
+        writer = NDJSONWriter(args.output or default_output_filename(phone_number, 'ndjson'), VERSION)
+
+    def collect(fmt, format_results):
+        nonlocal raw_total
+        raw_total += len(format_results)
+        with timed('dedupe'):
+            unique = deduplicate(format_results, seen_urls)
+        with timed('analyze'):
+            analyzer.add_all(unique)
+        if writer is not None:
+            for r in unique:
+                writer.result(phone_number, fmt, r)
+            writer.format_summary(phone_number, fmt, len(format_results), len(unique), analyzer.total)
+        snap = analyzer.snapshot()
+        running = f"= {snap['total_results']} unique so far, confidence {snap['confidence']} ({snap['confidence_pct']}%)"
+        print(f"  {color.info(running)}")
+        return unique
 
-        # Adaptive rate limiting (adjusts based on block/success patterns)
-        if i < len(formats):
-            delay_time = limiter.wait()
-            stats = limiter.get_stats()
-            status = f"delay={stats['current_delay']}s"
-            if stats['total_blocks'] > 0:
-                status += f", blocks={stats['total_blocks']}"
-            print(f"  {color.warning(f'Waited {delay_time:.1f}s ({status})')}\n")
+    try:
+        if args.jobs > 1:
+            all_results = _search_formats_parallel(queries, engines, limiters, args.jobs, plan, collect, tracker)
         else:
-            print()
-
-    # Deduplicate results across formats
-    raw_total = total_found
-    all_results = deduplicate_results(all_results)
-    deduped_total = sum(len(r) for r in all_results.values())
-
+            all_results = _search_formats_sequential(queries, engines, limiters, plan, collect, tracker)
+    except BaseException:
+        if writer is not None:
+            # Everything collected so far is already on disk
+            writer.close()
+            print(color.warning(f"\nPartial results saved to: {writer.path}"))
+        raise
+
+    deduped_total = analyzer.total
+    record_lookup(raw_total, deduped_total)
     print(f"\n{color.header(f'Total Results: {deduped_total}')}", end='')
     if deduped_total < raw_total:
         print(f" ({raw_total - deduped_total} duplicates removed)")
@@ -1457,15 +1973,20 @@ def run_search(phone_number, args):
         print()
 
     # Show rate limiter summary if there were blocks
-    stats = limiter.get_stats()
-    if stats['total_blocks'] > 0:
-        block_count = stats['total_blocks']
+    block_count = limiters.total_blocks()
+    if block_count > 0:
         print(color.warning(f'Rate limit events: {block_count} (delays auto-adjusted)'))
+        if args.debug:
+            for key, stats in limiters.get_stats().items():
+                print(f"      [DEBUG] {key}: delay={stats['current_delay']}s, blocks={stats['total_blocks']}")
+    cache = get_query_cache()
+    if cache is not None and cache.hits:
+        print(color.info(f"Cache hits: {cache.hits} (queries skipped)"))
+    if tracker is not None and tracker.skipped:
+        print(color.info(f"Adaptive: {tracker.summary()}"))
     print()
 
-    # Analyze
-    print("Analyzing patterns...")
-    patterns = analyze_results(all_results, args.verbose)
+    patterns = analyzer.snapshot()
 
     # Print results
     print_results(patterns, phone_number, all_results, args.verbose)
@@ -1492,13 +2013,23 @@ def run_search(phone_number, args):
                 print(f"  USERNAME | {bar} | @{user} ({count}x)")
         print()
 
+    print_profile()
+
     # Save to file
-    if args.output:
-        if args.output.endswith('.json'):
+    if writer is not None:
+        writer.number_summary(phone_number, formats, patterns)
+        if get_profiler() is not None:
+            writer.write('timings', **get_profiler().summary())
+        writer.close()
+        print(color.success(f"Results saved to: {writer.path}"))
+    elif args.output:
+        if output_format == 'json':
             filename = save_json_results(phone_number, formats, all_results, patterns, args.output)
         else:
             filename = save_txt_results(phone_number, formats, all_results, patterns, args.output)
         print(color.success(f"Results saved to: {filename}"))
+    if store_run(phone_number, formats, all_results, patterns) is not None:
+        print(color.success(f"Run stored in: {get_result_store().path}"))
 
     return {
         'phone_number': phone_number,
@@ -1507,6 +2038,531 @@ def run_search(phone_number, args):
         'patterns': patterns,
     }
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# BATCH MODE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def load_batch_file(path):
+    """Load phone numbers from a file (one per line, '#' comments allowed).
+
+    Repeated numbers are only returned once, in first-seen order.
+    """
+    numbers = []
+    seen = set()
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            digits = re.sub(r'\D', '', line)
+            if digits and digits not in seen:
+                seen.add(digits)
+                numbers.append(line)
+    return numbers
+
+
+class BatchJob:
+    """Search state for one phone number in a batch run"""
+
+    def __init__(self, phone_number, formats, plan, tracker=None):
+        self.phone_number = phone_number
+        self.formats = formats
+        self.plan = plan
+        self.tracker = tracker
+        self.engine_names = plan.engine_names
+        # fmt -> engine -> results, assembled in engine order when finished
+        self.results = {fmt: {} for fmt in formats}
+        self.pending = plan.request_count()
+
+    def add_results(self, fmt, engine, results):
+        """Record one request's results on every format it covers"""
+        for covered in self.plan.aliases(engine, fmt):
+            self.results[covered][engine] = results
+        self.pending -= 1
+
+    def all_results(self):
+        return {
+            fmt: [r for name in self.engine_names for r in by_engine.get(name, [])]
+            for fmt, by_engine in self.results.items()
+        }
+
+    def release(self):
+        """Drop the results once written, keeping the tracker's counters for the summary"""
+        self.results = None
+        if self.tracker is not None:
+            self.tracker.seen_urls.clear()
+
+
+class BatchScheduler:
+    """Interleaves the queries of many phone numbers across engines.
+
+    Every engine has its own queue, rate limiter and "ready at" time. The
+    scheduler always runs the engine that becomes ready soonest, so while one
+    engine is cooling down another number's query goes to a different engine
+    instead of the whole run sleeping.
+    """
+
+    def __init__(self, engines, limiters, debug=False):
+        self.engines = engines
+        self.limiters = limiters
+        self.debug = debug
+        self.queues = {name: deque() for name, _ in engines}
+        self.ready_at = {name: 0.0 for name, _ in engines}
+        self.queries_run = 0
+        self.cache_hits = 0
+        self.time_slept = 0.0
+
+    def add(self, job, queries):
+        """Queue every (fmt, query) pair of a job its plan needs on each engine"""
+        for name in self.queues:
+            for fmt, query in queries:
+                if job.plan.is_primary(name, fmt):
+                    self.queues[name].append((job, fmt, query))
+
+    def run(self, on_job_done):
+        """Drain all queues, calling on_job_done(job) as each job completes"""
+        search_fns = dict(self.engines)
+
+        while True:
+            waiting = [name for name, queue in self.queues.items() if queue]
+            if not waiting:
+                break
+
+            name = min(waiting, key=lambda n: self.ready_at[n])
+            job, fmt, query = self.queues[name][0]
+            will_hit = _is_cached(name, fmt, query)
+            if job.tracker is not None and job.tracker.is_saturated(name) and not will_hit:
+                # Saturated for this number: skip without waiting for the engine
+                self.queues[name].popleft()
+                job.tracker.skip(name)
+                job.add_results(fmt, name, [])
+                if job.pending == 0:
+                    on_job_done(job)
+                continue
+
+            # Cache hits send nothing, so they never wait for the engine's cooldown
+            delay = 0 if will_hit else self.ready_at[name] - time.monotonic()
+            if delay > 0:
+                if self.debug:
+                    print(f"      [DEBUG] Next engine {name} ready in {delay:.1f}s")
+                time.sleep(delay)
+                record('pacing', delay, name)
+                self.time_slept += delay
+
+            self.queues[name].popleft()
+            limiter = self.limiters.get(name)
+            start = time.monotonic()
+            results = search_fns[name](fmt, query, limiter)
+            cached = last_search_cached()
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.queries_run += 1
+                self.ready_at[name] = time.monotonic() + limiter.next_delay()
+            if job.tracker is not None:
+                job.tracker.record(name, results, time.monotonic() - start, cached)
+
+            job.add_results(fmt, name, results)
+            if job.pending == 0:
+                on_job_done(job)
+
+
+def run_batch(batch_file, args):
+    """Search every number in a batch file under one interleaving scheduler"""
+    global _search_depth
+    _search_depth = args.depth
+    try:
+        numbers = load_batch_file(batch_file)
+    except OSError as e:
+        print(color.error(f"Could not read batch file: {e}"))
+        return None
+
+    country_code = args.country or config.get('default_country_code', '+1')
+    keyword_suffix = f" {args.keyword}" if args.keyword else ""
+    site_prefix = f"site:{args.site} " if args.site else ""
+
+    output_dir = args.output or '.'
+    os.makedirs(output_dir, exist_ok=True)
+
+    if not args.quiet:
+        config.display_api_status()
+
+    cassette = get_cassette()
+    limiters = RateLimiterRegistry(config.settings, paced=cassette is None or not cassette.replaying)
+    engines = get_engine_calls(args, limiters)
+    scheduler = BatchScheduler(engines, limiters, args.debug)
+
+    planned = []
+    for phone_number in numbers:
+        formats = generate_phone_formats(phone_number, country_code)
+        if not formats:
+            print(color.warning(f"Skipping invalid phone number: {phone_number}"))
+            continue
+        queries = [(fmt, f"{site_prefix}{fmt}{keyword_suffix}") for fmt in formats]
+        plan = QueryPlan(queries, [name for name, _ in engines], collapse=not args.all_queries)
+        planned.append((phone_number, formats, queries, plan))
+
+    if not planned:
+        print(color.error("No valid phone numbers found in batch file."))
+        return None
+
+    # Metered API requests are shared out across every number before any is sent
+    _budget_quota([plan for _, _, _, plan in planned])
+
+    jobs = []
+    for phone_number, formats, queries, plan in planned:
+        tracker = SaturationTracker.from_settings(config.settings) if args.adaptive else None
+        job = BatchJob(phone_number, formats, plan, tracker)
+        scheduler.add(job, queries)
+        jobs.append(job)
+
+    engine_names = ', '.join(name for name, _ in engines)
+    print(f"Batch: {color.header(str(len(jobs)))} numbers across {engine_names}\n")
+
+    summaries = []
+    start = time.monotonic()
+
+    # With NDJSON every number goes to one stream, written as each finishes
+    writer = None
+    if args.output_format == 'ndjson':
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        writer = NDJSONWriter(os.path.join(output_dir, f"telespot_batch_{timestamp}.ndjson"), VERSION)
+
+    def finish_job(job):
+        raw_results = job.all_results()
+        with timed('dedupe'):
+            all_results = deduplicate_results(raw_results)
+        with timed('analyze'):
+            patterns = analyze_results(all_results, args.verbose)
+        record_lookup(sum(len(r) for r in raw_results.values()), patterns['total_results'])
+
+        if writer is not None:
+            total_unique = 0
+            for fmt, results in all_results.items():
+                for r in results:
+                    writer.result(job.phone_number, fmt, r)
+                total_unique += len(results)
+                writer.format_summary(job.phone_number, fmt, len(raw_results[fmt]), len(results), total_unique)
+            writer.number_summary(job.phone_number, job.formats, patterns)
+            filename = writer.path
+        else:
+            clean_phone = re.sub(r'\D', '', job.phone_number)
+            filename = save_json_results(
+                job.phone_number, job.formats, all_results, patterns,
+                os.path.join(output_dir, f"telespot_{clean_phone}.json")
+            )
+        store_run(job.phone_number, job.formats, all_results, patterns)
+
+        summaries.append({
+            'phone_number': job.phone_number,
+            'total_results': patterns['total_results'],
+            'confidence': patterns['confidence'],
+            'file': filename,
+        })
+        conf_text = f"{patterns['confidence']} ({patterns['confidence_pct']}%)"
+        print(f"{color.header(f'[{len(summaries)}/{len(jobs)}]')} {job.phone_number}: "
+              f"{patterns['total_results']} results, confidence {conf_text} -> {filename}")
+        # Only the summary is needed from here on, so memory stays flat however long the batch
+        job.release()
+
+    try:
+        scheduler.run(finish_job)
+    finally:
+        if writer is not None:
+            if get_profiler() is not None:
+                writer.write('timings', **get_profiler().summary())
+            writer.close()
+
+    elapsed = time.monotonic() - start
+    print(f"\n{color.success(f'Batch complete: {len(summaries)} numbers in {elapsed:.1f}s')}")
+    print(f"Queries: {scheduler.queries_run}, cache hits: {scheduler.cache_hits}, "
+          f"time spent waiting: {scheduler.time_slept:.1f}s")
+    if args.adaptive:
+        skipped = sum(sum(job.tracker.skipped.values()) for job in jobs)
+        saved = sum(job.tracker.time_saved() for job in jobs)
+        print(f"Adaptive: {skipped} queries skipped, ~{saved:.1f}s saved")
+    print()
+    print_profile()
+
+    return summaries
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOOKUP SERVICE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Options a submitted job may set: name -> (command line flag, value type)
+SERVE_JOB_OPTIONS = {
+    'keyword': ('--keyword', str),
+    'site': ('--site', str),
+    'country': ('--country', str),
+    'dehashed': ('--dehashed', bool),
+    'all_queries': ('--all-queries', bool),
+    'adaptive': ('--adaptive', bool),
+}
+
+
+def check_job_options(options):
+    """Raise ValueError unless options is a dict of valid SERVE_JOB_OPTIONS"""
+    if not isinstance(options, dict):
+        raise ValueError("'options' must be a JSON object")
+    for name, value in options.items():
+        if name not in SERVE_JOB_OPTIONS:
+            raise ValueError(f"Unknown option '{name}' (known: {', '.join(SERVE_JOB_OPTIONS)})")
+        kind = SERVE_JOB_OPTIONS[name][1]
+        if not isinstance(value, kind):
+            raise ValueError(f"Option '{name}' must be {'true/false' if kind is bool else 'a string'}")
+
+
+def job_arguments(phone_number, options, args):
+    """Build the search arguments of one job from its options and the service's settings"""
+    argv = ['--no-color', '--quiet', '--depth', str(args.depth), '--jobs', str(args.jobs)]
+    for name, value in options.items():
+        flag, kind = SERVE_JOB_OPTIONS[name]
+        if kind is bool:
+            argv += [flag] if value else []
+        else:
+            argv += [flag, value]
+    try:
+        return create_parser().parse_args(argv + ['--', phone_number])
+    except SystemExit:
+        raise ValueError(f"Invalid job options: {options}")
+
+
+def run_serve(args):
+    """Run the lookup service until interrupted.
+
+    Jobs share one session, one set of rate limiters, the query cache, the
+    quota ledger and the result store, so none of them start cold.
+    """
+    from telespot_service import LookupService, ServiceServer
+    configure_quota_ledger()
+    configure_query_cache(args.no_cache, args.refresh)
+    configure_result_store(args.store)
+    if not start_metrics(args):
+        return 1
+    limiters = RateLimiterRegistry(config.settings)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    def run_job(job, writer):
+        try:
+            result = run_search(job.phone_number, job_arguments(job.phone_number, job.options, args),
+                                limiters, writer)
+            if result is None:
+                raise ValueError("Invalid phone number format")
+        except Exception as e:
+            log(color.warning(f"job {job.id} {job.phone_number}: failed ({e})"))
+            raise
+        patterns = result['patterns']
+        log(f"job {job.id} {job.phone_number}: {patterns['total_results']} results, "
+            f"confidence {patterns['confidence']} ({patterns['confidence_pct']}%)")
+        return dict(result, results=plain_results(result['results']))
+
+    service = LookupService(run_job, args.workers, VERSION)
+    try:
+        server = ServiceServer(service, args.host, args.port, check_job_options,
+                               log if args.debug else None)
+    except OSError as e:
+        print(color.error(f"Could not listen on {args.host}:{args.port}: {e}"))
+        return 1
+
+    print(color.success(f"telespot serve listening on {server.address}"))
+    print(f"Submit a lookup: curl -s -X POST {server.address}/jobs -d '{{\"phone\": \"8885551212\"}}'")
+    print("Press Ctrl+C to stop.\n", flush=True)
+    try:
+        # Search progress is only printed with --debug; job lines go to stderr
+        with open(os.devnull, 'w') as quiet, \
+                contextlib.redirect_stdout(sys.stdout if args.debug else quiet):
+            server.serve_forever()
+    except KeyboardInterrupt:
+        print(color.warning("\nService stopped."))
+    finally:
+        server.server_close()
+        flush_metrics()
+    return 0
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# JOB QUEUE & WORKERS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def queue_job_options(args):
+    """Collect the job options (SERVE_JOB_OPTIONS) given to 'telespot queue add'"""
+    return {name: getattr(args, name) for name in SERVE_JOB_OPTIONS if getattr(args, name)}
+
+
+def run_queue(args):
+    """Run a 'telespot queue' command: add, status, results or retry"""
+    import sqlite3
+    from telespot_queue import JobQueue
+    try:
+        queue = JobQueue(args.queue)
+    except sqlite3.Error as e:
+        print(color.error(f"Could not open job queue {args.queue}: {e}"))
+        return 1
+
+    try:
+        if args.command == 'add':
+            numbers = []
+            for item in args.numbers:
+                if os.path.isfile(item):
+                    numbers.extend(load_batch_file(item))
+                else:
+                    numbers.append(item)
+            ids = queue.enqueue(numbers, queue_job_options(args))
+            print(color.success(f"Queued {len(ids)} jobs in {args.queue}"))
+            return 0
+
+        if args.command == 'retry':
+            print(color.success(f"Queued {queue.retry_failed()} failed jobs again"))
+            return 0
+
+        if args.command == 'status':
+            counts = queue.counts()
+            if args.json:
+                print(json.dumps(counts))
+            else:
+                print(", ".join(f"{status}: {count}" for status, count in counts.items()))
+            return 0
+
+        # results
+        jobs = queue.jobs(args.status, results=True)
+        if args.json:
+            print(json.dumps(jobs, indent=2, ensure_ascii=False))
+            return 0
+        for job in jobs:
+            line = f"{job['id']:>6}  {job['phone_number']:<16} {job['status']:<8}"
+            if job['result']:
+                patterns = job['result']['patterns']
+                line += (f" {patterns['total_results']} results, confidence "
+                         f"{patterns['confidence']} ({patterns['confidence_pct']}%)")
+            elif job['error']:
+                line += f" {color.warning(job['error'])}"
+            print(line)
+        return 0
+    finally:
+        queue.close()
+
+
+def worker_loop(args):
+    """Drain the job queue in this process; one of the processes of 'telespot worker'"""
+    import socket
+    from telespot_queue import JobQueue
+    # Forked workers would otherwise share the parent's jitter and fingerprint sequence
+    random.seed()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(args.queue)
+    configure_quota_ledger(shared=True)
+    configure_query_cache(args.no_cache, args.refresh)
+    configure_result_store(args.store)
+    limiters = RateLimiterRegistry(config.settings, slots=queue.reserve_slot)
+
+    def log(message):
+        print(f"[{name}] {message}", file=sys.stderr, flush=True)
+
+    def heartbeat(job_id, stop):
+        while not stop.wait(args.lease / 3):
+            if not queue.extend(job_id, name, args.lease):
+                break
+
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(sys.stdout if args.debug else quiet):
+        while True:
+            job = queue.claim(name, args.lease)
+            if job is None:
+                # Leased jobs may still come back if their worker dies
+                if not args.forever and queue.pending() == 0:
+                    break
+                time.sleep(args.poll)
+                continue
+
+            stop = threading.Event()
+            threading.Thread(target=heartbeat, args=(job['id'], stop), daemon=True).start()
+            try:
+                result = run_search(job['phone_number'],
+                                    job_arguments(job['phone_number'], job['options'], args), limiters)
+                if result is None:
+                    raise ValueError("Invalid phone number format")
+            except KeyboardInterrupt:
+                queue.release(job['id'], name)
+                raise
+            except ValueError as e:
+                # Bad input fails the same way every time
+                queue.fail(job['id'], name, str(e), retry=False)
+                log(color.warning(f"job {job['id']} {job['phone_number']}: {e}"))
+            except Exception as e:
+                queue.fail(job['id'], name, str(e) or type(e).__name__)
+                log(color.warning(f"job {job['id']} {job['phone_number']}: failed ({e}), "
+                                  f"attempt {job['attempts']}"))
+            else:
+                if queue.ack(job['id'], name, dict(result, results=plain_results(result['results']))):
+                    patterns = result['patterns']
+                    log(f"job {job['id']} {job['phone_number']}: {patterns['total_results']} results")
+                else:
+                    log(color.warning(f"job {job['id']}: lease lost before the result was saved"))
+            finally:
+                stop.set()
+    queue.close()
+
+
+def _worker_main(args):
+    try:
+        worker_loop(args)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(args):
+    """Start args.workers worker processes and wait for them to drain the queue"""
+    import multiprocessing
+    import sqlite3
+    from telespot_queue import JobQueue
+    try:
+        queue = JobQueue(args.queue)
+    except sqlite3.Error as e:
+        print(color.error(f"Could not open job queue {args.queue}: {e}"))
+        return 1
+    counts = queue.counts()
+    queue.close()
+    total = sum(counts.values())
+    print(color.info(f"{args.queue}: {counts['queued']} queued, {counts['done']} done, "
+                     f"{counts['failed']} failed"))
+    if not args.forever and counts['queued'] + counts['running'] == 0:
+        print(color.warning("Nothing to do - add jobs with 'telespot queue add'"))
+        return 0
+
+    print(color.header(f"Starting {args.workers} workers"))
+    start = time.monotonic()
+    processes = [
+        multiprocessing.Process(target=_worker_main, args=(args,), name=f'telespot-worker-{i + 1}')
+        for i in range(max(1, args.workers))
+    ]
+    for process in processes:
+        process.start()
+
+    queue = JobQueue(args.queue)
+    last = None
+    try:
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(timeout=2.0 / len(processes))
+            counts = queue.counts()
+            if counts != last:
+                print(f"  done {counts['done']}/{total}, running {counts['running']}, "
+                      f"queued {counts['queued']}, failed {counts['failed']}", flush=True)
+                last = counts
+    except KeyboardInterrupt:
+        # Workers get the interrupt too and hand their jobs back
+        for process in processes:
+            process.join()
+        print(color.warning("\nWorkers stopped; unfinished jobs were returned to the queue."))
+        return 130
+    finally:
+        queue.close()
+
+    elapsed = time.monotonic() - start
+    print(color.success(f"\nWorkers finished in {elapsed:.1f}s: {counts['done']} done, {counts['failed']} failed"))
+    return 0
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # ARGUMENT PARSER
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -1531,6 +2587,9 @@ EXAMPLES:
   telespot 2155551234 -s whitepages.com  Search specific site
   telespot 2155551234 --dehashed         Include breach database
   telespot 2155551234 -v -o results.json Verbose + JSON output
+  telespot --batch numbers.txt -o out/   Search many numbers, JSON per number
+  telespot 2155551234 --store            Also record the run in .telespot_store.db
+  telespot query --name "John Smith"     Which stored numbers mention a name
   telespot --setup                       Configure API keys
 
 API SETUP:
@@ -1554,16 +2613,40 @@ For more information: https://github.com/thumpersecure/Telespot
     search.add_argument('-s', '--site', metavar='DOMAIN', help='Limit search to specific site')
     search.add_argument('-c', '--country', metavar='CODE', help='Country code (default: +1)')
     search.add_argument('--dehashed', action='store_true', help='Include Dehashed breach search')
+    search.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='Query engines in parallel with N worker threads (default: 1)')
+    search.add_argument('--batch', metavar='FILE',
+                        help='Search every number in FILE (one per line); -o sets the output directory')
+    search.add_argument('--all-queries', action='store_true',
+                        help='Send every format to every engine instead of collapsing equivalent queries')
+    search.add_argument('--depth', type=int, default=1, metavar='N',
+                        help='Fetch up to N result pages per query (Google, Bing, DuckDuckGo HTML; default: 1)')
+    search.add_argument('--adaptive', action='store_true',
+                        help='Stop querying an engine once its formats stop finding new URLs')
 
     output = parser.add_argument_group('Output Options')
-    output.add_argument('-o', '--output', metavar='FILE', help='Save results to file (.json or .txt)')
+    output.add_argument('-o', '--output', metavar='FILE', help='Save results to file (.json, .txt or .ndjson)')
+    output.add_argument('--output-format', choices=OUTPUT_FORMATS,
+                        help='Output file format (default: from the file extension); '
+                             'ndjson streams records as they arrive')
+    output.add_argument('--store', nargs='?', const=STORE_FILE, metavar='PATH',
+                        help='Also write each run into a SQLite result store (default: .telespot_store.db); '
+                             "see 'telespot query'")
     output.add_argument('-v', '--verbose', action='store_true', help='Show detailed listings')
     output.add_argument('--summary', action='store_true', help='Show comparison summary')
     output.add_argument('--dtmf', action='store_true', help='Show DTMF representation')
 
+    cache_grp = parser.add_argument_group('Cache Options')
+    cache_grp.add_argument('--no-cache', action='store_true', help='Do not read or write the query cache')
+    cache_grp.add_argument('--refresh', action='store_true', help='Ignore cached results and re-query every engine')
+
     display = parser.add_argument_group('Display Options')
     display.add_argument('--colorful', action='store_true', help='Enable rainbow colors')
     display.add_argument('--no-color', action='store_true', help='Disable colors')
+    display.add_argument('-q', '--quiet', action='store_true',
+                         help='No logo, API status table or prompts (a phone number or --batch is required)')
+    display.add_argument('--machine', action='store_true',
+                         help='Print only one JSON document on stdout (implies --quiet and --no-color)')
 
     config_grp = parser.add_argument_group('Configuration')
     config_grp.add_argument('--setup', action='store_true', help='Configure API keys')
@@ -1573,8 +2656,179 @@ For more information: https://github.com/thumpersecure/Telespot
     maint.add_argument('--update', action='store_true', help='Update from repository')
     maint.add_argument('--version', action='version', version=f'telespot v{VERSION}')
 
+    metrics = parser.add_argument_group('Metrics')
+    metrics.add_argument('--metrics-port', type=int, metavar='PORT',
+                         help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics while running')
+    metrics.add_argument('--metrics-file', metavar='PATH',
+                         help='Write Prometheus metrics to PATH after every lookup (textfile collector)')
+
     debug = parser.add_argument_group('Debug')
     debug.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
+    debug.add_argument('--profile', action='store_true',
+                       help='Time each stage (pacing, backoff, network, parse, dedupe, analyze) per engine')
+    replay = debug.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='FILE',
+                        help='Record every HTTP response to a compressed cassette file')
+    replay.add_argument('--replay', metavar='FILE',
+                        help='Serve HTTP responses from a cassette instead of the network (no pacing)')
+
+    return parser
+
+
+def create_query_parser():
+    """Create the argument parser of the 'telespot query' subcommand"""
+    parser = argparse.ArgumentParser(
+        prog='telespot query',
+        description='Look up stored runs (written with --store) by URL, domain or extracted entity.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+EXAMPLES:
+  telespot query --url https://example.com/profile/jsmith
+  telespot query --domain whitepages.com
+  telespot query --name "John Smith"
+  telespot query --username jsmith --json
+  telespot query --number 2155551234
+  telespot query --related 2155551234 --limit 10
+''')
+
+    lookup = parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument('--url', help='Numbers whose results link to this URL')
+    lookup.add_argument('--domain', help='Numbers whose results link anywhere on this domain')
+    lookup.add_argument('--name', help='Numbers whose results mention this name')
+    lookup.add_argument('--username', help='Numbers whose results mention this username')
+    lookup.add_argument('--location', help='Numbers whose results mention this location')
+    lookup.add_argument('--email', help='Numbers whose results mention this email address')
+    lookup.add_argument('--number', help='Stored runs of this phone number')
+    lookup.add_argument('--related', metavar='NUMBER',
+                        help='Numbers sharing names, usernames, emails or locations with this number')
+
+    parser.add_argument('--limit', type=int, default=20, metavar='N',
+                        help='Show at most N related numbers (default: 20)')
+
+    parser.add_argument('--store', default=STORE_FILE, metavar='PATH',
+                        help='Result store to read (default: .telespot_store.db)')
+    parser.add_argument('--json', action='store_true', help='Print matches as JSON')
+    parser.add_argument('--no-color', action='store_true', help='Disable colors')
+
+    return parser
+
+
+def create_serve_parser():
+    """Create the argument parser of the 'telespot serve' subcommand"""
+    from telespot_service import DEFAULT_HOST, DEFAULT_PORT
+    parser = argparse.ArgumentParser(
+        prog='telespot serve',
+        description='Run a local HTTP/JSON lookup service that keeps sessions, rate limiters '
+                    'and caches warm between jobs.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+ENDPOINTS:
+  POST   /jobs              {"phone": "8885551212", "options": {"keyword": "owner", "dehashed": true}}
+                            or {"numbers": [...], "options": {...}}
+  GET    /jobs              List jobs
+  GET    /jobs/<id>         Job status and results (?wait=SECONDS waits for it to finish)
+  GET    /jobs/<id>/stream  NDJSON records as the job produces them
+  DELETE /jobs/<id>         Cancel a queued job
+  GET    /health            Queue counts and uptime
+
+Job options: keyword, site, country, dehashed, all_queries, adaptive
+''')
+
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Run up to N lookups at once (default: 1; rate limits are shared)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='Query engines in parallel with N worker threads within each lookup')
+    parser.add_argument('--depth', type=int, default=1, metavar='N',
+                        help='Fetch up to N result pages per query (Google, Bing, DuckDuckGo HTML)')
+    parser.add_argument('--store', nargs='?', const=STORE_FILE, metavar='PATH',
+                        help='Also write each job into a SQLite result store (default: .telespot_store.db)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the query cache')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results and re-query every engine')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Write Prometheus metrics to PATH after every lookup (textfile collector)')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='Log every HTTP request and print search progress')
+    parser.add_argument('--no-color', action='store_true', help='Disable colors')
+
+    return parser
+
+
+def create_queue_parser():
+    """Create the argument parser of the 'telespot queue' subcommand"""
+    from telespot_queue import QUEUE_FILE
+    parser = argparse.ArgumentParser(
+        prog='telespot queue',
+        description="Manage the durable job queue drained by 'telespot worker'.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+EXAMPLES:
+  telespot queue add numbers.txt --dehashed
+  telespot queue add 2155551234 8885551212 -k owner
+  telespot queue status
+  telespot queue results --status failed
+  telespot queue retry
+''')
+    parser.add_argument('--queue', default=QUEUE_FILE, metavar='PATH',
+                        help='Queue database (default: .telespot_queue.db)')
+    parser.add_argument('--no-color', action='store_true', help='Disable colors')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='Queue phone numbers (or files of numbers, one per line)')
+    add.add_argument('numbers', nargs='+', metavar='NUMBER_OR_FILE')
+    add.add_argument('-k', '--keyword', help='Add search keyword')
+    add.add_argument('-s', '--site', help='Limit to specific site')
+    add.add_argument('-c', '--country', help='Country code (default: from config, +1)')
+    add.add_argument('--dehashed', action='store_true', help='Include Dehashed search')
+    add.add_argument('--all-queries', action='store_true',
+                     help='Send every format to every engine instead of collapsing equivalent queries')
+    add.add_argument('--adaptive', action='store_true',
+                     help='Stop querying an engine once its formats stop finding new URLs')
+
+    status = commands.add_parser('status', help='Count jobs per state')
+    status.add_argument('--json', action='store_true', help='Print counts as JSON')
+
+    results = commands.add_parser('results', help='List jobs with their results or errors')
+    results.add_argument('--status', choices=('queued', 'running', 'done', 'failed'),
+                         help='Only list jobs in this state')
+    results.add_argument('--json', action='store_true', help='Print jobs and full results as JSON')
+
+    commands.add_parser('retry', help='Queue failed jobs again')
+
+    return parser
+
+
+def create_worker_parser():
+    """Create the argument parser of the 'telespot worker' subcommand"""
+    from telespot_queue import DEFAULT_LEASE, QUEUE_FILE
+    parser = argparse.ArgumentParser(
+        prog='telespot worker',
+        description="Run worker processes that drain the job queue ('telespot queue add'). "
+                    "Workers share per-engine pacing and the quota ledger.",
+    )
+    parser.add_argument('-n', '--workers', type=int, default=2, metavar='N',
+                        help='Number of worker processes (default: 2)')
+    parser.add_argument('--queue', default=QUEUE_FILE, metavar='PATH',
+                        help='Queue database (default: .telespot_queue.db)')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE, metavar='SECONDS',
+                        help='Visibility timeout of a claimed job, renewed while it runs (default: 300)')
+    parser.add_argument('--poll', type=float, default=2.0, metavar='SECONDS',
+                        help='Wait between checks of an empty queue (default: 2)')
+    parser.add_argument('--forever', action='store_true',
+                        help='Keep waiting for new jobs instead of exiting once the queue is drained')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='Query engines in parallel with N threads within each lookup')
+    parser.add_argument('--depth', type=int, default=1, metavar='N',
+                        help='Fetch up to N result pages per query (Google, Bing, DuckDuckGo HTML)')
+    parser.add_argument('--store', nargs='?', const=STORE_FILE, metavar='PATH',
+                        help='Also write each job into a SQLite result store (default: .telespot_store.db)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the query cache')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results and re-query every engine')
+    parser.add_argument('-d', '--debug', action='store_true', help='Print search progress of every worker')
+    parser.add_argument('--no-color', action='store_true', help='Disable colors')
 
     return parser
 
@@ -1582,12 +2836,107 @@ For more information: https://github.com/thumpersecure/Telespot
 # MAIN
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def api_status_json():
+    """--api-status --machine: configured APIs and quota usage"""
+    ledger = get_quota_ledger()
+    return {
+        'version': VERSION,
+        'apis': config.get_api_status(),
+        'quota': ledger.get_stats() if ledger is not None else {},
+    }
+
+
+def run_machine(args, out):
+    """--machine: run the search or batch with its report discarded, then write one JSON document to out.
+
+    Errors go to stderr and the exit status; stdout only ever holds the JSON.
+    """
+    try:
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            if args.batch:
+                outcome = run_batch(args.batch, args)
+            else:
+                outcome = run_search(args.phone, args)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        close_cassette()
+        flush_metrics()
+
+    if outcome is None:
+        problem = "could not read the batch file" if args.batch else "invalid phone number format"
+        print(f"telespot: {problem}", file=sys.stderr)
+        return 1
+    if args.batch:
+        document = {'version': VERSION, 'numbers': outcome}
+    else:
+        document = json_results(outcome['phone_number'], outcome['formats'],
+                                outcome['results'], outcome['patterns'])
+    json.dump(document, out, ensure_ascii=False)
+    out.write('\n')
+    return 0
+
+
+def start_metrics(args):
+    """Enable metrics if --metrics-port or --metrics-file was given; False if the port is taken"""
+    if args.metrics_port is None and not args.metrics_file:
+        return True
+    try:
+        enable_metrics(args.metrics_port, args.metrics_file)
+    except OSError as e:
+        print(color.error(f"Could not serve metrics on port {args.metrics_port}: {e}"))
+        return False
+    if metrics_address():
+        print(color.info(f"Metrics: {metrics_address()}"))
+    return True
+
+
 def main():
     """Main entry point"""
     global color
 
+    # 'telespot query ...' reads the result store and never searches
+    if sys.argv[1:2] == ['query']:
+        args = create_query_parser().parse_args(sys.argv[2:])
+        if args.no_color:
+            color = ColorMode('off')
+        return run_query(args)
+
+    # 'telespot serve ...' runs lookups submitted over HTTP until stopped
+    if sys.argv[1:2] == ['serve']:
+        args = create_serve_parser().parse_args(sys.argv[2:])
+        if args.no_color:
+            color = ColorMode('off')
+        return run_serve(args)
+
+    # 'telespot queue ...' manages the job queue, 'telespot worker' drains it
+    if sys.argv[1:2] in (['queue'], ['worker']):
+        command = sys.argv[1]
+        args = (create_queue_parser() if command == 'queue' else create_worker_parser()).parse_args(sys.argv[2:])
+        if args.no_color:
+            color = ColorMode('off')
+        return run_queue(args) if command == 'queue' else run_workers(args)
+
     parser = create_parser()
     args = parser.parse_args()
+    if args.quiet and not args.machine and not (
+            args.phone or args.batch or args.api_status or args.setup or args.update):
+        # Without a number run_cli would prompt for one
+        parser.error("--quiet needs a phone number or --batch (it never prompts for one)")
+    if args.machine:
+        args.quiet = args.no_color = True
+        if args.setup or args.update or not (args.phone or args.batch or args.api_status):
+            parser.error("--machine needs a phone number, --batch or --api-status")
+        # The JSON document is all that goes to stdout; other messages go to stderr
+        out = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            return run_cli(parser, args, out)
+    return run_cli(parser, args)
+
+
+def run_cli(parser, args, out=None):
+    """Run a search command line (out: where --machine writes its JSON)"""
+    global color
 
     # Set color mode
     if args.no_color:
@@ -1598,7 +2947,9 @@ def main():
         color = ColorMode('normal')
 
     # Print logo
-    if not args.no_color:
+    if args.quiet:
+        pass
+    elif not args.no_color:
         print(get_ascii_logo())
     else:
         print(get_ascii_logo_mono())
@@ -1608,14 +2959,47 @@ def main():
         interactive_setup()
         return 0
 
+    # Replayed responses cost no quota
+    if not args.replay:
+        configure_quota_ledger()
+
     if args.api_status:
-        config.display_api_status()
+        if args.machine:
+            print(json.dumps(api_status_json()), file=out)
+        else:
+            config.display_api_status()
         return 0
 
     if args.update:
         update_from_repo()
         return 0
 
+    # Cache hits would bypass the cassette, so record/replay always go through it
+    configure_query_cache(args.no_cache or bool(args.record or args.replay), args.refresh)
+    configure_result_store(args.store)
+    if args.profile:
+        enable_profiler()
+    if not start_metrics(args):
+        return 1
+    try:
+        configure_cassette(args.record, args.replay)
+    except OSError as e:
+        print(color.error(f"Could not open cassette: {e}"))
+        return 1
+
+    if args.machine:
+        return run_machine(args, out)
+
+    if args.batch:
+        try:
+            return 0 if run_batch(args.batch, args) is not None else 1
+        except KeyboardInterrupt:
+            print(color.warning("\n\nBatch interrupted by user."))
+            return 130
+        finally:
+            close_cassette()
+            flush_metrics()
+
     # Get phone number
     phone_number = args.phone
 
@@ -1644,7 +3028,7 @@ def main():
     try:
         result = run_search(phone_number, args)
 
-        if result and not args.output:
+        if result and not args.output and args.output_format != 'ndjson' and not args.quiet:
             save = input("\nSave results to file? (y/N): ").strip().lower()
             if save == 'y':
                 fmt = input("Format (txt/json) [txt]: ").strip().lower() or 'txt'
@@ -1665,6 +3049,9 @@ def main():
     except KeyboardInterrupt:
         print(color.warning("\n\nSearch interrupted by user."))
         return 130
+    finally:
+        close_cassette()
+        flush_metrics()
 
 
 if __name__ == "__main__":
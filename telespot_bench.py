@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+telespot_bench - Benchmark telespot and telespotx against a local mock server
+
+Starts an HTTP server that answers like the Google Custom Search, Bing Web
+Search, DuckDuckGo (Instant Answer API and HTML lite) and Dehashed APIs,
+points both tools at it through TELESPOT_BASE_URL, and runs every mode in a
+process of its own so timings and peak memory never leak between modes.
+No API keys or quota are used.
+
+Usage:
+  ./telespot_bench.py                                  Every mode, default server
+  ./telespot_bench.py --latency 0.2 --error-rate 0.05  Slow, flaky engines
+  ./telespot_bench.py --modes sequential,async --pacing none
+  ./telespot_bench.py --serve 8800                     Only run the mock server
+  ./telespot_bench.py --startup                        Guard startup time and lazy imports
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import resource
+except ImportError:     # Windows: peak memory is not reported
+    resource = None
+
+from telespot_engines import BASE_URL_ENV
+
+MODES = ('sequential', 'parallel', 'batch', 'async')
+
+# Settings the tools run with: dummy keys so every engine is called
+BENCH_SETTINGS = {
+    'google_api_key': 'bench',
+    'google_cse_id': 'bench',
+    'bing_api_key': 'bench',
+    'dehashed_api_key': 'bench:bench',
+}
+
+# --pacing none: no delay between requests beyond the rate limiter's jitter
+NO_PACING_SETTINGS = {
+    'delay_seconds': '0',
+    **{f'{key}_{suffix}': '0'
+       for suffix in ('google', 'bing', 'duckduckgo', 'duckduckgo_html', 'dehashed')
+       for key in ('delay', 'min_delay')},
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MOCK SEARCH ENGINE SERVER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+MOCK_NAMES = ['John Smith', 'Mary Johnson', 'Robert Brown', 'Linda Davis', 'James Wilson']
+MOCK_PLACES = ['Philadelphia, PA', 'Camden, NJ', 'Chicago, IL', 'Austin, TX', 'Denver, CO']
+
+# Where each engine's results start in the shared listing, so engines overlap
+# partly (as real engines do) and deduplication has work to do
+ENGINE_OFFSETS = {'Google': 0, 'Bing': 3, 'DuckDuckGo': 6, 'Dehashed': 0}
+
+
+def mock_results(query, engine, page, page_size, result_pages):
+    """Build one page of deterministic results for the phone number in a query"""
+    if page >= result_pages:
+        return []
+    digits = ''.join(re.findall(r'\d', query))[-10:] or '0'
+    results = []
+    for i in range(page_size):
+        k = page * page_size + i + ENGINE_OFFSETS[engine]
+        name = MOCK_NAMES[k % len(MOCK_NAMES)]
+        place = MOCK_PLACES[(k + int(digits[-1])) % len(MOCK_PLACES)]
+        results.append({
+            'title': f"{name} - {digits[:3]}-{digits[3:6]}-{digits[6:]}",
+            'url': f"https://listing{k % 7}.example/{digits}/{k}",
+            'snippet': f"{name} of {place}. Profile @{name.split()[0].lower()}{k % 3}, "
+                       f"{name.split()[0].lower()}@mail.example",
+            'name': name,
+        })
+    return results
+
+
+class MockSearchServer(ThreadingHTTPServer):
+    """Threaded HTTP server imitating every engine's response shape.
+
+    Engines are told apart by path (see telespot_engines.BASE_URL_ENV).
+    Each request waits latency + uniform(0, jitter) seconds and fails with a
+    429 at error_rate; each query has result_pages pages of page_size results.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.05, jitter=0.0, page_size=10,
+                 result_pages=3, error_rate=0.0, seed=0):
+        super().__init__(address, MockSearchHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.result_pages = result_pages
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self):
+        """Draw (delay, fail) for one request"""
+        with self._lock:
+            return (self.latency + self._rng.uniform(0, self.jitter),
+                    self._rng.random() < self.error_rate)
+
+    def count(self, engine, failed):
+        with self._lock:
+            self.requests[engine] = self.requests.get(engine, 0) + 1
+            self.errors += failed
+
+    def get_stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'total': sum(self.requests.values()),
+                    'errors': self.errors}
+
+
+class MockSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        self.respond(parts.path, {k: v[-1] for k, v in parse_qs(parts.query).items()})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8', 'replace')
+        self.respond(urlsplit(self.path).path, {k: v[-1] for k, v in parse_qs(body).items()})
+
+    def respond(self, path, params):
+        server = self.server
+        routes = {
+            '/customsearch/v1': ('Google', self.google),
+            '/v7.0/search': ('Bing', self.bing),
+            '/html/': ('DuckDuckGo', self.duckduckgo_html),
+            '/': ('DuckDuckGo', self.duckduckgo_api),
+            '/search': ('Dehashed', self.dehashed),
+        }
+        if path not in routes:
+            return self.send(404, 'text/plain', b'not found')
+        engine, handler = routes[path]
+
+        delay, failed = server.draw()
+        server.count(engine, failed)
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return self.send(429, 'text/plain', b'Too Many Requests', {'Retry-After': '1'})
+        handler(engine, params)
+
+    def send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data):
+        self.send(200, 'application/json; charset=utf-8', json.dumps(data).encode('utf-8'))
+
+    def results(self, query, engine, page, page_size=None):
+        server = self.server
+        return mock_results(query, engine, page, page_size or server.page_size, server.result_pages)
+
+    def google(self, engine, params):
+        query = params.get('exactTerms') or params.get('q', '')
+        num = int(params.get('num') or 10)
+        page = (int(params.get('start') or 1) - 1) // max(num, 1)
+        items = [{'title': r['title'], 'link': r['url'], 'snippet': r['snippet']}
+                 for r in self.results(query, engine, page, min(num, self.server.page_size))]
+        self.send_json({'items': items} if items else {})
+
+    def bing(self, engine, params):
+        count = int(params.get('count') or 10)
+        page = int(params.get('offset') or 0) // max(count, 1)
+        values = [{'name': r['title'], 'url': r['url'], 'snippet': r['snippet']}
+                  for r in self.results(params.get('q', ''), engine, page, min(count, self.server.page_size))]
+        self.send_json({'webPages': {'value': values}} if values else {})
+
+    def duckduckgo_api(self, engine, params):
+        topics = [{'Text': f"{r['title']} {r['snippet']}", 'FirstURL': r['url']}
+                  for r in self.results(params.get('q', ''), engine, 0)]
+        self.send_json({'Abstract': '', 'AbstractText': '', 'RelatedTopics': topics, 'Results': []})
+
+    def duckduckgo_html(self, engine, params):
+        query = params.get('q', '')
+        offset = int(params.get('s') or 0)
+        page = offset // self.server.page_size
+        results = self.results(query, engine, page)
+        html = ['<html><head><title>DuckDuckGo</title></head><body>']
+        for r in results:
+            html.append(
+                f'<div class="result"><a class="result__a" href="//duckduckgo.com/l/?uddg={r["url"]}">'
+                f'{r["title"]}</a><a class="result__snippet" href="#">{r["snippet"]}</a></div>'
+            )
+        if results and page + 1 < self.server.result_pages:
+            html.append(
+                f'<form action="/html/" method="post"><input type="hidden" name="q" value="{query}">'
+                f'<input type="hidden" name="s" value="{offset + len(results)}">'
+                '<input type="submit" value="Next"></form>'
+            )
+        html.append('</body></html>')
+        self.send(200, 'text/html; charset=utf-8', ''.join(html).encode('utf-8'))
+
+    def dehashed(self, engine, params):
+        entries = [{'name': r['name'], 'username': r['name'].split()[0].lower(),
+                    'email': f"{r['name'].split()[0].lower()}@mail.example",
+                    'database_name': r['url'].split('/')[2]}
+                   for r in self.results(params.get('query', ''), engine, 0)]
+        self.send_json({'entries': entries})
+
+
+def start_server(args, port=0):
+    """Start a MockSearchServer on a background thread"""
+    server = MockSearchServer(
+        ('127.0.0.1', port), latency=args.latency, jitter=args.jitter, page_size=args.page_size,
+        result_pages=args.result_pages, error_rate=args.error_rate, seed=args.seed,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODE RUNNER (one child process per mode)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class SleepMeter:
+    """Adds up the time spent in time.sleep() and asyncio.sleep().
+
+    Summed over every thread and task, so with parallel modes it can exceed
+    the wall time.
+    """
+
+    def __init__(self):
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def _add(self, seconds):
+        with self._lock:
+            self.slept += seconds
+
+    def install(self):
+        real_sleep = time.sleep
+        real_async_sleep = asyncio.sleep
+
+        def sleep(seconds):
+            start = time.perf_counter()
+            real_sleep(seconds)
+            self._add(time.perf_counter() - start)
+
+        async def async_sleep(delay, result=None):
+            start = time.perf_counter()
+            try:
+                return await real_async_sleep(delay, result)
+            finally:
+                self._add(time.perf_counter() - start)
+
+        time.sleep = sleep
+        asyncio.sleep = async_sleep
+
+
+def bench_numbers(count, seed):
+    """Get count distinct US numbers, the same for every mode"""
+    rng = random.Random(seed)
+    numbers = []
+    while len(numbers) < count:
+        number = f"{rng.randint(201, 989)}555{rng.randint(0, 9999):04d}"
+        if number not in numbers:
+            numbers.append(number)
+    return numbers
+
+
+def peak_memory_mb():
+    """Get this process's peak resident memory in MB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_mode(mode, args):
+    """Run one mode in this process and return its measurements"""
+    random.seed(args.seed)
+    os.environ[BASE_URL_ENV] = args.base_url
+    os.environ['NO_PROXY'] = '127.0.0.1,localhost'
+
+    settings = dict(BENCH_SETTINGS)
+    if args.pacing == 'none':
+        settings.update(NO_PACING_SETTINGS)
+    numbers = bench_numbers(args.numbers, args.seed)
+    depth = ['--depth', str(args.depth)]
+
+    if mode == 'async':
+        import telespotx
+        config = dict(telespotx.load_config(), **settings)
+    else:
+        import telespot
+        telespot.config.settings.update(settings)
+
+    meter = SleepMeter()
+    meter.install()
+    results = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as tmp:
+        if mode == 'async':
+            for number in numbers:
+                found, _ = asyncio.run(telespotx.search_all_formats(
+                    number, config, include_dehashed=True, no_color=True, depth=args.depth))
+                results += len(found)
+        elif mode == 'batch':
+            batch_file = os.path.join(tmp, 'numbers.txt')
+            with open(batch_file, 'w') as f:
+                f.write('\n'.join(numbers) + '\n')
+            parsed = telespot.create_parser().parse_args(
+                ['--batch', batch_file, '-o', tmp, '--no-color', '--dehashed', *depth])
+            results = sum(s['total_results'] for s in telespot.run_batch(batch_file, parsed))
+        else:
+            jobs = str(args.jobs if mode == 'parallel' else 1)
+            for number in numbers:
+                parsed = telespot.create_parser().parse_args(
+                    [number, '--no-color', '--dehashed', '-j', jobs, *depth])
+                results += telespot.run_search(number, parsed)['patterns']['total_results']
+
+    return {
+        'mode': mode,
+        'wall': time.perf_counter() - start,
+        'cpu': time.process_time() - cpu_start,
+        'sleep': meter.slept,
+        'results': results,
+        'peak_mb': peak_memory_mb(),
+    }
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# STARTUP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Commands timed by --startup, as arguments to the interpreter
+STARTUP_COMMANDS = (
+    ('python -c pass', ['-c', 'pass']),
+    ('import telespot', ['-c', 'import telespot']),
+    ('telespot.py --version', ['telespot.py', '--version']),
+    # -m reuses the cached bytecode; a script is compiled afresh every run
+    ('python -m telespot --version', ['-m', 'telespot', '--version']),
+    ('python -m telespot --api-status --machine', ['-m', 'telespot', '--api-status', '--machine']),
+)
+
+# Modules importing telespot and building its argument parser (which every
+# command does) must not load; they are imported where first used
+LAZY_MODULES = (
+    'requests', 'concurrent.futures', 'multiprocessing', 'socket', 'subprocess',
+    'http.server', 'zoneinfo', 'sqlite3', 'telespot_cache', 'telespot_store',
+    'telespot_cassette', 'telespot_service', 'telespot_queue',
+)
+
+# Default --max-import-ms: time 'import telespot' may add to a bare interpreter
+STARTUP_BUDGET_MS = 60.0
+
+
+def time_command(argv, repeat):
+    """Median wall time in ms of running the interpreter with argv, after one warm-up run"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *argv], cwd=here, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        if i:
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def loaded_lazy_modules():
+    """Get the LAZY_MODULES a fresh 'import telespot' plus create_parser() loads anyway"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = ("import json, sys, telespot; telespot.create_parser(); "
+            f"print(json.dumps([m for m in {list(LAZY_MODULES)!r} if m in sys.modules]))")
+    proc = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return ['(import failed: ' + (proc.stderr.strip().splitlines() or ['?'])[-1] + ')']
+    return json.loads(proc.stdout)
+
+
+def bench_startup(args):
+    """Time startup commands and check the import budget; returns the report"""
+    timings = {label: time_command(argv, args.repeat) for label, argv in STARTUP_COMMANDS}
+    baseline = timings['python -c pass']
+    import_ms = timings['import telespot'] - baseline
+    eager = loaded_lazy_modules()
+    return {
+        'timings_ms': {label: round(ms, 1) for label, ms in timings.items()},
+        'import_ms': round(import_ms, 1),
+        'budget_ms': args.max_import_ms,
+        'eager_modules': eager,
+        'ok': import_ms <= args.max_import_ms and not eager,
+    }
+
+
+def print_startup(report):
+    print(f"\n{'Command':<44}{'Median ms':>10}")
+    print("-" * 54)
+    for label, ms in report['timings_ms'].items():
+        print(f"{label:<44}{ms:>10.1f}")
+    verdict = "ok" if report['import_ms'] <= report['budget_ms'] else "OVER BUDGET"
+    print(f"\nimport telespot adds {report['import_ms']:.1f} ms "
+          f"(budget {report['budget_ms']:.0f} ms): {verdict}")
+    if report['eager_modules']:
+        print(f"Loaded at import but should be lazy: {', '.join(report['eager_modules'])}")
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REPORT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def bench_mode(mode, args, server):
+    """Run a mode in a fresh process and add the server's request count"""
+    before = server.get_stats()
+    command = [
+        sys.executable, os.path.abspath(__file__), '--run-mode', mode, '--base-url', server.base_url,
+        '--seed', str(args.seed), '--numbers', str(args.numbers), '--depth', str(args.depth),
+        '--jobs', str(args.jobs), '--pacing', args.pacing,
+    ]
+    proc = subprocess.run(command, capture_output=True, text=True)
+    after = server.get_stats()
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+        return {'mode': mode, 'error': error}
+
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    report['requests'] = after['total'] - before['total']
+    report['errors'] = after['errors'] - before['errors']
+    report['requests_per_s'] = report['requests'] / report['wall'] if report['wall'] else 0.0
+    return report
+
+
+def print_report(reports, args):
+    print(f"\nMock server: latency {args.latency}s (+{args.jitter}s jitter), {args.page_size} results/page, "
+          f"{args.result_pages} pages/query, error rate {args.error_rate:.0%}, seed {args.seed}")
+    print(f"Workload: {args.numbers} number(s), depth {args.depth}, pacing {args.pacing}\n")
+    print(f"{'Mode':<12}{'Wall s':>9}{'Requests':>10}{'Req/s':>8}{'Errors':>8}"
+          f"{'Sleep s':>9}{'CPU s':>8}{'Peak MB':>9}{'Results':>9}")
+    print("-" * 82)
+    for r in reports:
+        if 'error' in r:
+            print(f"{r['mode']:<12}failed: {r['error']}")
+            continue
+        peak = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else '-'
+        print(f"{r['mode']:<12}{r['wall']:>9.2f}{r['requests']:>10}{r['requests_per_s']:>8.1f}{r['errors']:>8}"
+              f"{r['sleep']:>9.2f}{r['cpu']:>8.2f}{peak:>9}{r['results']:>9}")
+    print("\nSleep is summed over threads/tasks (pacing and retry backoff); "
+          "the rest of the wall time is network wait and CPU.")
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog='telespot_bench',
+        description='Benchmark telespot and telespotx against a local mock search-engine server',
+    )
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help=f"Comma-separated modes to run (default: {','.join(MODES)})")
+    parser.add_argument('--numbers', type=int, default=1, metavar='N', help='Phone numbers per mode (default: 1)')
+    parser.add_argument('--depth', type=int, default=1, metavar='N', help='Result pages per query (default: 1)')
+    parser.add_argument('--jobs', type=int, default=4, metavar='N', help='Worker threads in parallel mode (default: 4)')
+    parser.add_argument('--pacing', choices=('real', 'none'), default='real',
+                        help="'real' keeps the tools' default delays, 'none' zeroes the configurable ones")
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the server and the tools (default: 1)')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    server = parser.add_argument_group('Mock server')
+    server.add_argument('--latency', type=float, default=0.05, metavar='S', help='Seconds per response (default: 0.05)')
+    server.add_argument('--jitter', type=float, default=0.0, metavar='S', help='Extra random seconds per response')
+    server.add_argument('--page-size', type=int, default=10, metavar='N', help='Results per page (default: 10)')
+    server.add_argument('--result-pages', type=int, default=3, metavar='N',
+                        help='Pages of results each query has (default: 3)')
+    server.add_argument('--error-rate', type=float, default=0.0, metavar='P',
+                        help='Fraction of requests answered with 429 (default: 0)')
+    server.add_argument('--serve', type=int, metavar='PORT',
+                        help=f'Only run the mock server on PORT (point the tools at it with {BASE_URL_ENV})')
+
+    startup = parser.add_argument_group('Startup')
+    startup.add_argument('--startup', action='store_true',
+                         help='Time interpreter startup and fail if importing telespot is over budget '
+                              'or loads modules meant to be lazy')
+    startup.add_argument('--repeat', type=int, default=10, metavar='N',
+                         help='Runs per startup command; the median is reported (default: 10)')
+    startup.add_argument('--max-import-ms', type=float, default=STARTUP_BUDGET_MS, metavar='MS',
+                         help=f'Time import telespot may add to a bare interpreter (default: {STARTUP_BUDGET_MS:.0f})')
+
+    # Used by the parent process to run one mode per child
+    parser.add_argument('--run-mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args)))
+        return 0
+
+    if args.startup:
+        report = bench_startup(args)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_startup(report)
+        return 0 if report['ok'] else 1
+
+    if args.serve is not None:
+        server = start_server(args, args.serve)
+        print(f"Mock search server on {server.base_url}")
+        print(f"  {BASE_URL_ENV}={server.base_url} ./telespot.py 2155551234")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print(f"\n{json.dumps(server.get_stats())}")
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        print(f"Unknown mode(s): {', '.join(unknown)} (choose from {', '.join(MODES)})")
+        return 1
+
+    server = start_server(args)
+    try:
+        reports = [bench_mode(mode, args, server) for mode in modes]
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_report(reports, args)
+    return 0 if all('error' not in r for r in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+telespot_cache - Persistent search response cache shared by telespot and telespotx
+
+Stores the results of each (engine, query) pair in a SQLite database with a
+per-engine time-to-live, and keeps the most recently used entries in memory so
+repeated lookups never touch the disk or the network.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from telespot_engines import Result
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telespot_cache.db")
+
+# Default time-to-live per engine in hours (override with cache_ttl_<engine> in .telespot_config)
+DEFAULT_TTL_HOURS = {
+    'Google': 168,      # 7 days - quota is the scarce resource
+    'Bing': 168,
+    'DuckDuckGo': 24,
+    'Dehashed': 720,    # Breach data rarely changes
+}
+
+
+def load_ttls(settings):
+    """Build the per-engine TTL table (in seconds) from config settings"""
+    ttls = {}
+    for engine, hours in DEFAULT_TTL_HOURS.items():
+        value = settings.get(f'cache_ttl_{engine.lower()}') or hours
+        try:
+            ttls[engine] = float(value) * 3600
+        except ValueError:
+            ttls[engine] = hours * 3600
+    return ttls
+
+
+def cache_query(query, depth=1):
+    """Get the cache key for a query searched depth result pages deep"""
+    return query if depth <= 1 else f"{query} [depth={depth}]"
+
+
+class QueryCache:
+    """SQLite-backed (engine, query) -> results cache with an in-memory LRU layer.
+
+    Entries are stored as JSON and decoded on every hit, so callers always get
+    fresh Result records they are free to tag with a format. With refresh=True
+    lookups always miss but new results are still written, which re-populates
+    stale entries.
+    """
+
+    def __init__(self, path=CACHE_FILE, ttls=None, memory_size=512, refresh=False):
+        self.path = path
+        self.ttls = ttls or load_ttls({})
+        self.memory_size = memory_size
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " engine TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " results TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (engine, query))"
+        )
+        self._db.commit()
+        self.purge_expired()
+
+    def _ttl(self, engine):
+        return self.ttls.get(engine, DEFAULT_TTL_HOURS.get(engine, 24) * 3600)
+
+    def get(self, engine, query):
+        """Get cached results for (engine, query), or None on a miss"""
+        if self.refresh:
+            self.misses += 1
+            return None
+
+        key = (engine, query)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT results, created FROM responses WHERE engine = ? AND query = ?",
+                    key
+                ).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+
+            if entry is None or now - entry[1] > self._ttl(engine):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return [Result.from_dict(data) for data in json.loads(entry[0])]
+
+    def contains(self, engine, query):
+        """Check for a fresh entry without counting a hit or miss"""
+        if self.refresh:
+            return False
+        key = (engine, query)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT created FROM responses WHERE engine = ? AND query = ?",
+                    key
+                ).fetchone()
+                created = row[0] if row else None
+            else:
+                created = entry[1]
+        return created is not None and time.time() - created <= self._ttl(engine)
+
+    def put(self, engine, query, results):
+        """Store results for (engine, query)"""
+        entry = (json.dumps([r.to_dict() for r in results]), time.time())
+        with self._lock:
+            self._remember((engine, query), entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (engine, query, results, created) VALUES (?, ?, ?, ?)",
+                (engine, query, entry[0], entry[1])
+            )
+            self._db.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self):
+        """Delete expired entries from disk"""
+        now = time.time()
+        with self._lock:
+            for engine in DEFAULT_TTL_HOURS:
+                self._db.execute(
+                    "DELETE FROM responses WHERE engine = ? AND created < ?",
+                    (engine, now - self._ttl(engine))
+                )
+            self._db.commit()
+
+    def get_stats(self):
+        """Get cache statistics"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,129 @@
+"""
+telespot_cassette - HTTP record/replay for telespot and telespotx (--record/--replay)
+
+A cassette is a gzip-compressed JSON-lines file holding what each
+request_with_retry() / async_request_with_retry() call returned: the final
+response after retries (status, content type, body) and whether it counted
+as blocked. Replaying serves those back without the network, retries or
+pacing, so parsing and pattern analysis can be re-run and profiled on real
+responses at full CPU speed. API keys are never written to a cassette.
+"""
+
+import base64
+import gzip
+import json
+import threading
+from datetime import datetime
+
+CASSETTE_VERSION = 1
+
+# Request parameters holding credentials: left out of cassettes and request keys
+SECRET_PARAMS = frozenset({'key', 'cx'})
+
+# Response headers worth replaying (bodies are stored decoded)
+KEPT_HEADERS = ('content-type', 'retry-after')
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request"""
+
+
+def request_key(method, url, params=None, data=None):
+    """Key two requests share when one can be answered with the other's response"""
+    def fields(values):
+        return sorted((str(k), str(v)) for k, v in (values or {}).items() if k not in SECRET_PARAMS)
+    return json.dumps([method.upper(), url, fields(params), fields(data)], separators=(',', ':'))
+
+
+class Cassette:
+    """Recorded responses keyed by request_key().
+
+    In 'record' mode record() appends entries to the file as they come in;
+    call close() to finish it. In 'replay' mode the file is loaded up front
+    and play() hands out each key's responses in recorded order, repeating
+    the last one once they run out.
+    """
+
+    def __init__(self, path, mode='replay', tool=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.played = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._file = None
+        if mode == 'record':
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+            self._write({'cassette': CASSETTE_VERSION, 'tool': tool,
+                         'created': datetime.now().isoformat()})
+        else:
+            self._load()
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    record = json.loads(line)
+                    if 'key' in record:
+                        self._entries.setdefault(record['key'], []).append(record)
+            except (EOFError, ValueError):
+                # A recording cut short keeps everything before the cut
+                pass
+
+    def record(self, method, url, params, data, status, headers, body, blocked=False):
+        """Add one response (headers: any mapping, body: bytes)"""
+        entry = {
+            'key': request_key(method, url, params, data),
+            'status': status,
+            'headers': {name: headers[name] for name in KEPT_HEADERS if headers.get(name)},
+            'blocked': blocked,
+        }
+        try:
+            entry['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_b64'] = base64.b64encode(body).decode('ascii')
+        with self._lock:
+            self._write(entry)
+            self.recorded += 1
+
+    def play(self, method, url, params=None, data=None):
+        """Get the next recorded response for a request as (status, headers, body, blocked).
+
+        Raises CassetteMiss if the request was never recorded.
+        """
+        key = request_key(method, url, params, data)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.missed += 1
+                raise CassetteMiss(f"No recorded response for {method.upper()} {url}")
+            entry = entries.pop(0) if len(entries) > 1 else entries[0]
+            self.played += 1
+        if 'body_b64' in entry:
+            body = base64.b64decode(entry['body_b64'])
+        else:
+            body = entry['body'].encode('utf-8')
+        return entry['status'], entry['headers'], body, entry['blocked']
+
+    def describe(self):
+        """Summarize the session, e.g. 'recorded 42 responses to x.cassette'"""
+        if self.replaying:
+            missed = f", {self.missed} not recorded" if self.missed else ""
+            return f"replayed {self.played} responses from {self.path}{missed}"
+        return f"recorded {self.recorded} responses to {self.path}"
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
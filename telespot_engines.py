@@ -0,0 +1,954 @@
+"""
+telespot_engines - Search engine core shared by telespot and telespotx
+
+Each search backend is an engine adapter that knows how to build its HTTP
+request and how to turn the response into Result records. Adapters never do
+I/O themselves: telespot.py runs them over a pooled requests.Session and
+telespotx.py over an httpx.AsyncClient, so both tools send the same queries,
+detect blocks the same way and return the same result shapes.
+"""
+
+import codecs
+import hashlib
+import itertools
+import os
+import random
+import re
+import sys
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REQUEST FINGERPRINTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+USER_AGENTS = [
+    # Chrome on Windows (latest versions)
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    # Chrome on Mac
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    # Chrome on Linux
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    # Firefox (latest)
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.3; rv:123.0) Gecko/20100101 Firefox/123.0',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:123.0) Gecko/20100101 Firefox/123.0',
+    # Edge
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0',
+    # Safari
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+    # Mobile
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_3 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Mobile Safari/537.36',
+]
+
+# Common referer URLs to appear as natural browser traffic
+REFERERS = [
+    'https://www.google.com/',
+    'https://www.bing.com/',
+    'https://duckduckgo.com/',
+    'https://search.yahoo.com/',
+    '',  # Direct navigation (no referer)
+]
+
+# Captcha and block indicators in response content
+CAPTCHA_INDICATORS = [
+    'captcha', 'recaptcha', 'hcaptcha', 'challenge-platform',
+    'are you a robot', 'are you human', 'verify you are human',
+    'unusual traffic', 'automated requests', 'bot detection',
+    'access denied', 'forbidden', 'rate limit exceeded',
+    'please verify', 'security check', 'blocked',
+    'cf-challenge', 'cf-browser-verification',
+]
+
+
+def get_random_headers():
+    """Get request headers with random User-Agent and realistic browser fingerprint"""
+    ua = random.choice(USER_AGENTS)
+    is_firefox = 'Firefox' in ua
+
+    headers = {
+        'User-Agent': ua,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/json,*/*;q=0.8',
+        'Accept-Language': random.choice([
+            'en-US,en;q=0.9',
+            'en-US,en;q=0.9,es;q=0.8',
+            'en-GB,en;q=0.9,en-US;q=0.8',
+            'en-US,en;q=0.5',
+        ]),
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    }
+
+    # Add Sec-Fetch headers (Chrome/Edge only, not Firefox)
+    if not is_firefox:
+        headers.update({
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Sec-Fetch-User': '?1',
+            'sec-ch-ua-platform': random.choice(['"Windows"', '"macOS"', '"Linux"']),
+        })
+
+    # Add referer sometimes (not always - real browsers don't always send one)
+    ref = random.choice(REFERERS)
+    if ref:
+        headers['Referer'] = ref
+
+    return headers
+
+
+def get_api_headers():
+    """Get headers specifically tuned for API requests (JSON-focused)"""
+    headers = get_random_headers()
+    headers['Accept'] = 'application/json, text/html, */*'
+    # Remove browser-navigation headers not appropriate for API calls
+    headers.pop('Upgrade-Insecure-Requests', None)
+    headers.pop('Sec-Fetch-Dest', None)
+    headers.pop('Sec-Fetch-Mode', None)
+    headers.pop('Sec-Fetch-Site', None)
+    headers.pop('Sec-Fetch-User', None)
+    return headers
+
+
+# All indicators in one case-insensitive pattern, matched on raw bytes so
+# detection never has to decode the body
+CAPTCHA_PATTERN = re.compile(
+    b'|'.join(re.escape(i.encode()) for i in CAPTCHA_INDICATORS), re.IGNORECASE
+)
+TITLE_PATTERN = re.compile(rb'<title', re.IGNORECASE)
+
+# Block pages put their tell-tale text near the top; only this much of the
+# body is scanned, so detection cost does not grow with page size
+CAPTCHA_SCAN_BYTES = 16384
+# Chunk size for streamed response bodies
+STREAM_CHUNK_BYTES = 8192
+# How far to look for a <title> that falls outside the scanned prefix
+TITLE_SEARCH_BYTES = 65536
+TITLE_SCAN_BYTES = 512
+
+
+def detect_captcha(response, body=None):
+    """Check if a response contains captcha or block indicators.
+
+    Works with both requests and httpx responses. Returns True if the
+    response appears to be a captcha/block page rather than legitimate
+    search results. Only a bounded prefix of the body (plus the <title>
+    area if it lies beyond it) is scanned. Streamed responses pass the
+    prefix they have read as body.
+    """
+    # Check status codes that indicate blocking
+    if response.status_code in (403, 429, 503):
+        return True
+
+    # Check content type - captcha pages are usually HTML, not JSON
+    content_type = response.headers.get('Content-Type', '')
+    if 'application/json' in content_type:
+        return False  # JSON responses are legitimate API responses
+
+    # Check response body for captcha indicators
+    try:
+        if body is None:
+            body = response.content or b''
+        if CAPTCHA_PATTERN.search(body, 0, CAPTCHA_SCAN_BYTES):
+            return True
+        if len(body) > CAPTCHA_SCAN_BYTES and not TITLE_PATTERN.search(body, 0, CAPTCHA_SCAN_BYTES):
+            title = TITLE_PATTERN.search(body, CAPTCHA_SCAN_BYTES, TITLE_SEARCH_BYTES)
+            if title and CAPTCHA_PATTERN.search(body, title.start(), title.start() + TITLE_SCAN_BYTES):
+                return True
+    except Exception:
+        pass
+
+    return False
+
+
+def read_prefix(chunks, size=CAPTCHA_SCAN_BYTES):
+    """Read at least size bytes (or the whole body) from a chunk iterator.
+
+    Returns (prefix, chunks) where the new chunks iterator still yields the
+    complete body, starting with the bytes already read.
+    """
+    chunks = iter(chunks)
+    buffered = []
+    total = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        total += len(chunk)
+        if total >= size:
+            break
+    return b''.join(buffered), itertools.chain(buffered, chunks)
+
+
+def response_text(response):
+    """Decode a response body once and reuse it.
+
+    Uses the declared charset (UTF-8 otherwise) rather than requests'
+    charset sniffing, which scans the whole body again.
+    """
+    text = getattr(response, '_telespot_text', None)
+    if text is None:
+        try:
+            text = response.content.decode(response.encoding or 'utf-8', errors='replace')
+        except LookupError:
+            text = response.content.decode('utf-8', errors='replace')
+        response._telespot_text = text
+    return text
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PHONE NUMBER FORMATS (10 total: 4 basic + 4 quoted + 2 special)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def generate_phone_formats(phone_number, country_code='+1'):
+    """Generate 10 phone number format variations for searching"""
+    digits = re.sub(r'\D', '', phone_number)
+
+    if country_code == '+1':
+        if len(digits) == 11 and digits.startswith('1'):
+            digits = digits[1:]
+        if len(digits) != 10:
+            return []
+        area = digits[0:3]
+        prefix = digits[3:6]
+        line = digits[6:10]
+    else:
+        if len(digits) < 7:
+            return []
+        if len(digits) >= 10:
+            area = digits[-10:-7]
+            prefix = digits[-7:-4]
+            line = digits[-4:]
+        else:
+            area = digits[:3] if len(digits) >= 3 else digits
+            prefix = digits[3:6] if len(digits) >= 6 else ''
+            line = digits[6:] if len(digits) > 6 else ''
+
+    # 4 Basic formats
+    basic = [
+        f'{area}-{prefix}-{line}',                    # 215-555-1234
+        f'{area}{prefix}{line}',                      # 2155551234
+        f'({area}) {prefix}-{line}',                  # (215) 555-1234
+        f'+1{area}-{prefix}-{line}',                  # +1215-555-1234
+    ]
+
+    # 4 Quoted formats (exact match)
+    quoted = [
+        f'"{area}-{prefix}-{line}"',                  # "215-555-1234"
+        f'"{area}{prefix}{line}"',                    # "2155551234"
+        f'"({area}) {prefix}-{line}"',                # "(215) 555-1234"
+        f'"+1{area}-{prefix}-{line}"',                # "+1215-555-1234"
+    ]
+
+    # 2 Special formats
+    special = [
+        f'({area}-{prefix}-{line})',                  # (215-555-1234)
+        f'"{area}.{prefix}.{line}"',                  # "215.555.1234" (dot-separated)
+    ]
+
+    return basic + quoted + special
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RESULTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class Result:
+    """One search hit, kept compact for batches with many thousands of results.
+
+    Slotted rather than a dict, with the source and format names interned so
+    every result shares one copy of 'Google', 'DuckDuckGo' and so on. key is
+    the normalized URL (see normalize_url()), computed once here for every
+    stage that deduplicates or indexes by URL. to_dict() gives the JSON shape
+    the output files have always had.
+    """
+
+    __slots__ = ('title', 'url', 'snippet', 'source', 'format', 'key')
+
+    def __init__(self, title, url, snippet, source, fmt=None):
+        self.title = title
+        self.url = url
+        self.snippet = snippet
+        self.source = sys.intern(source)
+        self.format = sys.intern(fmt) if fmt else None
+        self.key = normalize_url(url)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a result from to_dict() output (cache entries, saved files)"""
+        return cls(data.get('title', ''), data.get('url', ''), data.get('snippet', ''),
+                   data.get('source') or 'Unknown', data.get('format'))
+
+    def with_format(self, fmt):
+        """Get a copy tagged with another format (the strings are shared)"""
+        copy = Result.__new__(Result)
+        copy.title, copy.url, copy.snippet = self.title, self.url, self.snippet
+        copy.source, copy.key = self.source, self.key
+        copy.format = sys.intern(fmt) if fmt else None
+        return copy
+
+    def to_dict(self):
+        data = {'title': self.title, 'url': self.url, 'snippet': self.snippet, 'source': self.source}
+        if self.format is not None:
+            data['format'] = self.format
+        return data
+
+    def __repr__(self):
+        return f"Result({self.source!r}, {self.url!r}, format={self.format!r})"
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENGINE ADAPTERS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class EngineRequest:
+    """Transport-independent description of one search request.
+
+    headers only holds what the engine needs on top of the rotating browser
+    fingerprint (API keys, Accept overrides); transports add a fresh
+    fingerprint on every attempt and merge these in.
+    """
+
+    def __init__(self, method, url, params=None, data=None, headers=None, auth=None,
+                 api_mode=False, max_retries=None, stream=False):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.data = data
+        self.headers = headers or {}
+        self.auth = auth
+        self.api_mode = api_mode
+        self.max_retries = max_retries
+        # Read the body in chunks through the engine's stream_parser()
+        self.stream = stream
+
+    def kwargs(self):
+        """Keyword arguments shared by requests.Session and httpx.AsyncClient"""
+        kwargs = {'headers': dict(self.headers)}
+        for key in ('params', 'data', 'auth'):
+            value = getattr(self, key)
+            if value is not None:
+                kwargs[key] = value
+        return kwargs
+
+
+# Send every engine's requests to this scheme://host[:port] instead of the real
+# APIs (each engine uses a distinct path, so one server can answer them all)
+BASE_URL_ENV = 'TELESPOT_BASE_URL'
+
+# API error bodies meaning the quota window is spent, not a short-term rate limit
+QUOTA_EXHAUSTED_PATTERN = re.compile(
+    r'per day|daily ?limit|call volume quota|quota will be replenished', re.IGNORECASE
+)
+
+
+class SearchEngine:
+    """Base engine adapter.
+
+    Subclasses set name/host and implement build_request() and parse().
+    An adapter with a fallback is followed by the fallback engine whenever
+    it returns fewer than min_results results.
+    """
+
+    name = None
+    host = None
+    # Credentials the engine needs from the config settings
+    required_settings = ()
+    # Print a warning (not just a debug line) when the engine is blocked
+    warn_on_block = True
+    # HTTP status -> warning message; codes in block_statuses also count as a block
+    status_messages = {}
+    block_statuses = (429,)
+    # Statuses that may mean the API quota is used up (see quota_exhausted())
+    quota_statuses = ()
+    fallback = None
+    min_results = 0
+    # Result pages available per query (see page_request()). Pages that only
+    # need their page number can be fetched concurrently, page_wave at a time
+    # so that paging stops soon after it runs dry; the others need the cursor
+    # parsed from the page before.
+    max_pages = 1
+    concurrent_pages = False
+    page_wave = 2
+
+    def url(self, path):
+        """Get the URL of a path on this engine's host, or on TELESPOT_BASE_URL if set"""
+        base = os.environ.get(BASE_URL_ENV) or f"https://{self.host}"
+        return f"{base.rstrip('/')}{path}"
+
+    def is_configured(self, settings):
+        return all(settings.get(key) for key in self.required_settings)
+
+    def query_for(self, fmt, query):
+        """Get the query string actually sent for a phone format"""
+        return query
+
+    def query_key(self, query):
+        """Key under which two queries are the same search on this engine"""
+        return web_query_key(query)
+
+    def build_request(self, query, settings, num_results=10):
+        """Build the EngineRequest for a query, or None if not configured"""
+        raise NotImplementedError
+
+    def page_request(self, query, settings, page, num_results=10, cursor=None):
+        """Build the request for result page `page` (0 = first), or None if there is none"""
+        return None
+
+    def page_limit(self):
+        """Get the most result pages a query can span, counting the fallback engine"""
+        return max(self.max_pages, self.fallback.page_limit() if self.fallback else 1)
+
+    def parse(self, response, num_results=10):
+        """Turn a 200 response into a list of Results"""
+        raise NotImplementedError
+
+    def stream_parser(self, num_results=10, encoding=None):
+        """Get an incremental parser for streamed requests.
+
+        The parser's feed_bytes(chunk) returns True once it has enough
+        results, and close() returns them.
+        """
+        raise NotImplementedError
+
+    def quota_exhausted(self, response):
+        """True if a response says the quota is used up until the window resets.
+
+        Retrying such a response only burns requests, so transports stop at it.
+        """
+        return (response.status_code in self.quota_statuses
+                and QUOTA_EXHAUSTED_PATTERN.search(response_text(response)) is not None)
+
+    def result(self, title, url, snippet):
+        return Result(title, url, snippet, self.name)
+
+
+class GoogleEngine(SearchEngine):
+    """Google Custom Search JSON API"""
+
+    name = 'Google'
+    host = 'www.googleapis.com'
+    required_settings = ('google_api_key', 'google_cse_id')
+    status_messages = {429: 'Google API quota exceeded'}
+    quota_statuses = (403, 429)
+    # The API serves at most 100 results per query (start + num <= 101)
+    max_pages = 10
+    concurrent_pages = True
+
+    def build_request(self, query, settings, num_results=10):
+        if not self.is_configured(settings):
+            return None
+
+        # Handle quoted queries - use exactTerms parameter for better results
+        clean_query = query
+        exact_terms = None
+        if query.startswith('"') and query.endswith('"'):
+            clean_query = query[1:-1]
+            exact_terms = clean_query
+
+        params = {
+            'key': settings['google_api_key'],
+            'cx': settings['google_cse_id'],
+            'q': clean_query,
+            'num': min(num_results, 10),
+        }
+        if exact_terms:
+            params['exactTerms'] = exact_terms
+
+        return EngineRequest('get', self.url('/customsearch/v1'),
+                             params=params, api_mode=True)
+
+    def page_request(self, query, settings, page, num_results=10, cursor=None):
+        request = self.build_request(query, settings, num_results)
+        if request is None or page >= self.max_pages:
+            return None
+        request.params['start'] = page * request.params['num'] + 1
+        return request
+
+    def parse(self, response, num_results=10):
+        data = response.json()
+        return [
+            self.result(item.get('title', ''), item.get('link', ''), item.get('snippet', ''))
+            for item in data.get('items', [])
+        ]
+
+
+class BingEngine(SearchEngine):
+    """Bing Web Search API (Azure)"""
+
+    name = 'Bing'
+    host = 'api.bing.microsoft.com'
+    required_settings = ('bing_api_key',)
+    status_messages = {401: 'Bing API key invalid', 429: 'Bing API quota exceeded'}
+    quota_statuses = (403, 429)
+    max_pages = 10
+    concurrent_pages = True
+
+    def build_request(self, query, settings, num_results=10):
+        if not self.is_configured(settings):
+            return None
+        return EngineRequest(
+            'get', self.url('/v7.0/search'),
+            params={'q': query, 'count': num_results, 'mkt': 'en-US'},
+            headers={'Ocp-Apim-Subscription-Key': settings['bing_api_key']},
+            api_mode=True,
+        )
+
+    def page_request(self, query, settings, page, num_results=10, cursor=None):
+        request = self.build_request(query, settings, num_results)
+        if request is None or page >= self.max_pages:
+            return None
+        request.params['offset'] = page * num_results
+        return request
+
+    def parse(self, response, num_results=10):
+        data = response.json()
+        return [
+            self.result(item.get('name', ''), item.get('url', ''), item.get('snippet', ''))
+            for item in data.get('webPages', {}).get('value', [])
+        ]
+
+
+UDDG_PATTERN = re.compile(r'uddg=([^&]+)')
+
+
+class DuckDuckGoHTMLParser(HTMLParser):
+    """Single-pass, incremental parser for DuckDuckGo HTML lite pages.
+
+    Pairs every result__a link with the result__snippet that follows it and
+    stops collecting once num_results results are complete (num_results=None
+    reads the whole page). Bytes can be fed in as they arrive with
+    feed_bytes(), which returns True when done. The hidden fields of the
+    "Next" form end up in next_page, ready to be posted for the next page.
+    """
+
+    def __init__(self, num_results=10, encoding=None):
+        super().__init__(convert_charrefs=True)
+        self.num_results = num_results
+        self.results = []
+        self.next_page = None
+        self._decoder = codecs.getincrementaldecoder(_codec(encoding))(errors='replace')
+        self._current = None    # [href, title parts, snippet parts] of the open result
+        self._capture = None    # list receiving text while inside a title/snippet link
+        self._form = None       # [hidden fields, is the Next button] of the open form
+
+    @property
+    def done(self):
+        return self.num_results is not None and len(self.results) >= self.num_results
+
+    def feed_bytes(self, chunk):
+        if not self.done:
+            self.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'form':
+            self._form = [{}, False]
+        elif tag == 'input' and self._form is not None:
+            attrs = dict(attrs)
+            if attrs.get('type') == 'hidden' and attrs.get('name'):
+                self._form[0][attrs['name']] = attrs.get('value') or ''
+            elif attrs.get('type') == 'submit' and attrs.get('value') == 'Next':
+                self._form[1] = True
+        if tag != 'a' or self.done:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if 'result__a' in classes:
+            self._finish()
+            self._current = [attrs.get('href') or '', [], []]
+            self._capture = self._current[1]
+        elif 'result__snippet' in classes and self._current is not None:
+            self._capture = self._current[2]
+
+    def handle_endtag(self, tag):
+        if tag == 'form' and self._form is not None:
+            fields, is_next = self._form
+            if is_next:
+                self.next_page = fields
+            self._form = None
+        if tag != 'a' or self._capture is None:
+            return
+        is_snippet = self._capture is self._current[2]
+        self._capture = None
+        if is_snippet:
+            self._finish()
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._capture.append(data)
+
+    def _finish(self):
+        """Turn the open result into a Result"""
+        if self._current is None:
+            return
+        href, title, snippet = self._current
+        self._current = None
+        self._capture = None
+
+        # DuckDuckGo wraps URLs in a redirect - extract the actual URL
+        actual_url = href
+        if 'uddg=' in href:
+            url_match = UDDG_PATTERN.search(href)
+            if url_match:
+                actual_url = unquote(url_match.group(1))
+
+        clean_title = ''.join(title).strip()
+        if clean_title and actual_url and not self.done:
+            self.results.append(Result(clean_title, actual_url, ''.join(snippet).strip(), 'DuckDuckGo'))
+
+    def close(self):
+        """Finish parsing and return the results"""
+        if not self.done:
+            self.feed(self._decoder.decode(b'', final=True))
+            super().close()
+            self._finish()
+        return self.results
+
+
+def _codec(encoding):
+    try:
+        return codecs.lookup(encoding or 'utf-8').name
+    except LookupError:
+        return 'utf-8'
+
+
+def parse_chunks(engine, chunks, num_results=10, encoding=None):
+    """Run a body given as byte chunks through an engine's stream parser.
+
+    Stops pulling chunks as soon as the parser has num_results results.
+    """
+    parser = engine.stream_parser(num_results, encoding)
+    for chunk in chunks:
+        if parser.feed_bytes(chunk):
+            break
+    return parser.close()
+
+
+def parse_page(engine, chunks, encoding=None):
+    """Parse a whole result page given as byte chunks.
+
+    Returns (results, cursor), where cursor is whatever the engine needs to
+    request the following page (None if there is none).
+    """
+    parser = engine.stream_parser(None, encoding)
+    for chunk in chunks:
+        parser.feed_bytes(chunk)
+    return parser.close(), getattr(parser, 'next_page', None)
+
+
+def parse_duckduckgo_html(body, num_results=10):
+    """Parse result links and snippets out of a DuckDuckGo HTML lite page"""
+    parser = DuckDuckGoHTMLParser(num_results)
+    parser.feed(body)
+    return parser.close()
+
+
+class DuckDuckGoHTMLEngine(SearchEngine):
+    """DuckDuckGo HTML lite search page.
+
+    The HTML lite version is lightweight and less likely to trigger
+    captchas than the full site.
+    """
+
+    name = 'DuckDuckGo'
+    host = 'html.duckduckgo.com'
+    warn_on_block = False
+    # Each page is requested by posting the previous page's "Next" form
+    max_pages = 10
+
+    def build_request(self, query, settings, num_results=10):
+        return EngineRequest('post', self.url('/html/'),
+                             data={'q': query, 'b': ''}, max_retries=2, stream=True)
+
+    def page_request(self, query, settings, page, num_results=10, cursor=None):
+        if not cursor or page >= self.max_pages:
+            return None
+        return EngineRequest('post', self.url('/html/'),
+                             data=dict(cursor), max_retries=2, stream=True)
+
+    def parse(self, response, num_results=10):
+        return parse_duckduckgo_html(response_text(response), num_results)
+
+    def stream_parser(self, num_results=10, encoding=None):
+        return DuckDuckGoHTMLParser(num_results, encoding)
+
+
+class DuckDuckGoEngine(SearchEngine):
+    """DuckDuckGo Instant Answer API with HTML fallback.
+
+    The Instant Answer API only returns knowledge-graph style results,
+    which are often empty for phone numbers, so the HTML lite page is
+    scraped whenever it returns fewer than three results.
+    """
+
+    name = 'DuckDuckGo'
+    host = 'api.duckduckgo.com'
+    warn_on_block = False
+    fallback = DuckDuckGoHTMLEngine()
+    min_results = 3
+
+    def build_request(self, query, settings, num_results=10):
+        return EngineRequest(
+            'get', self.url('/'),
+            params={'q': query, 'format': 'json', 'no_html': 1, 'skip_disambig': 1},
+            api_mode=True,
+        )
+
+    def parse(self, response, num_results=10):
+        data = response.json()
+        results = []
+
+        # Abstract (the API fills both Abstract and AbstractText)
+        abstract = data.get('AbstractText') or data.get('Abstract')
+        if abstract:
+            results.append(self.result(
+                data.get('Heading', 'DuckDuckGo Result'), data.get('AbstractURL', ''), abstract))
+
+        # Related topics
+        for topic in data.get('RelatedTopics', [])[:num_results]:
+            if isinstance(topic, dict) and topic.get('Text'):
+                results.append(self.result(
+                    topic.get('Text', '')[:80], topic.get('FirstURL', ''), topic.get('Text', '')))
+
+        # Results
+        for item in data.get('Results', [])[:num_results]:
+            results.append(self.result(
+                item.get('Text', ''), item.get('FirstURL', ''), item.get('Text', '')))
+
+        return results
+
+
+class DehashedEngine(SearchEngine):
+    """Dehashed breach database search"""
+
+    name = 'Dehashed'
+    host = 'api.dehashed.com'
+    required_settings = ('dehashed_api_key',)
+    status_messages = {401: 'Dehashed API key invalid'}
+    block_statuses = ()
+
+    def query_for(self, fmt, query):
+        # Dehashed matches on the bare digits, not on search-engine syntax
+        return re.sub(r'\D', '', fmt)
+
+    def query_key(self, query):
+        return query
+
+    def build_request(self, query, settings, num_results=10):
+        if not self.is_configured(settings):
+            return None
+        api_key = settings['dehashed_api_key']
+        auth = tuple(api_key.split(':', 1)) if ':' in api_key else (api_key, '')
+        return EngineRequest(
+            'get', self.url('/search'),
+            params={'query': f'phone:"{query}"'},
+            headers={'Accept': 'application/json'},
+            auth=auth,
+            api_mode=True,
+        )
+
+    def parse(self, response, num_results=10):
+        data = response.json()
+        results = []
+        for entry in (data.get('entries') or [])[:num_results]:
+            name = f"{entry.get('name', '')} {entry.get('username', '')}".strip()
+            results.append(self.result(
+                name or entry.get('email') or 'Dehashed Entry',
+                entry.get('database_name', ''),
+                f"Email: {entry.get('email') or 'N/A'} | Username: {entry.get('username') or 'N/A'} | "
+                f"Name: {entry.get('name') or 'N/A'} | Database: {entry.get('database_name') or 'N/A'}",
+            ))
+        return results
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUERY PLANNING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+QUERY_SEGMENT_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+QUERY_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+')
+
+
+def web_query_key(query):
+    """Reduce a query to how Google, Bing and DuckDuckGo match it.
+
+    Those engines ignore punctuation and match words joined by it
+    ("215-555-1234", "(215-555-1234)", "215.555.1234") as a phrase, exactly
+    like a quoted string. So every quoted string and every bare word becomes
+    its lowercased token sequence, while operators such as site: are kept
+    verbatim. "(215) 555-1234" is two separate terms, unlike its quoted form.
+    """
+    key = []
+    for match in QUERY_SEGMENT_PATTERN.finditer(query):
+        quoted, word = match.groups()
+        if word is not None and ':' in word:
+            key.append(word.lower())
+            continue
+        tokens = tuple(t.lower() for t in QUERY_TOKEN_PATTERN.findall(word if quoted is None else quoted))
+        if tokens:
+            key.append(tokens)
+    return tuple(key)
+
+
+class QueryPlan:
+    """Which (engine, format) pairs actually need a request.
+
+    Formats whose queries are the same search on an engine are collapsed onto
+    the first of them; the others reuse its results. With collapse=False
+    every format is sent to every engine. Requests dropped with skip() (for
+    example over an API quota) cover nothing.
+    """
+
+    def __init__(self, queries, engine_names, collapse=True):
+        self.queries = list(queries)
+        self.formats = [fmt for fmt, _ in queries]
+        self.engine_names = list(engine_names)
+        self._primary = {}
+        for name in self.engine_names:
+            engine = get_engine(name)
+            seen = {}
+            for fmt, query in queries:
+                key = engine.query_key(engine.query_for(fmt, query)) if collapse else fmt
+                self._primary[(name, fmt)] = seen.setdefault(key, fmt)
+
+    def covered_by(self, engine, fmt):
+        """Get the format whose request covers fmt on an engine (None if skipped)"""
+        return self._primary[(engine, fmt)]
+
+    def is_primary(self, engine, fmt):
+        return self._primary[(engine, fmt)] == fmt
+
+    def aliases(self, engine, fmt):
+        """Get every format covered by fmt's request on an engine (fmt first)"""
+        return [f for f in self.formats if self._primary[(engine, f)] == fmt]
+
+    def requests(self, engine):
+        """Get the (fmt, query) pairs actually sent to an engine"""
+        return [(fmt, query) for fmt, query in self.queries if self.is_primary(engine, fmt)]
+
+    def skip(self, engine, fmts):
+        """Drop the requests for fmts on an engine, along with the formats they cover"""
+        for fmt in fmts:
+            for covered in self.aliases(engine, fmt):
+                self._primary[(engine, covered)] = None
+
+    def request_count(self):
+        return sum(1 for (engine, fmt), primary in self._primary.items() if fmt == primary)
+
+    def naive_count(self):
+        return len(self._primary)
+
+
+# Registered engines by name. The tools still dispatch by engine name
+# (telespot.get_engine_calls, ENGINE_LABELS and HOST_RATE_LIMITS, Config,
+# telespotx.engine_names and search_engine), so a new adapter has to be
+# wired up there as well.
+ENGINES = {}
+
+
+def register_engine(engine):
+    """Register an engine adapter under its name"""
+    ENGINES[engine.name] = engine
+    return engine
+
+
+for _engine in (GoogleEngine(), BingEngine(), DuckDuckGoEngine(), DehashedEngine()):
+    register_engine(_engine)
+
+
+def get_engine(name):
+    return ENGINES[name]
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DEDUPLICATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Query parameters that only track the click, never change the page
+TRACKING_PARAMS = frozenset({
+    '_ga', '_gl', '_hsenc', '_hsmi', 'dclid', 'fbclid', 'gclid', 'gclsrc', 'igshid',
+    'mc_cid', 'mc_eid', 'mkt_tok', 'msclkid', 'ref_src', 'ref_url', 'srsltid', 'yclid',
+})
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+# Characters left unescaped in a canonical path (RFC 3986 pchar plus '/')
+PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url):
+    """Canonical form of a URL for duplicate detection.
+
+    http and https fold into https, the host loses its www. prefix, default
+    port and trailing dot, the path and query are percent-decoded and
+    re-encoded one way, tracking parameters are dropped and the rest sorted,
+    and the fragment goes. DuckDuckGo redirect links (/l/?uddg=) are
+    replaced by their target. Like before, the result is lowercased and a
+    trailing slash stripped. Values that are not web URLs (Dehashed
+    database names) are only lowercased and stripped.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(f"https:{url}" if url.startswith('//') else url)
+        port = parts.port
+    except ValueError:
+        parts = None
+    if parts is None or parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return url.rstrip('/').lower()
+
+    host = parts.hostname.rstrip('.')
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if host.endswith('duckduckgo.com') and parts.path.startswith('/l/'):
+        target = dict(query).get('uddg')
+        if target and target != url:
+            return normalize_url(target)
+
+    if host.startswith('www.'):
+        host = host[4:]
+    if ':' in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS[parts.scheme.lower()]:
+        host = f"{host}:{port}"
+    path = quote(unquote(parts.path), safe=PATH_SAFE).rstrip('/')
+    query = sorted((name, value) for name, value in query if not _is_tracking(name))
+    canonical = f"https://{host}{path}"
+    if query:
+        canonical += '?' + urlencode(query, quote_via=quote)
+    return canonical.lower()
+
+
+def url_fingerprint(key):
+    """Fixed-size 64-bit fingerprint of a normalized URL.
+
+    Seen-sets hold these instead of the URL strings, so their memory per
+    URL stays the same however long the URLs are across a large batch.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def deduplicate(results, seen_urls=None):
+    """Drop results whose URL is already in seen_urls, updating it in place.
+
+    seen_urls holds url_fingerprint()s of normalized URLs. Keeps the first
+    occurrence and every result without a URL (some DuckDuckGo and Dehashed
+    results have none). Returns the kept results.
+    """
+    if seen_urls is None:
+        seen_urls = set()
+    unique = []
+    for result in results:
+        if not result.key:
+            unique.append(result)
+            continue
+        fingerprint = url_fingerprint(result.key)
+        if fingerprint not in seen_urls:
+            seen_urls.add(fingerprint)
+            unique.append(result)
+    return unique
@@ -0,0 +1,249 @@
+"""
+telespot_metrics - Prometheus metrics for telespot and telespotx (--metrics-port/--metrics-file)
+
+Counters, gauges and histograms kept in process and rendered in the
+Prometheus text exposition format (version 0.0.4), either served from a
+local HTTP endpoint while a long batch runs or written to a node_exporter
+textfile-collector path after every lookup. No client library is needed.
+
+Metrics are off until enable_metrics() is called; until then the
+count_metric() / set_metric() / observe_metric() helpers return straight
+away. Stage durations (pacing, backoff, network, parse, dedupe, analyze)
+arrive through telespot_profile's sinks as telespot_stage_seconds.
+"""
+
+import math
+import os
+import threading
+
+from telespot_profile import add_sink
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of histogram buckets in seconds (+Inf is implied)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help, label names); rendered in this order
+METRICS = {
+    'telespot_requests_total': (
+        'counter', 'HTTP responses received per engine and status code ("error" for network failures)',
+        ('engine', 'status')),
+    'telespot_captcha_detections_total': (
+        'counter', 'Responses detected as a captcha or block page', ('engine',)),
+    'telespot_retries_total': (
+        'counter', 'Request retries by reason (captcha, rate_limited, network)', ('engine', 'reason')),
+    'telespot_results_total': (
+        'counter', 'Results parsed per engine before deduplication', ('engine',)),
+    'telespot_lookups_total': (
+        'counter', 'Phone numbers looked up', ()),
+    'telespot_results_raw_total': (
+        'counter', 'Results collected before deduplication', ()),
+    'telespot_results_unique_total': (
+        'counter', 'Results left after deduplication', ()),
+    'telespot_dedup_ratio': (
+        'gauge', 'Fraction of the last lookup\'s results removed as duplicates', ()),
+    'telespot_rate_limiter_delay_seconds': (
+        'gauge', 'Current delay of each adaptive rate limiter', ('engine', 'host')),
+    'telespot_rate_limiter_blocks_total': (
+        'counter', 'Blocks reported to each adaptive rate limiter', ('engine', 'host')),
+    'telespot_stage_seconds': (
+        'histogram', 'Time spent per stage and engine (see --profile)', ('stage', 'engine')),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    """Values of the METRICS above, keyed by label values; thread-safe"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._values = {name: {} for name in METRICS}
+        self._lock = threading.Lock()
+
+    def _key(self, name, labels):
+        # Missing labels render as '-', like the profiler's engine column
+        return tuple('-' if labels.get(label) is None else str(labels[label])
+                     for label in METRICS[name][2])
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._values[name]
+            state = series.get(key)
+            if state is None:
+                # [count per bucket (non-cumulative, last is +Inf), sum, count]
+                state = series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def observe_stage(self, stage, seconds, engine=None):
+        """telespot_profile sink feeding telespot_stage_seconds"""
+        self.observe('telespot_stage_seconds', seconds, stage=stage, engine=engine)
+
+    def render(self):
+        """Get all metrics in the Prometheus text format"""
+        with self._lock:
+            snapshot = {name: {key: (list(v[0]), v[1], v[2]) if isinstance(v, list) else v
+                               for key, v in series.items()}
+                        for name, series in self._values.items()}
+        lines = []
+        for name, (kind, help_text, label_names) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in sorted(snapshot[name]):
+                pairs = list(zip(label_names, key))
+                value = snapshot[name][key]
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(pairs)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Write render() to path atomically, as the textfile collector expects"""
+        import tempfile
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.telespot_metrics.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve render() at http://host:port/metrics from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='telespot-metrics', daemon=True).start()
+        return server
+
+
+# Process-wide registry (None while metrics are off) and where to export it
+_registry = None
+_server = None
+_textfile = None
+
+
+def enable_metrics(port=None, textfile=None):
+    """Start collecting metrics, serving them on port and/or writing them to textfile.
+
+    Raises OSError if the port cannot be bound.
+    """
+    global _registry, _server, _textfile
+    _registry = MetricsRegistry()
+    add_sink(_registry.observe_stage)
+    _textfile = textfile
+    if port is not None:
+        _server = _registry.serve(port)
+    return _registry
+
+
+def get_metrics():
+    """Get the active registry, or None if metrics are off"""
+    return _registry
+
+
+def metrics_address():
+    """Get the URL metrics are served at, or None"""
+    if _server is None:
+        return None
+    host, port = _server.server_address[:2]
+    return f"http://{host}:{port}/metrics"
+
+
+def count_metric(name, value=1, **labels):
+    """Increase a counter (a no-op while metrics are off)"""
+    if _registry is not None:
+        _registry.inc(name, value, **labels)
+
+
+def set_metric(name, value, **labels):
+    """Set a gauge (a no-op while metrics are off)"""
+    if _registry is not None:
+        _registry.set(name, value, **labels)
+
+
+def observe_metric(name, value, **labels):
+    """Add an observation to a histogram (a no-op while metrics are off)"""
+    if _registry is not None:
+        _registry.observe(name, value, **labels)
+
+
+def record_lookup(raw, unique):
+    """Count one finished lookup and its deduplication, then flush the textfile"""
+    if _registry is None:
+        return
+    _registry.inc('telespot_lookups_total')
+    _registry.inc('telespot_results_raw_total', raw)
+    _registry.inc('telespot_results_unique_total', unique)
+    _registry.set('telespot_dedup_ratio', (raw - unique) / raw if raw else 0.0)
+    flush_metrics()
+
+
+def flush_metrics():
+    """Write the textfile if one was requested"""
+    if _registry is not None and _textfile:
+        _registry.write_textfile(_textfile)
@@ -0,0 +1,72 @@
+"""
+telespot_output - Streaming NDJSON output shared by telespot and telespotx
+
+Writes one JSON record per line and flushes after every record, so the file
+can be followed (tail -f, jq) while a run is still going, memory stays flat
+however many numbers a batch has, and an interrupted run keeps everything
+written so far.
+
+Record types:
+  result - one deduplicated search result
+  format - summary of one format variation of a number
+  number - summary of one phone number (patterns and confidence)
+"""
+
+import json
+from datetime import datetime
+
+OUTPUT_FORMATS = ('json', 'txt', 'ndjson')
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+
+def resolve_output_format(filename, requested=None):
+    """Pick the output format from --output-format or else the file extension"""
+    if requested:
+        return requested
+    lower = (filename or '').lower()
+    if lower.endswith(NDJSON_EXTENSIONS):
+        return 'ndjson'
+    if lower.endswith('.json'):
+        return 'json'
+    return 'txt'
+
+
+class NDJSONWriter:
+    """Appends result and summary records to an NDJSON file as they arrive"""
+
+    def __init__(self, path, version=None):
+        self.path = path
+        self.version = version
+        self.records = 0
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record_type, **fields):
+        """Write one record and flush it to disk"""
+        record = {'type': record_type}
+        record.update(fields)
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self.records += 1
+
+    def result(self, phone_number, fmt, result):
+        self.write('result', phone_number=phone_number, **dict(result.to_dict(), format=fmt))
+
+    def format_summary(self, phone_number, fmt, results, unique, total_unique):
+        """Record one format: raw results, new unique results, running unique total"""
+        self.write('format', phone_number=phone_number, format=fmt, results=results,
+                   unique=unique, total_unique=total_unique,
+                   timestamp=datetime.now().isoformat())
+
+    def number_summary(self, phone_number, formats, patterns):
+        self.write('number', phone_number=phone_number, version=self.version,
+                   search_formats=formats, patterns=patterns,
+                   timestamp=datetime.now().isoformat())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
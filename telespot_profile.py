@@ -0,0 +1,136 @@
+"""
+telespot_profile - Per-stage timing profiler shared by telespot and telespotx (--profile)
+
+Stages are timed with time.perf_counter() and kept per (stage, engine):
+
+  pacing   rate limiter sleeps before a request
+  backoff  retry sleeps inside request_with_retry after a block or error
+  network  sending a request and reading its headers (and a streamed body's prefix)
+  parse    turning a response into results (including the rest of a streamed body)
+  dedupe   URL deduplication
+  analyze  pattern extraction
+
+Stage durations go to every registered sink: the profiler once
+enable_profiler() is called, and the stage histogram of telespot_metrics
+when metrics are on. With no sink timed() hands back one shared no-op
+context manager and record() returns straight away, so the instrumented
+code costs next to nothing.
+"""
+
+import contextlib
+import math
+import threading
+import time
+
+# Summary order; stages not listed here come after them
+STAGES = ('pacing', 'backoff', 'network', 'parse', 'dedupe', 'analyze')
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class StageProfiler:
+    """Collects durations per (stage, engine); thread-safe"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, engine=None):
+        with self._lock:
+            self._samples.setdefault((stage, engine or '-'), []).append(seconds)
+
+    def summary(self):
+        """Get {'wall', 'stages': [{stage, engine, count, total, p50, p95, max}]} in seconds"""
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        rows = []
+        for stage, engine in sorted(samples, key=lambda key: (order.get(key[0], len(order)), key)):
+            values = samples[(stage, engine)]
+            rows.append({
+                'stage': stage,
+                'engine': engine,
+                'count': len(values),
+                'total': round(sum(values), 6),
+                'p50': round(percentile(values, 0.50), 6),
+                'p95': round(percentile(values, 0.95), 6),
+                'max': round(values[-1], 6),
+            })
+        return {'wall': round(time.perf_counter() - self.started, 6), 'stages': rows}
+
+
+def format_summary(summary):
+    """Render summary() as table lines"""
+    lines = [
+        f"{'Stage':<10}{'Engine':<12}{'Count':>7}{'Total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}",
+        "-" * 69,
+    ]
+    for row in summary['stages']:
+        lines.append(
+            f"{row['stage']:<10}{row['engine']:<12}{row['count']:>7}{row['total']:>10.3f}"
+            f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}"
+        )
+    lines.append(f"Wall time: {summary['wall']:.2f}s (stages overlap when engines run in parallel)")
+    return lines
+
+
+# Process-wide profiler (None while profiling is off)
+_profiler = None
+
+# Callables sink(stage, seconds, engine) receiving every stage duration
+_sinks = []
+
+
+def add_sink(sink):
+    """Send every stage duration to sink(stage, seconds, engine) from now on"""
+    _sinks.append(sink)
+
+
+def enable_profiler():
+    """Start profiling this process"""
+    global _profiler
+    _profiler = StageProfiler()
+    add_sink(_profiler.add)
+    return _profiler
+
+
+def get_profiler():
+    """Get the active profiler, or None if profiling is off"""
+    return _profiler
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'engine', 'started')
+
+    def __init__(self, stage, engine):
+        self.stage = stage
+        self.engine = engine
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started, self.engine)
+
+
+def timed(stage, engine=None):
+    """Context manager timing a block as a stage (a no-op while nothing listens)"""
+    if not _sinks:
+        return _NOT_TIMED
+    return _StageTimer(stage, engine)
+
+
+def record(stage, seconds, engine=None):
+    """Add an already measured duration (e.g. a sleep) to a stage"""
+    for sink in _sinks:
+        sink(stage, seconds, engine)
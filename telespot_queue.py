@@ -0,0 +1,211 @@
+"""
+telespot_queue - Durable SQLite job queue behind 'telespot queue' and 'telespot worker'
+
+Lookups are rows in a jobs table. A worker claims the oldest queued job,
+which leases it to that worker for a visibility timeout; the worker extends
+the lease while it searches and acks the job with its results, or fails it.
+A job whose worker died becomes claimable again once its lease runs out,
+up to max_attempts claims.
+
+The same database coordinates pacing between worker processes: each rate
+limiter reserves its request slots from the rate_slots table, so N workers
+together keep the spacing one process would.
+"""
+
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+
+QUEUE_FILE = '.telespot_queue.db'
+
+# Seconds a claimed job stays invisible to other workers without a heartbeat
+DEFAULT_LEASE = 300.0
+
+# Claims a job gets before a lost lease or a failure marks it failed for good
+MAX_ATTEMPTS = 3
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY,"
+    " phone_number TEXT NOT NULL,"
+    " options TEXT NOT NULL DEFAULT '{}',"
+    " status TEXT NOT NULL DEFAULT 'queued',"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " worker TEXT,"
+    " lease_until REAL,"
+    " enqueued REAL NOT NULL,"
+    " started REAL,"
+    " finished REAL,"
+    " error TEXT,"
+    " result TEXT)",
+    "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, id)",
+    "CREATE TABLE IF NOT EXISTS rate_slots ("
+    " key TEXT PRIMARY KEY,"
+    " next_slot REAL NOT NULL) WITHOUT ROWID",
+)
+
+
+class JobQueue:
+    """Jobs and shared rate limiter slots in one SQLite file; safe across processes"""
+
+    def __init__(self, path=QUEUE_FILE, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit: every write runs in an explicit BEGIN IMMEDIATE below
+        self._db = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as db:
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Write transaction holding the database's write lock from the start"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def enqueue(self, numbers, options=None):
+        """Add one job per number; returns their IDs"""
+        now = time.time()
+        options_json = json.dumps(options or {}, sort_keys=True)
+        with self._transaction() as db:
+            return [
+                db.execute("INSERT INTO jobs (phone_number, options, enqueued) VALUES (?, ?, ?)",
+                           (number, options_json, now)).lastrowid
+                for number in numbers
+            ]
+
+    def claim(self, worker, lease=DEFAULT_LEASE):
+        """Lease the oldest available job to worker.
+
+        Returns {'id', 'phone_number', 'options', 'attempts'} or None if no
+        job is queued and no lease has run out.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs whose last allowed attempt lost its lease fail for good
+            db.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, lease_until = NULL,"
+                " error = 'lease expired ' || attempts || ' times'"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            row = db.execute(
+                "SELECT id, phone_number, options, attempts FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                " ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?,"
+                " attempts = attempts + 1, started = ? WHERE id = ?",
+                (worker, now + lease, now, row['id']))
+        return {
+            'id': row['id'],
+            'phone_number': row['phone_number'],
+            'options': json.loads(row['options']),
+            'attempts': row['attempts'] + 1,
+        }
+
+    def _owned(self, sql, params, job_id, worker):
+        """Run an UPDATE on a job still leased to worker; False if the lease was lost"""
+        with self._transaction() as db:
+            cursor = db.execute(sql + " WHERE id = ? AND worker = ? AND status = 'running'",
+                                params + (job_id, worker))
+            return cursor.rowcount == 1
+
+    def extend(self, job_id, worker, lease=DEFAULT_LEASE):
+        """Push the lease of a running job lease seconds into the future"""
+        return self._owned("UPDATE jobs SET lease_until = ?", (time.time() + lease,), job_id, worker)
+
+    def ack(self, job_id, worker, result):
+        """Mark a job done and keep its result (any JSON-serializable value)"""
+        return self._owned(
+            "UPDATE jobs SET status = 'done', finished = ?, lease_until = NULL, error = NULL, result = ?",
+            (time.time(), json.dumps(result, ensure_ascii=False, separators=(',', ':'))),
+            job_id, worker)
+
+    def fail(self, job_id, worker, error, retry=True):
+        """Record a failed attempt; the job is queued again while attempts remain and retry is set"""
+        return self._owned(
+            "UPDATE jobs SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END,"
+            " finished = ?, lease_until = NULL, error = ?",
+            (retry, self.max_attempts, time.time(), error), job_id, worker)
+
+    def release(self, job_id, worker):
+        """Hand an unfinished job back without counting the attempt (the worker is stopping)"""
+        return self._owned(
+            "UPDATE jobs SET status = 'queued', lease_until = NULL, attempts = attempts - 1",
+            (), job_id, worker)
+
+    def retry_failed(self):
+        """Queue every failed job again; returns how many"""
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, finished = NULL"
+                " WHERE status = 'failed'").rowcount
+
+    def counts(self):
+        """Get the number of jobs in each state"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def pending(self):
+        """Get the number of jobs not yet done or failed"""
+        counts = self.counts()
+        return counts['queued'] + counts['running']
+
+    def jobs(self, status=None, results=False):
+        """Get jobs in ID order as dicts (with their parsed result when results=True)"""
+        columns = "id, phone_number, options, status, attempts, worker, enqueued, started, finished, error"
+        if results:
+            columns += ", result"
+        sql = f"SELECT {columns} FROM jobs"
+        params = ()
+        if status:
+            sql += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id", params).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['options'] = json.loads(job['options'])
+            if results:
+                job['result'] = json.loads(job['result']) if job['result'] else None
+            jobs.append(job)
+        return jobs
+
+    def reserve_slot(self, key, delay):
+        """Reserve the next request slot of a rate limiter shared by every worker.
+
+        Slots of one key are spaced delay seconds apart across processes.
+        Returns how long to sleep until the reserved slot.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT next_slot FROM rate_slots WHERE key = ?", (key,)).fetchone()
+            slot = max(now, row['next_slot']) if row else now
+            db.execute("INSERT INTO rate_slots (key, next_slot) VALUES (?, ?)"
+                       " ON CONFLICT(key) DO UPDATE SET next_slot = excluded.next_slot",
+                       (key, slot + delay))
+        return slot - now
+
+    def close(self):
+        with self._lock:
+            self._db.close()
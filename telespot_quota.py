@@ -0,0 +1,238 @@
+"""
+telespot_quota - Persistent API quota ledger shared by telespot and telespotx
+
+Counts the requests sent to each metered API per quota window (Google's daily
+free tier, Bing's monthly one) in a small JSON file next to .telespot_config,
+so a run can plan its query budget up front instead of finding out from a 429
+halfway through.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: shared ledgers fall back to last writer wins
+    fcntl = None
+
+QUOTA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telespot_quota.json")
+
+# Default requests per window (override with quota_<engine> in .telespot_config;
+# blank = counted but unlimited)
+DEFAULT_QUOTAS = {
+    'Google': (100, 'day'),
+    'Bing': (1000, 'month'),
+    'Dehashed': (None, 'month'),    # Credit based - set quota_dehashed to your plan
+}
+
+
+@functools.lru_cache(maxsize=None)
+def quota_timezone():
+    """Google resets its daily quota at midnight Pacific time (loaded on first use)"""
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo('America/Los_Angeles')
+    except Exception:
+        return timezone(timedelta(hours=-8))
+
+
+def window_key(period, now=None):
+    """Get the quota window a moment falls in ('2024-05-01' or '2024-05')"""
+    now = now or datetime.now(quota_timezone())
+    return now.strftime('%Y-%m-%d' if period == 'day' else '%Y-%m')
+
+
+def load_quotas(settings):
+    """Build the per-engine (limit, period) table from config settings"""
+    quotas = {}
+    for engine, (limit, period) in DEFAULT_QUOTAS.items():
+        value = settings.get(f'quota_{engine.lower()}')
+        if value is not None:
+            try:
+                limit = int(value) if value.strip() else None
+            except ValueError:
+                pass
+        quotas[engine] = (limit, period)
+    return quotas
+
+
+def allocate_budget(available, demands):
+    """Split available requests across demands as evenly as possible.
+
+    Returns how many requests each demand gets. With available=None
+    (unlimited) every demand is granted in full.
+    """
+    if available is None:
+        return list(demands)
+
+    grants = [0] * len(demands)
+    left = available
+    open_demands = [i for i, demand in enumerate(demands) if demand > 0]
+    while left > 0 and open_demands:
+        share = max(1, left // len(open_demands))
+        for i in list(open_demands):
+            give = min(share, demands[i] - grants[i], left)
+            grants[i] += give
+            left -= give
+            if grants[i] == demands[i]:
+                open_demands.remove(i)
+            if left == 0:
+                break
+    return grants
+
+
+class QuotaLedger:
+    """Per-engine request counts for the current quota window, kept on disk.
+
+    consume() reserves one request and persists the new count straight away,
+    so an interrupted run still leaves an accurate ledger. Engines without an
+    entry in quotas (DuckDuckGo) are never metered.
+
+    With shared=True several processes (telespot worker) use one ledger:
+    every update takes a lock file and re-reads the counts first.
+    """
+
+    def __init__(self, path=QUOTA_FILE, quotas=None, shared=False):
+        self.path = path
+        self.quotas = quotas or load_quotas({})
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @contextlib.contextmanager
+    def _update(self):
+        """Hold the ledger for a read-modify-write (across processes when shared)"""
+        with self._lock:
+            lock_file = None
+            if self.shared and fcntl is not None:
+                try:
+                    lock_file = open(f"{self.path}.lock", 'a')
+                except OSError:
+                    pass
+            if lock_file is None:
+                yield
+                return
+            with lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._load()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_metered(self, engine):
+        return engine in self.quotas
+
+    def used(self, engine):
+        """Get the requests already sent to an engine in the current window"""
+        if engine not in self.quotas:
+            return 0
+        entry = self._entries.get(engine, {})
+        if entry.get('window') != window_key(self.quotas[engine][1]):
+            return 0
+        return entry.get('used', 0)
+
+    def remaining(self, engine):
+        """Get the requests left in the current window, or None if unlimited"""
+        limit = self.quotas.get(engine, (None, None))[0]
+        if limit is None:
+            return None
+        return max(0, limit - self.used(engine))
+
+    def consume(self, engine):
+        """Reserve one request. Returns False if the engine's quota is used up."""
+        if engine not in self.quotas:
+            return True
+        with self._update():
+            if self.remaining(engine) == 0:
+                return False
+            self._set_used(engine, self.used(engine) + 1)
+            return True
+
+    def exhaust(self, engine):
+        """Mark an engine's quota used up for the rest of the window (the API said so)"""
+        limit = self.quotas.get(engine, (None, None))[0]
+        if limit is None:
+            return
+        with self._update():
+            self._set_used(engine, max(limit, self.used(engine)))
+
+    def _set_used(self, engine, used):
+        self._entries[engine] = {'window': window_key(self.quotas[engine][1]), 'used': used}
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def get_stats(self):
+        """Get usage per metered engine"""
+        return {
+            engine: {
+                'used': self.used(engine),
+                'limit': limit,
+                'period': period,
+                'remaining': self.remaining(engine),
+            }
+            for engine, (limit, period) in self.quotas.items()
+        }
+
+
+def describe_usage(stats):
+    """Describe one engine's get_stats() entry, e.g. '37/100 left today'"""
+    window = 'today' if stats['period'] == 'day' else 'this month'
+    if stats['limit'] is None:
+        return f"{stats['used']} used {window}"
+    return f"{stats['remaining']}/{stats['limit']} left {window}"
+
+
+def budget_plans(ledger, plans, is_cached=None, pages=None):
+    """Fit the metered requests of one or more QueryPlans into the remaining quota.
+
+    The remaining requests of each engine are shared out evenly across the
+    plans (one per phone number), keeping each plan's earliest formats.
+    Requests that is_cached(engine, fmt, query) reports as cached cost
+    nothing and are always kept, and each of the others may cost up to
+    pages[engine] requests (one per result page). Requests over budget are
+    skipped, leaving those formats to the unmetered engines.
+
+    Returns {engine: (requested, granted)} in API requests for every
+    metered engine in use.
+    """
+    report = {}
+    names = dict.fromkeys(name for plan in plans for name in plan.engine_names)
+    for engine in names:
+        if not ledger.is_metered(engine):
+            continue
+
+        metered = []
+        for plan in plans:
+            requests = plan.requests(engine)
+            if is_cached is not None:
+                requests = [(fmt, query) for fmt, query in requests
+                            if not is_cached(engine, fmt, query)]
+            metered.append(requests)
+
+        cost = (pages or {}).get(engine, 1)
+        remaining = ledger.remaining(engine)
+        demands = [len(requests) for requests in metered]
+        grants = allocate_budget(None if remaining is None else remaining // cost, demands)
+        for plan, requests, granted in zip(plans, metered, grants):
+            plan.skip(engine, [fmt for fmt, _ in requests[granted:]])
+        report[engine] = (sum(demands) * cost, sum(grants) * cost)
+    return report
@@ -0,0 +1,367 @@
+"""
+telespot_service - Local HTTP/JSON lookup service behind 'telespot serve'
+
+Lookups are submitted as jobs and run by worker threads in one long-lived
+process, so the HTTP session (and its TLS connections), rate limiter state,
+query cache, quota ledger and config stay warm from one job to the next.
+
+  POST   /jobs              {"phone": "...", "options": {...}} or {"numbers": [...], "options": {...}}
+  GET    /jobs              every known job, newest first
+  GET    /jobs/<id>         a job's status, and its results once done (?wait=SECONDS long-polls)
+  GET    /jobs/<id>/stream  the job's NDJSON records as they are produced (see telespot_output)
+  DELETE /jobs/<id>         cancel a job that has not started
+  GET    /health            queue counts and uptime
+
+The service knows nothing about searching: it is given a run_job(job, writer)
+callable that does the lookup, writes records through writer and returns
+the result dict.
+"""
+
+import json
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from telespot_output import NDJSONWriter
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Finished jobs kept for retrieval; the oldest are forgotten first
+MAX_FINISHED_JOBS = 1000
+
+# Upper bound for ?wait= long-polling, in seconds
+MAX_WAIT = 300.0
+
+# Records a job keeps for /stream; beyond this the oldest half is dropped
+# and clients that have not read them yet skip ahead
+MAX_JOB_RECORDS = 10000
+
+# Largest accepted request body
+MAX_BODY_BYTES = 1024 * 1024
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+class Job:
+    """One lookup: its options, state and the records written so far"""
+
+    def __init__(self, phone_number, options=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.phone_number = phone_number
+        self.options = dict(options or {})
+        self.status = 'queued'
+        self.submitted = datetime.now().isoformat()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = None
+        self.records = []
+        self.dropped = 0        # records dropped from the front of self.records
+        self.changed = threading.Condition()
+
+    @property
+    def finished_state(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def add_record(self, record):
+        with self.changed:
+            self.records.append(record)
+            if len(self.records) > MAX_JOB_RECORDS:
+                drop = len(self.records) - MAX_JOB_RECORDS // 2
+                del self.records[:drop]
+                self.dropped += drop
+            self.changed.notify_all()
+
+    def move(self, old, new, **fields):
+        """Change status from old to new; returns False if it was not old"""
+        with self.changed:
+            if self.status != old:
+                return False
+            self.set_status(new, **fields)
+            return True
+
+    def set_status(self, status, **fields):
+        with self.changed:
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def wait(self, timeout):
+        """Block until the job has finished or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while not self.finished_state:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+        return self.finished_state
+
+    @property
+    def record_count(self):
+        return self.dropped + len(self.records)
+
+    def records_from(self, index, timeout=15.0):
+        """Get the records after index, waiting for new ones while the job runs.
+
+        Returns (records, next_index, finished); records already dropped
+        are skipped. Records can still be returned along with
+        finished=True, so callers stop once one call returns none.
+        """
+        with self.changed:
+            if index >= self.record_count and not self.finished_state:
+                self.changed.wait(timeout)
+            records = self.records[max(0, index - self.dropped):]
+            return records, self.record_count, self.finished_state
+
+    def describe(self, results=False):
+        """JSON-ready view of the job (with its result when results=True and done)"""
+        info = {
+            'id': self.id,
+            'phone_number': self.phone_number,
+            'options': self.options,
+            'status': self.status,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'records': self.record_count,
+        }
+        if self.error:
+            info['error'] = self.error
+        if results and self.result is not None:
+            info['result'] = self.result
+        return info
+
+
+class JobWriter(NDJSONWriter):
+    """NDJSONWriter keeping records on a Job instead of in a file"""
+
+    def __init__(self, job, version=None):
+        self.job = job
+        self.path = f"job {job.id}"
+        self.version = version
+        self.records = 0
+
+    def write(self, record_type, **fields):
+        record = {'type': record_type}
+        record.update(fields)
+        self.job.add_record(record)
+        self.records += 1
+
+    def close(self):
+        pass
+
+
+class LookupService:
+    """Job registry plus the worker threads running them in submission order"""
+
+    def __init__(self, run_job, workers=1, version=None):
+        self.run_job = run_job
+        self.version = version
+        self.started = time.monotonic()
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'telespot-worker-{i + 1}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, phone_number, options=None):
+        job = Job(phone_number, options)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(reversed(list(self._jobs.values())))
+
+    def cancel(self, job_id):
+        """Cancel a queued job; returns False if it has already started"""
+        job = self.get(job_id)
+        return job is not None and job.move('queued', 'cancelled', finished=datetime.now().isoformat())
+
+    def counts(self):
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for job in self.jobs():
+            counts[job.status] += 1
+        return counts
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_state]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if not job.move('queued', 'running', started=datetime.now().isoformat()):
+                continue
+            try:
+                result = self.run_job(job, JobWriter(job, self.version))
+            except Exception as e:
+                job.set_status('failed', error=str(e) or type(e).__name__,
+                               finished=datetime.now().isoformat())
+            else:
+                job.set_status('done', result=result, finished=datetime.now().isoformat())
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a LookupService (the server's .service)"""
+
+    server_version = 'telespot-serve'
+    # Chunked transfer encoding (used by /stream) needs HTTP/1.1
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.log is not None:
+            self.server.log(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        return [p for p in parts.path.split('/') if p], parse_qs(parts.query)
+
+    def do_GET(self):
+        path, query = self._route()
+        if path == ['health']:
+            self._send_json(200, {
+                'status': 'ok',
+                'jobs': self.service.counts(),
+                'uptime': round(time.monotonic() - self.service.started, 1),
+            })
+        elif path == ['jobs']:
+            self._send_json(200, {'jobs': [job.describe() for job in self.service.jobs()]})
+        elif len(path) in (2, 3) and path[0] == 'jobs':
+            job = self.service.get(path[1])
+            if job is None:
+                self._error(404, f"No job {path[1]}")
+            elif len(path) == 2:
+                try:
+                    wait = min(float(query.get('wait', ['0'])[0]), MAX_WAIT)
+                except ValueError:
+                    self._error(400, 'wait must be a number of seconds')
+                    return
+                if wait > 0:
+                    job.wait(wait)
+                self._send_json(200, job.describe(results=True))
+            elif path[2] == 'stream':
+                self._stream(job)
+            else:
+                self._error(404, f"Unknown path {self.path}")
+        else:
+            self._error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        path, _ = self._route()
+        if path != ['jobs']:
+            self._error(404, f"Unknown path {self.path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                # The unread body would be taken for the next request
+                self.close_connection = True
+                raise ValueError('request body too large')
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError('expected a JSON object')
+            numbers = body.get('numbers') or ([body['phone']] if body.get('phone') else [])
+            # A string or object would pass the check below one character or key at a time
+            if (not isinstance(numbers, list) or not numbers
+                    or not all(isinstance(n, str) and n.strip() for n in numbers)):
+                raise ValueError("give a 'phone' string or a 'numbers' list")
+            options = body.get('options') or {}
+            if not isinstance(options, dict):
+                raise ValueError("'options' must be a JSON object")
+            self.server.check_options(options)
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        jobs = [self.service.submit(number.strip(), options) for number in numbers]
+        described = [dict(job.describe(), url=f"/jobs/{job.id}") for job in jobs]
+        self._send_json(202, described[0] if 'phone' in body and len(jobs) == 1 else {'jobs': described})
+
+    def do_DELETE(self):
+        path, _ = self._route()
+        if len(path) != 2 or path[0] != 'jobs':
+            self._error(404, f"Unknown path {self.path}")
+        elif self.service.get(path[1]) is None:
+            self._error(404, f"No job {path[1]}")
+        elif not self.service.cancel(path[1]):
+            self._error(409, f"Job {path[1]} has already started")
+        else:
+            self._send_json(200, self.service.get(path[1]).describe())
+
+    def _stream(self, job):
+        """Send the job's records as chunked NDJSON until it finishes"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                records, sent, finished = job.records_from(sent)
+                if records:
+                    data = ''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n'
+                                   for r in records).encode('utf-8')
+                    self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+                elif finished:
+                    break
+            end = json.dumps({'type': 'job', **job.describe()}, separators=(',', ':')) + '\n'
+            data = end.encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    """Threaded HTTP server for a LookupService.
+
+    check_options(options) raises ValueError for options a job may not use;
+    log(line), if given, receives one line per HTTP request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT, check_options=None, log=None):
+        super().__init__((host, port), ServiceHandler)
+        self.service = service
+        self.check_options = check_options or (lambda options: None)
+        self.log = log
+
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
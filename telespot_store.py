@@ -0,0 +1,366 @@
+"""
+telespot_store - Normalized SQLite store of past lookups (--store)
+
+Every run is written into numbers/runs/results/urls/entities tables so
+questions across lookups ("which numbers mention this URL, name or
+username?") are answered by an indexed query instead of re-reading result
+files. Shared by telespot and telespotx.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from telespot_engines import normalize_url
+
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telespot_store.db")
+
+# Pattern kinds stored as entities, keyed by their name in analyze_results() output
+ENTITY_KINDS = {
+    'names': 'name',
+    'locations': 'location',
+    'usernames': 'username',
+    'emails': 'email',
+}
+
+# Bound parameters per IN (...) lookup (older SQLite builds allow 999)
+LOOKUP_BATCH = 500
+
+# How much a shared entity of each kind says about two numbers being related
+# (a username or email is far more specific than a city); scaled by rarity
+KIND_WEIGHTS = {
+    'email': 3.0,
+    'username': 2.0,
+    'name': 1.5,
+    'location': 0.5,
+}
+
+# Entities shared by more numbers than this (a state, a common name) are too
+# generic to correlate on and are skipped by related_numbers()
+MAX_ENTITY_NUMBERS = 1000
+
+# Bump when the schema changes; older stores are migrated on open
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS numbers (
+    id INTEGER PRIMARY KEY,
+    digits TEXT NOT NULL UNIQUE,
+    display TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    number_id INTEGER NOT NULL REFERENCES numbers(id),
+    created REAL NOT NULL,
+    version TEXT,
+    formats TEXT NOT NULL,
+    total_results INTEGER NOT NULL,
+    confidence TEXT,
+    confidence_pct INTEGER
+);
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    domain TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    url_id INTEGER REFERENCES urls(id),
+    format TEXT NOT NULL,
+    source TEXT,
+    title TEXT,
+    snippet TEXT
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL COLLATE NOCASE,
+    numbers INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (kind, value)
+);
+CREATE TABLE IF NOT EXISTS run_entities (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    entity_id INTEGER NOT NULL REFERENCES entities(id),
+    mentions INTEGER NOT NULL,
+    PRIMARY KEY (run_id, entity_id)
+);
+CREATE TABLE IF NOT EXISTS number_entities (
+    entity_id INTEGER NOT NULL REFERENCES entities(id),
+    number_id INTEGER NOT NULL REFERENCES numbers(id),
+    runs INTEGER NOT NULL,
+    mentions INTEGER NOT NULL,
+    PRIMARY KEY (entity_id, number_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_runs_number ON runs(number_id, created);
+CREATE INDEX IF NOT EXISTS idx_urls_domain ON urls(domain);
+CREATE INDEX IF NOT EXISTS idx_results_url ON results(url_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS idx_run_entities_entity ON run_entities(entity_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_number_entities_number ON number_entities(number_id, entity_id);
+"""
+
+
+def url_domain(url):
+    """Get the host of a URL without a leading www."""
+    host = urlsplit(url if '//' in url else f'//{url}').hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def entity_value(kind, value):
+    """Canonical stored form of an entity: single spaces, usernames without the
+    leading @, emails lowercased (other kinds compare case-insensitively)"""
+    value = ' '.join(value.split())
+    if kind == 'username':
+        return value.lstrip('@')
+    if kind == 'email':
+        return value.lower()
+    return value
+
+
+def _pattern_items(values):
+    """Yield (value, count) from a pattern list of pairs or a value -> count dict"""
+    return values.items() if isinstance(values, dict) else values
+
+
+class ResultStore:
+    """SQLite store of runs, their results, URLs and extracted entities.
+
+    Runs in WAL mode so queries never block a search writing to the store,
+    and each run is written with batched inserts in a single transaction.
+
+    number_entities is an inverted index from entity to the numbers whose
+    runs mention it, updated in the same transaction as each run, so
+    related_numbers() only reads the postings of one number's entities.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        self._db.executescript(SCHEMA)
+        if version < SCHEMA_VERSION:
+            self._migrate()
+        self._db.commit()
+
+    def _migrate(self):
+        """Bring a store written by an older version up to SCHEMA_VERSION"""
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(entities)")]
+        if 'numbers' not in columns:
+            self._db.execute("ALTER TABLE entities ADD COLUMN numbers INTEGER NOT NULL DEFAULT 0")
+        self._rebuild_index()
+        self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _rebuild_index(self):
+        self._db.execute("DELETE FROM number_entities")
+        self._db.execute(
+            "INSERT INTO number_entities (entity_id, number_id, runs, mentions)"
+            " SELECT run_entities.entity_id, runs.number_id, COUNT(*), SUM(run_entities.mentions)"
+            " FROM run_entities JOIN runs ON runs.id = run_entities.run_id"
+            " GROUP BY run_entities.entity_id, runs.number_id"
+        )
+        self._db.execute(
+            "UPDATE entities SET numbers ="
+            " (SELECT COUNT(*) FROM number_entities WHERE number_entities.entity_id = entities.id)"
+        )
+
+    def rebuild_index(self):
+        """Recompute the entity -> numbers index from the stored runs"""
+        with self._lock, self._db:
+            self._rebuild_index()
+
+    def save_run(self, phone_number, formats, all_results, patterns, version=None):
+        """Store one lookup: fmt -> results plus its patterns. Returns the run id."""
+        digits = ''.join(ch for ch in phone_number if ch.isdigit())
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO numbers (digits, display) VALUES (?, ?)"
+                " ON CONFLICT (digits) DO UPDATE SET display = excluded.display",
+                (digits, phone_number)
+            )
+            number_id = self._db.execute("SELECT id FROM numbers WHERE digits = ?", (digits,)).fetchone()[0]
+            run_id = self._db.execute(
+                "INSERT INTO runs (number_id, created, version, formats, total_results, confidence, confidence_pct)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (number_id, time.time(), version, json.dumps(formats),
+                 sum(len(results) for results in all_results.values()),
+                 patterns.get('confidence'), patterns.get('confidence_pct'))
+            ).lastrowid
+
+            urls = {}
+            for results in all_results.values():
+                for r in results:
+                    if r.key and r.key not in urls:
+                        urls[r.key] = url_domain(r.key)
+            self._db.executemany("INSERT OR IGNORE INTO urls (url, domain) VALUES (?, ?)", urls.items())
+            url_ids = {}
+            batch = list(urls)
+            for start in range(0, len(batch), LOOKUP_BATCH):
+                chunk = batch[start:start + LOOKUP_BATCH]
+                url_ids.update(self._db.execute(
+                    f"SELECT url, id FROM urls WHERE url IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall())
+
+            self._db.executemany(
+                "INSERT INTO results (run_id, url_id, format, source, title, snippet) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, url_ids.get(r.key), fmt, r.source, r.title, r.snippet)
+                    for fmt, results in all_results.items() for r in results
+                ]
+            )
+
+            # Values that only differ in case or spacing are one entity
+            merged = {}
+            for key, kind in ENTITY_KINDS.items():
+                for value, count in _pattern_items(patterns.get(key) or []):
+                    value = entity_value(kind, value)
+                    if value:
+                        entry = merged.setdefault((kind, value.lower()), [kind, value, 0])
+                        entry[2] += count
+            entities = list(merged.values())
+
+            self._db.executemany(
+                "INSERT OR IGNORE INTO entities (kind, value) VALUES (?, ?)",
+                [(kind, value) for kind, value, _ in entities]
+            )
+            self._db.executemany(
+                "INSERT INTO run_entities (run_id, entity_id, mentions)"
+                " SELECT ?, id, ? FROM entities WHERE kind = ? AND value = ?",
+                [(run_id, count, kind, value) for kind, value, count in entities]
+            )
+
+            # Update the inverted index: count each entity's first mention by
+            # this number, then add the run to the number's posting
+            self._db.executemany(
+                "UPDATE entities SET numbers = numbers + 1 WHERE kind = ? AND value = ? AND NOT EXISTS"
+                " (SELECT 1 FROM number_entities WHERE entity_id = entities.id AND number_id = ?)",
+                [(kind, value, number_id) for kind, value, _ in entities]
+            )
+            self._db.executemany(
+                "INSERT INTO number_entities (entity_id, number_id, runs, mentions)"
+                " SELECT id, ?, 1, ? FROM entities WHERE kind = ? AND value = ?"
+                " ON CONFLICT (entity_id, number_id) DO UPDATE"
+                " SET runs = runs + 1, mentions = mentions + excluded.mentions",
+                [(number_id, count, kind, value) for kind, value, count in entities]
+            )
+        return run_id
+
+    def related_numbers(self, phone_number, limit=20, max_numbers=MAX_ENTITY_NUMBERS):
+        """Get the numbers sharing entities with a number, most related first.
+
+        Each shared entity adds KIND_WEIGHTS[kind] * log(1 + numbers / df),
+        where df is how many numbers mention it, so a shared username counts
+        for more than a shared state and rare entities for more than common
+        ones. Entities mentioned by more than max_numbers numbers are skipped.
+        """
+        digits = ''.join(ch for ch in phone_number if ch.isdigit())
+        with self._lock:
+            row = self._db.execute("SELECT id FROM numbers WHERE digits = ?", (digits,)).fetchone()
+            if row is None:
+                return []
+            number_id = row[0]
+            total = self._db.execute("SELECT COUNT(*) FROM numbers").fetchone()[0]
+            entities = {
+                entity_id: (kind, value, KIND_WEIGHTS.get(kind, 1.0) * math.log(1 + total / df))
+                for entity_id, kind, value, df in self._db.execute(
+                    "SELECT entities.id, entities.kind, entities.value, entities.numbers"
+                    " FROM number_entities JOIN entities ON entities.id = number_entities.entity_id"
+                    " WHERE number_entities.number_id = ? AND entities.numbers BETWEEN 2 AND ?",
+                    (number_id, max_numbers)
+                )
+            }
+
+            scores = {}
+            shared = {}
+            ids = list(entities)
+            for start in range(0, len(ids), LOOKUP_BATCH):
+                chunk = ids[start:start + LOOKUP_BATCH]
+                for entity_id, other_id in self._db.execute(
+                    "SELECT entity_id, number_id FROM number_entities"
+                    f" WHERE entity_id IN ({', '.join('?' * len(chunk))}) AND number_id != ?",
+                    chunk + [number_id]
+                ):
+                    scores[other_id] = scores.get(other_id, 0.0) + entities[entity_id][2]
+                    shared.setdefault(other_id, []).append(entity_id)
+
+            ranked = sorted(scores, key=lambda other_id: (-scores[other_id], -len(shared[other_id])))[:limit]
+            displays = {}
+            for start in range(0, len(ranked), LOOKUP_BATCH):
+                chunk = ranked[start:start + LOOKUP_BATCH]
+                displays.update((number, (display, digits)) for number, display, digits in self._db.execute(
+                    f"SELECT id, display, digits FROM numbers WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+
+        return [
+            {
+                'phone_number': displays[other_id][0],
+                'digits': displays[other_id][1],
+                'score': round(scores[other_id], 3),
+                'shared': [
+                    {'kind': entities[entity_id][0], 'value': entities[entity_id][1]}
+                    for entity_id in sorted(shared[other_id], key=lambda e: -entities[e][2])
+                ],
+            }
+            for other_id in ranked
+        ]
+
+    def numbers_for_url(self, url):
+        """Get the numbers whose results link to a URL"""
+        return self._numbers(
+            "JOIN results ON results.run_id = runs.id JOIN urls ON urls.id = results.url_id"
+            " WHERE urls.url = ?", (normalize_url(url),))
+
+    def numbers_for_domain(self, domain):
+        """Get the numbers whose results link anywhere on a domain"""
+        return self._numbers(
+            "JOIN results ON results.run_id = runs.id JOIN urls ON urls.id = results.url_id"
+            " WHERE urls.domain = ?", (url_domain(domain.lower()),))
+
+    def numbers_for_entity(self, kind, value):
+        """Get the numbers whose runs mention an entity (kind: name, location, username, email)"""
+        return self._numbers(
+            "JOIN run_entities ON run_entities.run_id = runs.id"
+            " JOIN entities ON entities.id = run_entities.entity_id"
+            " WHERE entities.kind = ? AND entities.value = ?", (kind, entity_value(kind, value)))
+
+    def _numbers(self, joins, params):
+        """Group matching runs by number: display, digits, runs, matches, last seen"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT numbers.display, numbers.digits, COUNT(DISTINCT runs.id), COUNT(*), MAX(runs.created)"
+                " FROM runs JOIN numbers ON numbers.id = runs.number_id "
+                f"{joins} GROUP BY numbers.id ORDER BY COUNT(*) DESC, MAX(runs.created) DESC",
+                params
+            ).fetchall()
+        return [
+            {'phone_number': display, 'digits': digits, 'runs': runs, 'matches': matches, 'last_seen': last_seen}
+            for display, digits, runs, matches, last_seen in rows
+        ]
+
+    def runs_for_number(self, phone_number):
+        """Get the stored runs of a number, newest first"""
+        digits = ''.join(ch for ch in phone_number if ch.isdigit())
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT runs.id, runs.created, runs.total_results, runs.confidence, runs.confidence_pct"
+                " FROM runs JOIN numbers ON numbers.id = runs.number_id"
+                " WHERE numbers.digits = ? ORDER BY runs.created DESC",
+                (digits,)
+            ).fetchall()
+        return [
+            {'run_id': run_id, 'created': created, 'total_results': total,
+             'confidence': confidence, 'confidence_pct': pct}
+            for run_id, created, total, confidence, pct in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -10,13 +10,15 @@ United States phone numbers only (+1).
 
 import argparse
 import asyncio
+import functools
 import json
 import os
 import random
 import re
+import sqlite3
 import sys
+import time
 from datetime import datetime
-from urllib.parse import unquote
 
 try:
     import httpx
@@ -24,6 +26,20 @@ except ImportError:
     print("telespotx requires httpx. Install with: pip install httpx")
     sys.exit(1)
 
+from telespot_cache import QueryCache, cache_query, load_ttls
+from telespot_cassette import Cassette
+from telespot_engines import (
+    deduplicate, detect_captcha, generate_phone_formats, get_api_headers,
+    CAPTCHA_SCAN_BYTES, STREAM_CHUNK_BYTES, get_engine, get_random_headers, QueryPlan, response_text,
+)
+from telespot_output import NDJSONWriter, OUTPUT_FORMATS, resolve_output_format
+from telespot_profile import enable_profiler, format_summary, get_profiler, record, timed
+from telespot_metrics import (
+    count_metric, enable_metrics, flush_metrics, metrics_address, record_lookup,
+)
+from telespot_quota import QuotaLedger, budget_plans, describe_usage, load_quotas
+from telespot_store import STORE_FILE, ResultStore
+
 # Version
 VERSION = "0.2-alpha"
 
@@ -39,89 +55,6 @@ class Colors:
     BOLD = '\033[1m'
     RESET = '\033[0m'
 
-# User agents for rotation (updated versions)
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.3; rv:123.0) Gecko/20100101 Firefox/123.0',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0',
-    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_3 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
-]
-
-# Captcha and block indicators
-CAPTCHA_INDICATORS = [
-    'captcha', 'recaptcha', 'hcaptcha', 'challenge-platform',
-    'are you a robot', 'are you human', 'verify you are human',
-    'unusual traffic', 'automated requests', 'bot detection',
-    'access denied', 'forbidden', 'rate limit exceeded',
-    'please verify', 'security check', 'cf-challenge',
-]
-
-
-def get_random_headers():
-    """Get headers with random user agent and realistic fingerprint."""
-    ua = random.choice(USER_AGENTS)
-    is_firefox = 'Firefox' in ua
-
-    headers = {
-        'User-Agent': ua,
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/json,*/*;q=0.8',
-        'Accept-Language': random.choice([
-            'en-US,en;q=0.9',
-            'en-US,en;q=0.9,es;q=0.8',
-            'en-GB,en;q=0.9,en-US;q=0.8',
-        ]),
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-    }
-
-    if not is_firefox:
-        headers.update({
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'sec-ch-ua-platform': random.choice(['"Windows"', '"macOS"', '"Linux"']),
-        })
-
-    return headers
-
-
-def get_api_headers():
-    """Get headers tuned for API requests."""
-    headers = get_random_headers()
-    headers['Accept'] = 'application/json, text/html, */*'
-    headers.pop('Sec-Fetch-Dest', None)
-    headers.pop('Sec-Fetch-Mode', None)
-    headers.pop('Sec-Fetch-Site', None)
-    headers.pop('Sec-Fetch-User', None)
-    return headers
-
-
-def detect_captcha(response):
-    """Check if a response contains captcha or block indicators."""
-    if response.status_code in (403, 429, 503):
-        return True
-
-    content_type = response.headers.get('Content-Type', '')
-    if 'application/json' in content_type:
-        return False
-
-    try:
-        body = response.text.lower()
-        for indicator in CAPTCHA_INDICATORS:
-            if indicator in body:
-                return True
-    except Exception:
-        pass
-
-    return False
-
-
 def print_banner(no_color=False):
     """Print the telespotx banner in red, white, and blue."""
     if no_color:
@@ -174,28 +107,11 @@ def load_config():
     return config
 
 def generate_formats(phone):
-    """Generate 6 unique US phone number format variations."""
+    """Generate the shared US phone number format variations."""
     digits = re.sub(r'\D', '', phone)
-
-    if len(digits) == 11 and digits.startswith('1'):
-        digits = digits[1:]
-    elif len(digits) != 10:
+    formats = generate_phone_formats(phone, '+1')
+    if not formats:
         print(f"Error: Invalid US phone number. Expected 10 digits, got {len(digits)}.")
-        return []
-
-    area = digits[:3]
-    exchange = digits[3:6]
-    subscriber = digits[6:]
-
-    formats = [
-        f"{area}-{exchange}-{subscriber}",           # 888-555-1212
-        f"{digits}",                                  # 8885551212
-        f"({area}) {exchange}-{subscriber}",         # (888) 555-1212
-        f"+1{digits}",                               # +18885551212
-        f'"{area}-{exchange}-{subscriber}"',         # "888-555-1212"
-        f'"{digits}"',                               # "8885551212"
-    ]
-
     return formats
 
 def print_api_status(config, no_color=False):
@@ -217,7 +133,10 @@ def print_api_status(config, no_color=False):
 
     for name, is_configured in apis:
         if is_configured:
-            print(f"  {c.GREEN}[+]{c.RESET} {name}: CONFIGURED")
+            usage = ""
+            if _quota_ledger is not None and _quota_ledger.is_metered(name):
+                usage = f" ({describe_usage(_quota_ledger.get_stats()[name])})"
+            print(f"  {c.GREEN}[+]{c.RESET} {name}: CONFIGURED{usage}")
             configured += 1
         else:
             print(f"  {c.RED}[-]{c.RESET} {name}: NOT CONFIGURED")
@@ -227,38 +146,185 @@ def print_api_status(config, no_color=False):
     print()
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# QUERY CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Shared on-disk query cache (None when disabled with --no-cache)
+_query_cache = None
+
+
+def open_query_cache(config, refresh=False):
+    """Open the query cache shared with telespot.py."""
+    global _query_cache
+    try:
+        _query_cache = QueryCache(ttls=load_ttls(config), refresh=refresh)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open query cache: {e}")
+        _query_cache = None
+    return _query_cache
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# API QUOTAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Quota ledger shared with telespot.py (None until open_quota_ledger())
+_quota_ledger = None
+
+
+def open_quota_ledger(config):
+    """Load the persistent API quota ledger with the configured limits."""
+    global _quota_ledger
+    _quota_ledger = QuotaLedger(quotas=load_quotas(config))
+    return _quota_ledger
+
+
+def is_cached(name, fmt, query, depth=1):
+    """True if an engine's query for a format is in the query cache."""
+    if _query_cache is None:
+        return False
+    engine = get_engine(name)
+    key = cache_query(engine.query_for(fmt, query), depth if engine.page_limit() > 1 else 1)
+    return _query_cache.contains(name, key)
+
+
+def cached_search(engine):
+    """Decorator that serves async search calls from the query cache.
+
+    A hit returns without making any request. Empty results are not stored,
+    since a blocked request also comes back empty. Searches with a depth
+    keyword are cached per depth.
+    """
+    def decorator(search_fn):
+        @functools.wraps(search_fn)
+        async def wrapper(client, query, *args, **kwargs):
+            key = cache_query(query, kwargs.get('depth', 1))
+            if _query_cache is not None:
+                results = _query_cache.get(engine, key)
+                if results is not None:
+                    return results
+
+            results = await search_fn(client, query, *args, **kwargs)
+            if _query_cache is not None and results:
+                _query_cache.put(engine, key, results)
+            return results
+        return wrapper
+    return decorator
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # ASYNC SEARCH FUNCTIONS WITH RETRY AND CAPTCHA DETECTION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# HTTP cassette for --record/--replay (None when neither is given)
+_cassette = None
+
+
+def open_cassette(record=None, replay=None):
+    """Open a cassette to record responses to, or to replay them from."""
+    global _cassette
+    _cassette = None
+    if record:
+        _cassette = Cassette(record, 'record', tool=f'telespotx {VERSION}')
+    elif replay:
+        _cassette = Cassette(replay, 'replay')
+    return _cassette
+
+
+async def achunks(body):
+    """Yield an already-read body as one chunk."""
+    yield body
+
+
 async def async_request_with_retry(client, method, url, max_retries=2, backoff_base=1.5, debug=False, **kwargs):
     """Make an async HTTP request with retry logic and captcha detection.
 
+    With a cassette open (--record/--replay) the final response of every
+    call is recorded, or served from the cassette without the network.
+    """
+    if _cassette is None:
+        return await async_send_with_retry(client, method, url, max_retries, backoff_base, debug, **kwargs)
+
+    params, data = kwargs.get('params'), kwargs.get('data')
+    if _cassette.replaying:
+        status, headers, body, was_blocked = _cassette.play(method, url, params, data)
+        response = httpx.Response(status, headers=headers, content=body,
+                                  request=httpx.Request(method.upper(), url))
+        return response, was_blocked
+
+    response, was_blocked = await async_send_with_retry(
+        client, method, url, max_retries, backoff_base, debug, **kwargs
+    )
+    if response is not None:
+        if kwargs.get('stream'):
+            body = b''.join([chunk async for chunk in iter_body(response)])
+            response._telespot_chunks = achunks(body)
+        else:
+            body = response.content
+        _cassette.record(method, url, params, data, response.status_code, response.headers, body, was_blocked)
+    return response, was_blocked
+
+
+async def async_send_with_retry(client, method, url, max_retries=2, backoff_base=1.5, debug=False, **kwargs):
+    """Send an async HTTP request with retry logic and captcha detection.
+
+    With stream=True only the first chunks of the body are read for block
+    detection; the rest is left to the caller via iter_body(), and the
+    caller must aclose() the response. A response _stop_if(response) is true
+    for (a spent API quota) is returned as blocked without retrying. Network
+    time, backoff sleeps and request metrics are attributed to the engine
+    named by _profile_as.
+
     Returns (response, was_blocked) tuple.
     """
+    api_mode = kwargs.pop('_api_mode', False)
+    stop_if = kwargs.pop('_stop_if', None)
+    engine_name = kwargs.pop('_profile_as', None)
+    extra_headers = kwargs.pop('headers', None) or {}
+    stream = kwargs.pop('stream', False)
+
     for attempt in range(max_retries + 1):
         try:
-            # Fresh headers on each retry
-            if 'headers' not in kwargs or attempt > 0:
-                if kwargs.pop('_api_mode', False) or kwargs.get('_api_mode'):
-                    kwargs['headers'] = get_api_headers()
-                else:
-                    kwargs['headers'] = get_random_headers()
-            kwargs.pop('_api_mode', None)
+            # Fresh fingerprint on each attempt, keeping caller headers (API keys)
+            headers = get_api_headers() if api_mode else get_random_headers()
+            headers.update(extra_headers)
+            kwargs['headers'] = headers
 
             if 'timeout' not in kwargs:
                 kwargs['timeout'] = 12.0
 
-            if method == 'get':
+            started = time.perf_counter()
+            prefix = None
+            if stream:
+                send_kwargs = {'auth': kwargs['auth']} if 'auth' in kwargs else {}
+                request = client.build_request(
+                    method.upper(), url, **{k: v for k, v in kwargs.items() if k != 'auth'}
+                )
+                response = await client.send(request, stream=True, **send_kwargs)
+                prefix, response._telespot_chunks = await aread_prefix(
+                    response.aiter_bytes(STREAM_CHUNK_BYTES)
+                )
+            elif method == 'get':
                 response = await client.get(url, **kwargs)
             else:
                 response = await client.post(url, **kwargs)
+            record('network', time.perf_counter() - started, engine_name)
+            count_metric('telespot_requests_total', engine=engine_name, status=response.status_code)
 
-            if detect_captcha(response):
+            if stop_if is not None and stop_if(response):
+                return response, True
+
+            if detect_captcha(response, prefix):
+                count_metric('telespot_captcha_detections_total', engine=engine_name)
                 if debug:
                     print(f"      [DEBUG] Captcha/block detected (attempt {attempt + 1}), status={response.status_code}")
                 if attempt < max_retries:
-                    await asyncio.sleep(backoff_base * (2 ** attempt) + random.uniform(0.5, 1.5))
+                    await response.aclose()
+                    wait = backoff_base * (2 ** attempt) + random.uniform(0.5, 1.5)
+                    count_metric('telespot_retries_total', engine=engine_name, reason='captcha')
+                    await asyncio.sleep(wait)
+                    record('backoff', wait, engine_name)
                     continue
                 return response, True
 
@@ -267,313 +333,252 @@ async def async_request_with_retry(client, method, url, max_retries=2, backoff_b
                     wait = backoff_base * (2 ** attempt) + random.uniform(1.0, 2.0)
                     if debug:
                         print(f"      [DEBUG] Rate limited, waiting {wait:.1f}s...")
+                    await response.aclose()
+                    count_metric('telespot_retries_total', engine=engine_name, reason='rate_limited')
                     await asyncio.sleep(wait)
+                    record('backoff', wait, engine_name)
                     continue
                 return response, True
 
             return response, False
 
         except (httpx.TimeoutException, httpx.ConnectError) as e:
+            count_metric('telespot_requests_total', engine=engine_name, status='error')
             if debug:
                 print(f"      [DEBUG] Network error (attempt {attempt + 1}): {e}")
             if attempt < max_retries:
-                await asyncio.sleep(backoff_base * (2 ** attempt))
+                wait = backoff_base * (2 ** attempt)
+                count_metric('telespot_retries_total', engine=engine_name, reason='network')
+                await asyncio.sleep(wait)
+                record('backoff', wait, engine_name)
                 continue
             raise
 
     return None, True
 
 
-async def search_google(client, query, config, debug=False):
-    """Search using Google Custom Search API with retry."""
-    api_key = config.get('google_api_key')
-    cse_id = config.get('google_cse_id')
+async def aread_prefix(chunks, size=CAPTCHA_SCAN_BYTES):
+    """Async read_prefix(): returns (prefix, chunks) where chunks still
+    yields the complete body."""
+    buffered = []
+    total = 0
+    async for chunk in chunks:
+        buffered.append(chunk)
+        total += len(chunk)
+        if total >= size:
+            break
 
-    if not api_key or not cse_id:
-        return []
+    async def body():
+        for chunk in buffered:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
 
-    url = "https://www.googleapis.com/customsearch/v1"
+    return b''.join(buffered), body()
 
-    clean_query = query
-    exact_terms = None
-    if query.startswith('"') and query.endswith('"'):
-        clean_query = query[1:-1]
-        exact_terms = clean_query
 
-    params = {
-        'key': api_key,
-        'cx': cse_id,
-        'q': clean_query,
-        'num': 10,
-    }
+def iter_body(response):
+    """Async-iterate over a streamed response body, or yield a buffered one."""
+    chunks = getattr(response, '_telespot_chunks', None)
+    return chunks if chunks is not None else response.aiter_bytes(STREAM_CHUNK_BYTES)
 
-    if exact_terms:
-        params['exactTerms'] = exact_terms
 
-    try:
-        response, was_blocked = await async_request_with_retry(
-            client, 'get', url, params=params, _api_mode=True, debug=debug
-        )
+async def aparse_page(engine, chunks, encoding=None):
+    """Async parse_page(): reads the whole page and returns (results, cursor)."""
+    parser = engine.stream_parser(None, encoding)
+    async for chunk in chunks:
+        parser.feed_bytes(chunk)
+    return parser.close(), getattr(parser, 'next_page', None)
 
-        if was_blocked:
-            if debug:
-                print(f"    [DEBUG] Google blocked/rate limited")
-            return []
 
-        if response.status_code == 200:
-            data = response.json()
-            results = []
-            for item in data.get('items', []):
-                results.append({
-                    'title': item.get('title', ''),
-                    'url': item.get('link', ''),
-                    'snippet': item.get('snippet', ''),
-                    'source': 'Google'
-                })
-            if debug:
-                print(f"    [DEBUG] Google returned {len(results)} results")
-            return results
-    except Exception as e:
-        if debug:
-            print(f"    [DEBUG] Google error: {e}")
-    return []
+async def aparse_chunks(engine, chunks, num_results=10, encoding=None):
+    """Async parse_chunks(): stops pulling chunks once the parser has enough."""
+    parser = engine.stream_parser(num_results, encoding)
+    async for chunk in chunks:
+        if parser.feed_bytes(chunk):
+            break
+    return parser.close()
 
-async def search_bing(client, query, config, debug=False):
-    """Search using Bing Search API with retry."""
-    api_key = config.get('bing_api_key')
 
-    if not api_key:
-        return []
+async def async_send_engine_request(client, engine, request, debug=False, paged=False):
+    """Send one EngineRequest over the shared httpx client and parse the response.
 
-    url = "https://api.bing.microsoft.com/v7.0/search"
-    headers = get_api_headers()
-    headers['Ocp-Apim-Subscription-Key'] = api_key
-    params = {'q': query, 'count': 10}
-
-    try:
-        response, was_blocked = await async_request_with_retry(
-            client, 'get', url, params=params, headers=headers, debug=debug
-        )
-
-        if was_blocked:
-            if debug:
-                print(f"    [DEBUG] Bing blocked/rate limited")
-            return []
+    With paged=True streamed pages are read to the end so the cursor for
+    the next page is found. Returns (results, cursor).
+    """
+    results = []
+    cursor = None
 
-        if response.status_code == 200:
-            data = response.json()
-            results = []
-            for item in data.get('webPages', {}).get('value', []):
-                results.append({
-                    'title': item.get('name', ''),
-                    'url': item.get('url', ''),
-                    'snippet': item.get('snippet', ''),
-                    'source': 'Bing'
-                })
-            if debug:
-                print(f"    [DEBUG] Bing returned {len(results)} results")
-            return results
-    except Exception as e:
+    if _quota_ledger is not None and not _quota_ledger.consume(engine.name):
         if debug:
-            print(f"    [DEBUG] Bing error: {e}")
-    return []
-
-async def search_duckduckgo(client, query, debug=False):
-    """Search DuckDuckGo with Instant Answer API + HTML fallback."""
-    results = []
+            print(f"    [DEBUG] {engine.name} quota used up, request skipped")
+        return results, cursor
 
-    # Phase 1: Instant Answer API
     try:
-        url = "https://api.duckduckgo.com/"
-        params = {
-            'q': query,
-            'format': 'json',
-            'no_html': 1,
-            'skip_disambig': 1,
-        }
-
+        retries = {} if request.max_retries is None else {'max_retries': request.max_retries}
         response, was_blocked = await async_request_with_retry(
-            client, 'get', url, params=params, _api_mode=True, debug=debug
+            client, request.method, request.url, debug=debug, _api_mode=request.api_mode,
+            stream=request.stream, _stop_if=engine.quota_exhausted, _profile_as=engine.name,
+            **retries, **request.kwargs()
         )
 
-        if not was_blocked and response and response.status_code == 200:
-            data = response.json()
-
-            if data.get('AbstractText'):
-                results.append({
-                    'title': data.get('Heading', 'DuckDuckGo Result'),
-                    'url': data.get('AbstractURL', ''),
-                    'snippet': data.get('AbstractText', ''),
-                    'source': 'DuckDuckGo'
-                })
-
-            for topic in data.get('RelatedTopics', [])[:5]:
-                if isinstance(topic, dict) and topic.get('Text'):
-                    results.append({
-                        'title': topic.get('Text', '')[:50],
-                        'url': topic.get('FirstURL', ''),
-                        'snippet': topic.get('Text', ''),
-                        'source': 'DuckDuckGo'
-                    })
-
+        if was_blocked and response is not None and engine.quota_exhausted(response):
+            if _quota_ledger is not None:
+                _quota_ledger.exhaust(engine.name)
+            print(f"    {engine.name} API quota used up - remaining queries use other engines")
+        elif was_blocked:
             if debug:
-                print(f"    [DEBUG] DuckDuckGo API returned {len(results)} results")
+                print(f"    [DEBUG] {engine.name} ({engine.host}) blocked/rate limited")
+        elif response.status_code == 200:
+            with timed('parse', engine.name):
+                if request.stream and paged:
+                    results, cursor = await aparse_page(engine, iter_body(response), response.encoding)
+                elif request.stream:
+                    # Stop reading as soon as the parser has enough results
+                    results = await aparse_chunks(engine, iter_body(response), encoding=response.encoding)
+                else:
+                    results = engine.parse(response)
+            count_metric('telespot_results_total', len(results), engine=engine.name)
+            if debug:
+                print(f"    [DEBUG] {engine.name} ({engine.host}) returned {len(results)} results")
+        elif debug:
+            print(f"    [DEBUG] {engine.name} status {response.status_code}: {response_text(response)[:100]}")
 
+        if request.stream:
+            # Drops the connection if the parser stopped early
+            await response.aclose()
     except Exception as e:
         if debug:
-            print(f"    [DEBUG] DuckDuckGo API error: {e}")
-
-    # Phase 2: HTML fallback when API returns few results
-    if len(results) < 3:
-        html_results = await _search_duckduckgo_html(client, query, debug)
-        results.extend(html_results)
+            print(f"    [DEBUG] {engine.name} ({engine.host}) error: {e}")
 
-    return results
+    return results, cursor
 
 
-async def _search_duckduckgo_html(client, query, debug=False):
-    """Scrape DuckDuckGo HTML lite search for actual web results."""
-    results = []
+async def afetch_more_pages(client, engine, query, config, first_page, cursor, depth, debug=False):
+    """Fetch result pages 2..depth of a query and return their new results.
 
-    try:
-        url = "https://html.duckduckgo.com/html/"
-        data = {'q': query, 'b': ''}
+    Stops at the first page that brings no URL not already seen. Pages that
+    only need a page number are requested engine.page_wave at a time, so no
+    further wave is sent once a page comes back empty; the others follow the
+    cursor of the page before.
+    """
+    seen_urls = set()
+    deduplicate(first_page, seen_urls)
+    pages = range(1, min(depth, engine.max_pages))
+    more = []
+
+    async def fetch(page, page_cursor=None):
+        request = engine.page_request(query, config, page, 10, page_cursor)
+        if request is None:
+            return [], None
+        return await async_send_engine_request(client, engine, request, debug, paged=True)
+
+    def keep(page, results):
+        new = deduplicate(results, seen_urls)
+        if debug:
+            print(f"    [DEBUG] {engine.name} page {page + 1}: {len(results)} results, {len(new)} new")
+        more.extend(new)
+        return bool(new)
+
+    if engine.concurrent_pages:
+        for start in range(0, len(pages), engine.page_wave):
+            wave = pages[start:start + engine.page_wave]
+            found = await asyncio.gather(*(fetch(page) for page in wave))
+            if not all(keep(page, results) for page, (results, _) in zip(wave, found)):
+                break
+    else:
+        for page in pages:
+            results, cursor = await fetch(page, cursor)
+            if not keep(page, results):
+                break
 
-        response, was_blocked = await async_request_with_retry(
-            client, 'post', url, data=data, max_retries=1, debug=debug
-        )
+    return more
 
-        if was_blocked:
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo HTML blocked")
-            return results
 
-        if response and response.status_code == 200:
-            body = response.text
+async def async_run_engine(client, engine, query, config, debug=False, depth=1):
+    """Run one telespot_engines adapter over the shared httpx client.
 
-            link_pattern = r'<a[^>]*class="result__a"[^>]*href="([^"]*)"[^>]*>(.*?)</a>'
-            links = re.findall(link_pattern, body, re.DOTALL)
-
-            snippet_pattern = r'<a[^>]*class="result__snippet"[^>]*>(.*?)</a>'
-            snippets = re.findall(snippet_pattern, body, re.DOTALL)
+    With depth > 1 up to depth result pages are fetched. If the engine has
+    a fallback and returns too few results, the fallback engine is run too.
+    """
+    request = engine.build_request(query, config)
+    if request is None:
+        return []
 
-            for i, (href, title) in enumerate(links[:10]):
-                clean_title = re.sub(r'<[^>]+>', '', title).strip()
-                clean_snippet = ''
-                if i < len(snippets):
-                    clean_snippet = re.sub(r'<[^>]+>', '', snippets[i]).strip()
+    paged = depth > 1 and engine.max_pages > 1
+    results, cursor = await async_send_engine_request(client, engine, request, debug, paged)
+    if paged and results:
+        results.extend(await afetch_more_pages(client, engine, query, config, results, cursor, depth, debug))
 
-                actual_url = href
-                if 'uddg=' in href:
-                    url_match = re.search(r'uddg=([^&]+)', href)
-                    if url_match:
-                        actual_url = unquote(url_match.group(1))
+    if engine.fallback and len(results) < engine.min_results:
+        results.extend(await async_run_engine(client, engine.fallback, query, config, debug, depth))
 
-                if clean_title and actual_url:
-                    results.append({
-                        'title': clean_title,
-                        'url': actual_url,
-                        'snippet': clean_snippet,
-                        'source': 'DuckDuckGo'
-                    })
+    return results
 
-            if debug:
-                print(f"    [DEBUG] DuckDuckGo HTML returned {len(results)} results")
 
-    except Exception as e:
-        if debug:
-            print(f"    [DEBUG] DuckDuckGo HTML error: {e}")
+@cached_search('Google')
+async def search_google(client, query, config, debug=False, depth=1):
+    """Search using Google Custom Search API with retry."""
+    return await async_run_engine(client, get_engine('Google'), query, config, debug, depth)
 
-    return results
+@cached_search('Bing')
+async def search_bing(client, query, config, debug=False, depth=1):
+    """Search using Bing Search API with retry."""
+    return await async_run_engine(client, get_engine('Bing'), query, config, debug, depth)
 
+@cached_search('DuckDuckGo')
+async def search_duckduckgo(client, query, debug=False, depth=1):
+    """Search DuckDuckGo with Instant Answer API + HTML fallback."""
+    return await async_run_engine(client, get_engine('DuckDuckGo'), query, {}, debug, depth)
 
+@cached_search('Dehashed')
 async def search_dehashed(client, query, config, debug=False):
     """Search using Dehashed API with retry."""
-    api_key = config.get('dehashed_api_key')
-
-    if not api_key or ':' not in api_key:
-        return []
-
-    email, key = api_key.split(':', 1)
-    url = "https://api.dehashed.com/search"
-    params = {'query': f'phone:"{query}"'}
-
-    try:
-        response, was_blocked = await async_request_with_retry(
-            client, 'get', url, params=params, auth=(email, key),
-            _api_mode=True, debug=debug
-        )
-
-        if was_blocked:
-            if debug:
-                print(f"    [DEBUG] Dehashed blocked/rate limited")
-            return []
-
-        if response.status_code == 200:
-            data = response.json()
-            results = []
-            for entry in data.get('entries', [])[:10]:
-                results.append({
-                    'title': f"Dehashed: {entry.get('email', 'Unknown')}",
-                    'url': 'https://dehashed.com',
-                    'snippet': f"Email: {entry.get('email', 'N/A')}, Username: {entry.get('username', 'N/A')}, Name: {entry.get('name', 'N/A')}",
-                    'source': 'Dehashed'
-                })
-            if debug:
-                print(f"    [DEBUG] Dehashed returned {len(results)} results")
-            return results
-    except Exception as e:
-        if debug:
-            print(f"    [DEBUG] Dehashed error: {e}")
-    return []
-
-async def search_format(client, query, config, include_dehashed=False, debug=False):
-    """Search all APIs in parallel for a single format."""
-    tasks = [
-        search_google(client, query, config, debug),
-        search_bing(client, query, config, debug),
-        search_duckduckgo(client, query, debug),
-    ]
+    return await async_run_engine(client, get_engine('Dehashed'), query, config, debug)
 
+def engine_names(include_dehashed=False):
+    """Get the engines searched for each format, in dispatch order."""
+    names = ['Google', 'Bing', 'DuckDuckGo']
     if include_dehashed:
-        tasks.append(search_dehashed(client, query, config, debug))
+        names.append('Dehashed')
+    return names
 
-    results_list = await asyncio.gather(*tasks, return_exceptions=True)
 
-    all_results = []
-    for results in results_list:
-        if isinstance(results, list):
-            all_results.extend(results)
-
-    return all_results
+async def search_engine(client, name, fmt, query, config, debug=False, depth=1):
+    """Search one API for a single format, up to depth result pages deep."""
+    if name == 'Google':
+        return await search_google(client, query, config, debug, depth=depth)
+    if name == 'Bing':
+        return await search_bing(client, query, config, debug, depth=depth)
+    if name == 'DuckDuckGo':
+        return await search_duckduckgo(client, query, debug, depth=depth)
+    return await search_dehashed(client, get_engine(name).query_for(fmt, query), config, debug)
 
 
-def deduplicate_results(results):
-    """Remove duplicate results by URL."""
-    seen_urls = set()
-    unique = []
+NAME_PATTERN = re.compile(r'\b([A-Z][a-z]+ [A-Z][a-z]+)\b')
+LOCATION_PATTERN = re.compile(r'\b([A-Z][a-z]+(?:,?\s+[A-Z]{2})?(?:\s+\d{5})?)\b')
+USERNAME_PATTERN = re.compile(r'@([A-Za-z0-9_]{3,20})')
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
 
-    for result in results:
-        url = result.get('url', '').rstrip('/').lower().strip()
-        if url and url not in seen_urls:
-            seen_urls.add(url)
-            unique.append(result)
-        elif not url:
-            unique.append(result)
 
-    return unique
+async def search_all_formats(phone, config, keyword=None, site=None, include_dehashed=False,
+                             verbose=False, no_color=False, debug=False, all_queries=False, depth=1,
+                             writer=None):
+    """Search all US phone formats in parallel with captcha resilience.
 
-
-async def search_all_formats(phone, config, keyword=None, site=None,
-                             include_dehashed=False, verbose=False, no_color=False, debug=False):
-    """Search all US phone formats in parallel with captcha resilience."""
+    Formats an engine treats as the same search share one request. Returns
+    (results, patterns); results are deduplicated and fed to a
+    PatternExtractor one at a time as each format completes, and streamed to
+    the NDJSONWriter if one is given.
+    """
     c = Colors if not no_color else type('', (), {k: '' for k in dir(Colors) if not k.startswith('_')})()
 
     formats = generate_formats(phone)
     if not formats:
-        return []
+        return [], None
 
     all_results = []
+    extractor = PatternExtractor()
 
     print(f"\n{c.BOLD}Searching for:{c.RESET} {phone}")
     print(f"Country: United States (+1)")
@@ -591,31 +596,72 @@ async def search_all_formats(phone, config, keyword=None, site=None,
                 query = f'{query} site:{site}'
             queries.append((fmt, query))
 
-        # Search all formats in parallel
+        names = [name for name in engine_names(include_dehashed) if get_engine(name).is_configured(config)]
+        plan = QueryPlan(queries, names, collapse=not all_queries)
+        if plan.request_count() < plan.naive_count():
+            print(f"{c.CYAN}Query plan: {plan.request_count()} requests instead of "
+                  f"{plan.naive_count()} (equivalent formats collapsed){c.RESET}")
+
+        if _quota_ledger is not None:
+            stats = _quota_ledger.get_stats()
+            pages = {name: min(depth, get_engine(name).max_pages) for name in names}
+            cached = lambda name, fmt, query: is_cached(name, fmt, query, depth)
+            for name, (requested, granted) in budget_plans(_quota_ledger, [plan], cached, pages).items():
+                if requested:
+                    line = f"{name} quota: {requested} requests planned, {describe_usage(stats[name])}"
+                    if granted < requested:
+                        line += f" - {requested - granted} skipped, those formats use the other engines"
+                    print(f"{c.YELLOW if granted < requested else c.CYAN}{line}{c.RESET}")
+
+        # Search all planned (engine, format) pairs in parallel, then analyze
+        # each format in order as soon as it (and every format before it) has finished
         print(f"{c.YELLOW}Launching parallel searches...{c.RESET}")
         start_time = datetime.now()
 
-        tasks = [search_format(client, query, config, include_dehashed, debug) for _, query in queries]
-        results_per_format = await asyncio.gather(*tasks, return_exceptions=True)
-
-        elapsed = (datetime.now() - start_time).total_seconds()
+        tasks = {
+            (name, fmt): asyncio.ensure_future(search_engine(client, name, fmt, query, config, debug, depth))
+            for fmt, query in queries
+            for name in names
+            if plan.is_primary(name, fmt)
+        }
 
-        # Process results
         raw_total = 0
+        seen_urls = set()
         for i, (fmt, _) in enumerate(queries):
-            results = results_per_format[i] if isinstance(results_per_format[i], list) else []
-            result_count = len(results)
-            raw_total += result_count
-
-            print(f"  [{i+1}/{len(formats)}] {fmt}: {c.GREEN}{result_count} results{c.RESET}")
+            results = []
+            for name in names:
+                primary = plan.covered_by(name, fmt)
+                if primary is None:
+                    continue
+                try:
+                    engine_results = await tasks[(name, primary)]
+                except Exception:
+                    continue
+                results.extend(engine_results if primary == fmt else [r.with_format(fmt) for r in engine_results])
+            raw_total += len(results)
+
+            with timed('dedupe'):
+                unique = deduplicate(results, seen_urls)
+            with timed('analyze'):
+                for r in unique:
+                    r.format = fmt
+                    extractor.add(r)
+            all_results.extend(unique)
+            if writer is not None:
+                for r in unique:
+                    writer.result(phone, fmt, r)
+                writer.format_summary(phone, fmt, len(results), len(unique), len(all_results))
+
+            snap = extractor.snapshot()
+            print(f"  [{i+1}/{len(formats)}] {fmt}: {c.GREEN}{len(results)} results{c.RESET}"
+                  f" (confidence so far: {snap['confidence']} {snap['confidence_pct']}%)")
 
-            for r in results:
-                r['format'] = fmt
-            all_results.extend(results)
+        elapsed = (datetime.now() - start_time).total_seconds()
+        if _query_cache is not None and _query_cache.hits:
+            print(f"{c.CYAN}Cache hits: {_query_cache.hits} (queries skipped){c.RESET}")
 
-        # Deduplicate
-        all_results = deduplicate_results(all_results)
         deduped_total = len(all_results)
+        record_lookup(raw_total, deduped_total)
 
         print(f"\n{c.GREEN}Completed in {elapsed:.1f} seconds{c.RESET}")
         print(f"Total: {deduped_total} unique results", end='')
@@ -624,55 +670,61 @@ async def search_all_formats(phone, config, keyword=None, site=None,
         else:
             print()
 
-    return all_results
+    patterns = extractor.snapshot()
+    if writer is not None:
+        writer.number_summary(phone, formats, patterns)
+    return all_results, patterns
 
-def extract_patterns(results):
-    """Extract names, locations, and usernames from results."""
-    patterns = {
-        'names': {},
-        'locations': {},
-        'usernames': {},
-        'emails': {},
-    }
+class PatternExtractor:
+    """Incremental pattern extraction, fed one result at a time.
 
-    name_pattern = re.compile(r'\b([A-Z][a-z]+ [A-Z][a-z]+)\b')
-    location_pattern = re.compile(r'\b([A-Z][a-z]+(?:,?\s+[A-Z]{2})?(?:\s+\d{5})?)\b')
-    username_pattern = re.compile(r'@([A-Za-z0-9_]{3,20})')
-    email_pattern = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
-
-    for result in results:
-        text = f"{result.get('title', '')} {result.get('snippet', '')}"
-
-        for name in name_pattern.findall(text):
-            if len(name) > 5:
-                patterns['names'][name] = patterns['names'].get(name, 0) + 1
-
-        for loc in location_pattern.findall(text):
-            if len(loc) > 3:
-                patterns['locations'][loc] = patterns['locations'].get(loc, 0) + 1
-
-        for user in username_pattern.findall(text):
-            patterns['usernames'][f"@{user}"] = patterns['usernames'].get(f"@{user}", 0) + 1
+    Counts are the number of distinct results mentioning each entity.
+    """
 
-        for email in email_pattern.findall(text):
-            patterns['emails'][email] = patterns['emails'].get(email, 0) + 1
+    def __init__(self):
+        self.total = 0
+        self.names = {}
+        self.locations = {}
+        self.usernames = {}
+        self.emails = {}
+
+    @staticmethod
+    def _count(counter, items):
+        for item in set(items):
+            counter[item] = counter.get(item, 0) + 1
+
+    def add(self, result):
+        text = f"{result.title} {result.snippet}"
+        self.total += 1
+        self._count(self.names, (n for n in NAME_PATTERN.findall(text) if len(n) > 5))
+        self._count(self.locations, (l for l in LOCATION_PATTERN.findall(text) if len(l) > 3))
+        self._count(self.usernames, (f"@{u}" for u in USERNAME_PATTERN.findall(text)))
+        self._count(self.emails, EMAIL_PATTERN.findall(text))
+
+    def snapshot(self):
+        patterns = {
+            'names': dict(self.names),
+            'locations': dict(self.locations),
+            'usernames': dict(self.usernames),
+            'emails': dict(self.emails),
+        }
 
-    # Calculate confidence
-    total_patterns = sum(len(v) for v in patterns.values())
-    if total_patterns > 10:
-        confidence = 'HIGH'
-        confidence_pct = min(95, 60 + total_patterns * 2)
-    elif total_patterns > 5:
-        confidence = 'MEDIUM'
-        confidence_pct = 40 + total_patterns * 3
-    else:
-        confidence = 'LOW'
-        confidence_pct = max(10, total_patterns * 8)
+        # Calculate confidence
+        total_patterns = sum(len(v) for v in patterns.values())
+        if total_patterns > 10:
+            confidence = 'HIGH'
+            confidence_pct = min(95, 60 + total_patterns * 2)
+        elif total_patterns > 5:
+            confidence = 'MEDIUM'
+            confidence_pct = 40 + total_patterns * 3
+        else:
+            confidence = 'LOW'
+            confidence_pct = max(10, total_patterns * 8)
 
-    patterns['confidence'] = confidence
-    patterns['confidence_pct'] = confidence_pct
+        patterns['confidence'] = confidence
+        patterns['confidence_pct'] = confidence_pct
 
-    return patterns
+        return patterns
 
 def print_summary(results, patterns, no_color=False):
     """Print analysis summary."""
@@ -697,8 +749,7 @@ def print_summary(results, patterns, no_color=False):
     # Results by source
     sources = {}
     for r in results:
-        src = r.get('source', 'Unknown')
-        sources[src] = sources.get(src, 0) + 1
+        sources[r.source] = sources.get(r.source, 0) + 1
 
     print(f"\n{c.BOLD}Results by Source:{c.RESET}")
     for src, count in sorted(sources.items(), key=lambda x: -x[1]):
@@ -741,14 +792,13 @@ def print_verbose_results(results, no_color=False):
 
     seen_urls = set()
     for r in results:
-        url = r.get('url', '')
-        if url in seen_urls:
+        if r.url in seen_urls:
             continue
-        seen_urls.add(url)
+        seen_urls.add(r.url)
 
-        print(f"\n{c.CYAN}[{r.get('source', 'Unknown')}]{c.RESET} {r.get('title', 'No title')}")
-        print(f"  URL: {url}")
-        snippet = r.get('snippet', '')[:150]
+        print(f"\n{c.CYAN}[{r.source}]{c.RESET} {r.title}")
+        print(f"  URL: {r.url}")
+        snippet = r.snippet[:150]
         if snippet:
             print(f"  {snippet}...")
 
@@ -758,7 +808,7 @@ def save_results(results, patterns, output_file):
         data = {
             'timestamp': datetime.now().isoformat(),
             'version': VERSION,
-            'results': results,
+            'results': [r.to_dict() for r in results],
             'patterns': {
                 'names': patterns['names'],
                 'locations': patterns['locations'],
@@ -768,6 +818,8 @@ def save_results(results, patterns, output_file):
                 'confidence_pct': patterns['confidence_pct'],
             }
         }
+        if get_profiler() is not None:
+            data['timings'] = get_profiler().summary()
         with open(output_file, 'w') as f:
             json.dump(data, f, indent=2)
     else:
@@ -793,14 +845,29 @@ def save_results(results, patterns, output_file):
             f.write("-" * 40 + "\n")
             seen = set()
             for r in results:
-                url = r.get('url', '')
-                if url not in seen:
-                    seen.add(url)
-                    f.write(f"\n[{r.get('source')}] {r.get('title', 'No title')}\n")
-                    f.write(f"  {url}\n")
+                if r.url not in seen:
+                    seen.add(r.url)
+                    f.write(f"\n[{r.source}] {r.title}\n")
+                    f.write(f"  {r.url}\n")
 
     print(f"\nResults saved to: {output_file}")
 
+def store_results(path, phone, results, patterns):
+    """Write the run into the SQLite result store shared with telespot.py."""
+    by_format = {}
+    for r in results:
+        by_format.setdefault(r.format or '', []).append(r)
+    try:
+        store = ResultStore(path)
+        try:
+            store.save_run(phone, list(by_format), by_format, patterns, VERSION)
+        finally:
+            store.close()
+    except sqlite3.Error as e:
+        print(f"Warning: Could not write to result store: {e}")
+        return
+    print(f"Run stored in: {path}")
+
 def main():
     parser = argparse.ArgumentParser(
         description='TelespotX - Fast parallel phone OSINT (US numbers only)',
@@ -819,13 +886,33 @@ Note: This tool only supports United States phone numbers (+1).
     parser.add_argument('phone', nargs='?', help='US phone number to search (10 digits)')
     parser.add_argument('-k', '--keyword', help='Add keyword to search')
     parser.add_argument('-s', '--site', help='Limit to specific site')
-    parser.add_argument('-o', '--output', help='Save results to file (.json or .txt)')
+    parser.add_argument('-o', '--output', help='Save results to file (.json, .txt or .ndjson)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS,
+                        help='Output file format (default: from the file extension)')
+    parser.add_argument('--store', nargs='?', const=STORE_FILE, metavar='PATH',
+                        help="Also write the run into a SQLite result store (read it with 'telespot query')")
     parser.add_argument('-v', '--verbose', action='store_true', help='Show detailed results')
     parser.add_argument('--dehashed', action='store_true', help='Include Dehashed search')
+    parser.add_argument('--depth', type=int, default=1, metavar='N',
+                        help='Fetch up to N result pages per query (Google, Bing, DuckDuckGo HTML)')
+    parser.add_argument('--all-queries', action='store_true',
+                        help='Send every format to every API instead of collapsing equivalent queries')
     parser.add_argument('--no-color', action='store_true', help='Disable colors')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the query cache')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results and re-query every API')
     parser.add_argument('--api-status', action='store_true', help='Show API configuration')
     parser.add_argument('--version', action='store_true', help='Show version')
     parser.add_argument('-d', '--debug', action='store_true', help='Debug mode')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each stage (backoff, network, parse, dedupe, analyze) per engine')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics while running')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Write Prometheus metrics to PATH when the search finishes (textfile collector)')
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='FILE', help='Record every HTTP response to a compressed cassette file')
+    replay.add_argument('--replay', metavar='FILE',
+                        help='Serve HTTP responses from a cassette instead of the network')
 
     args = parser.parse_args()
 
@@ -839,6 +926,9 @@ Note: This tool only supports United States phone numbers (+1).
 
     # Load config
     config = load_config()
+    # Replayed responses cost no quota
+    if not args.replay:
+        open_quota_ledger(config)
 
     # Handle API status
     if args.api_status:
@@ -853,25 +943,59 @@ Note: This tool only supports United States phone numbers (+1).
     # Show API status
     print_api_status(config, args.no_color)
 
+    # Cache hits would bypass the cassette, so record/replay always go through it
+    if not (args.no_cache or args.record or args.replay):
+        open_query_cache(config, refresh=args.refresh)
+    if args.profile:
+        enable_profiler()
+    if args.metrics_port is not None or args.metrics_file:
+        try:
+            enable_metrics(args.metrics_port, args.metrics_file)
+        except OSError as e:
+            print(f"Could not serve metrics on port {args.metrics_port}: {e}")
+            sys.exit(1)
+        if metrics_address():
+            print(f"Metrics: {metrics_address()}")
+    try:
+        open_cassette(args.record, args.replay)
+    except OSError as e:
+        print(f"Could not open cassette: {e}")
+        sys.exit(1)
+
+    # NDJSON output is streamed while the search runs
+    output_format = resolve_output_format(args.output, args.output_format)
+    writer = NDJSONWriter(args.output, VERSION) if args.output and output_format == 'ndjson' else None
+
     # Run search
-    results = asyncio.run(search_all_formats(
-        args.phone,
-        config,
-        keyword=args.keyword,
-        site=args.site,
-        include_dehashed=args.dehashed,
-        verbose=args.verbose,
-        no_color=args.no_color,
-        debug=args.debug
-    ))
+    try:
+        results, patterns = asyncio.run(search_all_formats(
+            args.phone,
+            config,
+            keyword=args.keyword,
+            site=args.site,
+            include_dehashed=args.dehashed,
+            verbose=args.verbose,
+            no_color=args.no_color,
+            debug=args.debug,
+            all_queries=args.all_queries,
+            depth=args.depth,
+            writer=writer
+        ))
+    finally:
+        if writer is not None:
+            if get_profiler() is not None:
+                writer.write('timings', **get_profiler().summary())
+            writer.close()
+            print(f"\nResults streamed to: {args.output}")
+        if _cassette is not None:
+            _cassette.close()
+            print(f"Cassette: {_cassette.describe()}")
+        flush_metrics()
 
     if not results:
         print("\nNo results found.")
         sys.exit(0)
 
-    # Extract patterns
-    patterns = extract_patterns(results)
-
     # Print verbose results
     if args.verbose:
         print_verbose_results(results, args.no_color)
@@ -879,9 +1003,18 @@ Note: This tool only supports United States phone numbers (+1).
     # Print summary
     print_summary(results, patterns, args.no_color)
 
+    profiler = get_profiler()
+    if profiler is not None:
+        print("\nStage timings:")
+        for line in format_summary(profiler.summary()):
+            print(f"  {line}")
+
     # Save output
-    if args.output:
+    if args.output and writer is None:
         save_results(results, patterns, args.output)
 
+    if args.store:
+        store_results(args.store, args.phone, results, patterns)
+
 if __name__ == '__main__':
     main()